@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+TinyLFU 메모리 캐시 승인 정책 확인 스크립트
+
+image/admission.py의 count-min sketch와 image/service.py의 _put_memory가
+의도대로 동작하는지 확인합니다.
+    - 카운터 포화: 같은 키를 아무리 많이 기록해도 빈도는 MAX_COUNT(15)에서 멈춤
+    - 에이징: 카운터 증가가 샘플 크기(용량 x 10)에 도달하면 모든 카운터를 절반으로
+    - 승인: 가득 찬 메모리 캐시에서 새 항목은 가장 오래된 항목(축출 대상)보다
+      빈도가 높을 때만 들어가고, 거절되면 기존 항목이 그대로 남음
+
+모델이나 네트워크 없이 실행됩니다.
+
+사용법:
+    python admission_check.py [--capacity 64]
+"""
+import argparse
+import hashlib
+import os
+import sys
+
+# 현재 디렉토리를 PYTHONPATH에 추가
+sys.path.insert(0, os.path.dirname(__file__))
+
+from image import service  # noqa: E402
+from image.admission import MAX_COUNT, TinyLFUAdmission  # noqa: E402
+from image.metrics import metrics  # noqa: E402
+
+failures = []
+
+
+def key_of(name):
+    """캐시 키와 같은 md5 hex"""
+    return hashlib.md5(name.encode()).hexdigest()
+
+
+def check(condition, message):
+    print(f"   {'✅' if condition else '❌'} {message}")
+    if not condition:
+        failures.append(message)
+
+
+def check_saturation(capacity):
+    print("\n" + "=" * 60)
+    print(f"🔍 카운터 포화 (상한 {MAX_COUNT})")
+    print("=" * 60)
+    admission = TinyLFUAdmission(capacity)
+    hot = key_of("hot")
+    for count in range(1, MAX_COUNT + 1):
+        admission.record(hot)
+        if admission.frequency(hot) != count:
+            check(False, f"{count}회 기록 후 빈도 {admission.frequency(hot)}")
+            return
+    check(admission.frequency(hot) == MAX_COUNT, f"{MAX_COUNT}회 기록 후 빈도 {MAX_COUNT}")
+
+    additions = admission.sketch._additions
+    for _ in range(MAX_COUNT * 4):
+        admission.record(hot)
+    check(
+        admission.frequency(hot) == MAX_COUNT,
+        f"{MAX_COUNT * 5}회 기록 후에도 빈도 {admission.frequency(hot)} (상한 유지)",
+    )
+    check(
+        admission.sketch._additions == additions,
+        "포화된 키 기록은 에이징 샘플 수에 포함되지 않음",
+    )
+
+
+def check_aging(capacity):
+    sample_size = capacity * 10
+    print("\n" + "=" * 60)
+    print(f"🔍 에이징 (용량 {capacity} x 10 = 샘플 {sample_size}회 증가마다)")
+    print("=" * 60)
+    admission = TinyLFUAdmission(capacity)
+    sketch = admission.sketch
+    check(sketch.sample_size == sample_size, f"샘플 크기 {sketch.sample_size}")
+
+    hot = key_of("hot")
+    for _ in range(MAX_COUNT):
+        admission.record(hot)
+
+    # 서로 다른 키로 증가 횟수를 채움 (포화 키는 증가로 세지 않음)
+    names = (f"cold-{index}" for index in range(sample_size * 10))
+    while sketch._additions < sample_size - 1:
+        admission.record(key_of(next(names)))
+    check(sketch.resets == 0, f"{sample_size - 1}회 증가까지 에이징 없음")
+    before = admission.frequency(hot)
+
+    admission.record(key_of(next(names)))
+    check(sketch.resets == 1, f"{sample_size}회째 증가에서 에이징 1회")
+    check(
+        admission.frequency(hot) == before // 2,
+        f"에이징 후 빈도 절반 ({before} -> {admission.frequency(hot)})",
+    )
+    # 카운터를 절반으로 줄인 만큼 증가 횟수도 절반으로 남음 (TinyLFU 논문의 reset)
+    check(
+        sketch._additions == sample_size // 2,
+        f"에이징 후 남은 증가 횟수 {sketch._additions} (샘플의 절반)",
+    )
+
+    while sketch._additions < sample_size - 1:
+        admission.record(key_of(next(names)))
+    check(sketch.resets == 1, "다음 샘플 크기 도달 전까지 추가 에이징 없음")
+    admission.record(key_of(next(names)))
+    check(sketch.resets == 2, "샘플 크기에 다시 도달하면 에이징 2회")
+
+
+def check_put_memory():
+    print("\n" + "=" * 60)
+    print("🔍 _put_memory 승인 결정 (축출 대상 vs 후보)")
+    print("=" * 60)
+    admission = TinyLFUAdmission(2)
+    service._image_cache = {}
+    service._cache_max_size = 2
+    service._admission = admission
+    metrics.reset()
+
+    oldest, newer, candidate = key_of("oldest"), key_of("newer"), key_of("candidate")
+    service._put_memory(oldest, (b"a", 1.0, "image/jpeg", "etag-a"))
+    service._put_memory(newer, (b"b", 2.0, "image/jpeg", "etag-b"))
+    check(len(service._image_cache) == 2, "용량까지는 승인 없이 저장")
+
+    admission.record(oldest)
+    admission.record(candidate)
+    admitted = service._put_memory(candidate, (b"c", 3.0, "image/jpeg", "etag-c"))
+    check(
+        not admitted and candidate not in service._image_cache,
+        "빈도가 같은 후보는 거절",
+    )
+    check(
+        oldest in service._image_cache and newer in service._image_cache,
+        "거절되면 기존 항목 유지",
+    )
+
+    # 축출 대상은 빈도가 가장 낮은 항목이 아니라 가장 오래된 항목
+    admission.record(candidate)
+    admitted = service._put_memory(candidate, (b"c", 3.0, "image/jpeg", "etag-c"))
+    check(
+        admitted and candidate in service._image_cache,
+        "축출 대상보다 빈도가 높은 후보는 승인",
+    )
+    check(
+        oldest not in service._image_cache and newer in service._image_cache,
+        "가장 오래된 항목이 축출됨",
+    )
+
+    admitted = service._put_memory(newer, (b"b2", 4.0, "image/jpeg", "etag-b2"))
+    check(
+        admitted and service._image_cache[newer][0] == b"b2",
+        "이미 있는 키 갱신은 빈도와 무관하게 승인",
+    )
+    check(
+        metrics.admission == {"admitted": 1, "rejected": 1},
+        f"승인 통계 {metrics.admission}",
+    )
+    check(
+        metrics.evictions["memory"]["capacity"] == 1,
+        f"용량 축출 {metrics.evictions['memory']['capacity']}회",
+    )
+
+    service._admission = None
+    for index in range(3):
+        service._put_memory(key_of(f"scan-{index}"), (b"s", 10.0 + index, "image/jpeg", "s"))
+    check(
+        list(service._image_cache) == [key_of("scan-1"), key_of("scan-2")],
+        "승인 정책이 꺼지면 항상 가장 오래된 항목을 축출",
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--capacity", type=int, default=64, help="승인 정책 용량")
+    args = parser.parse_args()
+
+    check_saturation(args.capacity)
+    check_aging(args.capacity)
+    check_put_memory()
+
+    if failures:
+        print(f"\n❌ 실패 {len(failures)}건")
+        sys.exit(1)
+    print("\n✅ 승인 정책이 의도대로 동작합니다")
+
+
+if __name__ == "__main__":
+    main()
@@ -14,9 +14,12 @@ import zipfile
 from pathlib import Path
 
 import torch
+import torch.nn as nn
 from transformers import DetaImageProcessor
 
+from common.config import settings
 from .model import CustomDeta
+from .onnx_backend import enable_onnx_backbone
 
 # 상수 정의
 AI_DIR = Path(__file__).resolve().parent
@@ -43,6 +46,8 @@ processor = None
 id2label = None
 id2label_korean = None
 resolved_model_path = None
+quantized = False
+backend = "pytorch"
 
 
 def _resolve_path_hint(path_hint):
@@ -279,6 +284,22 @@ def _print_model_info(checkpoint, num_classes, id2label, id2label_korean):
         print(f"[AI]    Best mAP: {checkpoint['best_map']:.4f}")
 
 
+def quantize_model(model):
+    """
+    transformer encoder/decoder 레이어의 Linear를 동적 INT8로 양자화 (CPU 전용)
+
+    가중치는 INT8로 저장하고 활성값은 실행 시점에 양자화한다.
+    백본(ResNet)과 클래스/박스 헤드는 fp32로 유지한다.
+    """
+    deta = model.model.model
+    for layers in (deta.encoder.layers, deta.decoder.layers):
+        for index, layer in enumerate(layers):
+            layers[index] = torch.ao.quantization.quantize_dynamic(
+                layer, {nn.Linear}, dtype=torch.qint8
+            )
+    return model
+
+
 def _select_device():
     """최적의 디바이스 선택 (CUDA -> CPU 폴백)"""
     if torch.cuda.is_available():
@@ -295,15 +316,20 @@ def _select_device():
     return torch.device("cpu")
 
 
-def load_ai_model(max_retries=3, retry_delay=2):
+def load_ai_model(max_retries=3, retry_delay=2, quantize=None):
     """
     AI 모델을 메모리에 로드 (재시도 로직 포함)
 
     Args:
         max_retries: 최대 재시도 횟수
         retry_delay: 재시도 간 대기 시간 (초)
+        quantize: INT8 동적 양자화 여부 (None이면 AI_QUANTIZE 설정, CPU에서만 적용)
     """
-    global model, processor, id2label, id2label_korean, resolved_model_path
+    global model, processor, id2label, id2label_korean, resolved_model_path, quantized
+    global backend
+
+    if quantize is None:
+        quantize = settings.AI_QUANTIZE
 
     for attempt in range(max_retries):
         try:
@@ -384,6 +410,20 @@ def load_ai_model(max_retries=3, retry_delay=2):
                 else:
                     raise
 
+            # INT8 동적 양자화 (opt-in, CPU 전용)
+            quantized = False
+            if quantize:
+                if device.type == "cpu":
+                    try:
+                        model = quantize_model(model)
+                        quantized = True
+                        print("[AI] ✅ transformer Linear 레이어 INT8 동적 양자화 적용")
+                    except Exception as e:
+                        # 양자화 미지원 PyTorch 빌드 등: 원본 모델 유지
+                        print(f"[AI] ⚠️  INT8 양자화 실패, fp32로 실행합니다: {e}")
+                else:
+                    print("[AI] ℹ️  INT8 양자화는 CPU에서만 지원되어 fp32로 실행합니다.")
+
             # 이미지 전처리 프로세서 로드 (재시도 포함)
             processor = None
             for proc_attempt in range(3):
@@ -401,9 +441,25 @@ def load_ai_model(max_retries=3, retry_delay=2):
             if processor is None:
                 raise RuntimeError("프로세서 로드 실패")
 
+            # ONNX Runtime 백엔드 (opt-in, CPU 전용, 실패 시 PyTorch 유지)
+            backend = "pytorch"
+            if settings.AI_BACKEND == "onnx":
+                if device.type != "cpu":
+                    print("[AI] ℹ️  ONNX 백엔드는 CPU에서만 사용합니다. PyTorch로 실행합니다.")
+                else:
+                    try:
+                        model = enable_onnx_backbone(
+                            model, model_path, settings.AI_ONNX_THREADS
+                        )
+                        backend = "onnx"
+                    except Exception as e:
+                        print(f"[AI] ⚠️  ONNX 백엔드 준비 실패, PyTorch로 실행합니다: {e}")
+
             # 모델 정보 출력
             _print_model_info(checkpoint, num_classes, id2label, id2label_korean)
-            print(f"[AI] ✅ 모델이 {device}에 성공적으로 로드되었습니다!")
+            print(
+                f"[AI] ✅ 모델이 {device}{' (INT8)' if quantized else ''}에 성공적으로 로드되었습니다! (백엔드: {backend})"
+            )
 
             return True
 
@@ -421,6 +477,8 @@ def load_ai_model(max_retries=3, retry_delay=2):
                     None,
                     None,
                 )
+                quantized = False
+                backend = "pytorch"
                 return False
             # 다음 시도를 위해 전역 변수 초기화
             model, processor, id2label, id2label_korean = None, None, None, None
@@ -453,6 +511,16 @@ def is_model_loaded():
     return model is not None and processor is not None
 
 
+def is_model_quantized():
+    """로드된 모델의 INT8 양자화 여부"""
+    return quantized
+
+
+def get_model_backend():
+    """추론 백엔드 ("pytorch" 또는 "onnx")"""
+    return backend
+
+
 def get_resolved_model_path():
     """마지막으로 로드에 사용된 모델 경로 반환"""
     return resolved_model_path
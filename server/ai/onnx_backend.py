@@ -0,0 +1,187 @@
+"""
+ONNX Runtime 추론 백엔드 (CPU, 선택)
+
+로드된 CustomDeta의 ResNet 백본을 체크포인트마다 한 번 ONNX로 export해
+체크포인트 옆에 저장하고(<checkpoint>.backbone.onnx), 이후 백본 forward를
+ONNX Runtime으로 실행한다. deformable transformer(encoder/decoder)와
+후처리(post_process_object_detection, threshold, NMS)는 PyTorch 그대로 사용한다.
+
+모델 전체를 export하지 않는 이유:
+DETA의 two-stage 제안 선택은 NMS 결과 개수에 따라 Python 분기가 갈리고
+(keep_inds 패딩 등), 다중 스케일 특징맵 크기도 Python 정수로 계산된다.
+trace 방식 export는 이 분기/크기를 export 입력 기준으로 고정해 버려
+같은 해상도의 다른 이미지에서도 PyTorch와 결과가 달라진다 (logits 오차 0.8 이상).
+백본은 분기 없는 합성곱 그래프라 배치/해상도를 동적으로 두고 그대로 export할 수 있다.
+
+export 직후 PyTorch 백본과 출력을 비교해 오차가 크면 사용하지 않는다 (로더가 PyTorch로 폴백).
+onnxruntime이 설치되지 않은 환경에서는 enable_onnx_backbone이 RuntimeError를 올린다.
+"""
+
+from __future__ import annotations
+
+import os
+import tempfile
+from typing import NamedTuple, Tuple
+
+import torch
+import torch.nn as nn
+
+try:
+    import onnxruntime as ort
+except ImportError:  # 선택 의존성: 없으면 PyTorch 백엔드만 사용
+    ort = None
+
+ONNX_OPSET = 17
+# export 검증 허용 오차 (특징맵 최대 절대 오차)
+VALIDATION_ATOL = 1e-3
+# 검증 입력 (배치, 높이, 너비): 배치/해상도가 동적으로 동작하는지 함께 확인
+VALIDATION_SHAPES = [(1, 320, 480), (2, 416, 288)]
+
+
+class BackboneOutput(NamedTuple):
+    """DetaBackboneWithPositionalEncodings가 사용하는 출력 필드"""
+
+    feature_maps: Tuple[torch.Tensor, ...]
+
+
+class _ExportWrapper(nn.Module):
+    def __init__(self, backbone):
+        super().__init__()
+        self.backbone = backbone
+
+    def forward(self, pixel_values):
+        return tuple(self.backbone(pixel_values).feature_maps)
+
+
+def onnx_path_for(checkpoint_path: str) -> str:
+    return f"{checkpoint_path}.backbone.onnx"
+
+
+def export_backbone(backbone, onnx_path: str) -> None:
+    """배치/높이/너비 동적 축으로 export 후 원자적으로 저장"""
+    pixel_values = torch.zeros((1, 3, 320, 480), dtype=torch.float32)
+    with torch.no_grad():
+        num_outputs = len(backbone(pixel_values).feature_maps)
+    output_names = [f"feature_map_{index}" for index in range(num_outputs)]
+    dynamic_axes = {"pixel_values": {0: "batch", 2: "height", 3: "width"}}
+    for name in output_names:
+        dynamic_axes[name] = {0: "batch", 2: f"{name}_height", 3: f"{name}_width"}
+
+    directory = os.path.dirname(os.path.abspath(onnx_path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".onnx.tmp")
+    os.close(fd)
+    try:
+        with torch.no_grad():
+            torch.onnx.export(
+                _ExportWrapper(backbone),
+                (pixel_values,),
+                tmp_path,
+                input_names=["pixel_values"],
+                output_names=output_names,
+                dynamic_axes=dynamic_axes,
+                opset_version=ONNX_OPSET,
+                dynamo=False,
+            )
+        os.replace(tmp_path, onnx_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def _create_session(onnx_path: str, threads: int):
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.log_severity_level = 3  # 경고 이하 로그 숨김
+    if threads > 0:
+        options.intra_op_num_threads = threads
+    return ort.InferenceSession(
+        onnx_path, sess_options=options, providers=["CPUExecutionProvider"]
+    )
+
+
+def _validate(backbone, session) -> float:
+    """여러 배치/해상도의 임의 입력으로 PyTorch 백본과 비교, 최대 오차 반환"""
+    generator = torch.Generator().manual_seed(0)
+    error = 0.0
+    for batch, height, width in VALIDATION_SHAPES:
+        pixel_values = torch.randn((batch, 3, height, width), generator=generator)
+        with torch.no_grad():
+            expected = backbone(pixel_values).feature_maps
+        actual = session.run(None, {"pixel_values": pixel_values.numpy()})
+        if len(actual) != len(expected):
+            return float("inf")
+        for feature_map, reference in zip(actual, expected):
+            error = max(
+                error, float((torch.from_numpy(feature_map) - reference).abs().max())
+            )
+    return error
+
+
+class OnnxBackbone(nn.Module):
+    """
+    ONNX Runtime 세션으로 ResNet 백본 forward를 대신하는 모듈
+
+    세션 실행 오류 시에는 원래 PyTorch 백본으로 처리한다.
+    """
+
+    def __init__(self, torch_backbone, session):
+        super().__init__()
+        self.torch_backbone = torch_backbone
+        self.channels = torch_backbone.channels
+        self.session = session
+        self.fallbacks = 0
+
+    def forward(self, pixel_values):
+        try:
+            feature_maps = self.session.run(
+                None, {"pixel_values": pixel_values.detach().cpu().numpy()}
+            )
+            return BackboneOutput(
+                tuple(torch.from_numpy(feature_map) for feature_map in feature_maps)
+            )
+        except Exception as e:
+            print(f"[AI ONNX] ⚠️  ONNX Runtime 실행 실패, PyTorch 백본으로 처리: {e}")
+            self.fallbacks += 1
+            return self.torch_backbone(pixel_values)
+
+
+def enable_onnx_backbone(model, checkpoint_path: str, threads: int = 0):
+    """
+    체크포인트 옆의 백본 ONNX 파일을 사용(없거나 오래되면 export)하도록 모델을 교체
+
+    Raises:
+        RuntimeError: onnxruntime 미설치, export 실패 또는 검증 오차 초과
+    """
+    if ort is None:
+        raise RuntimeError("onnxruntime 패키지가 설치되지 않았습니다.")
+
+    # CustomDeta -> DetaForObjectDetection -> DetaModel -> 백본 래퍼 -> ResNet
+    deta_backbone = model.model.model.backbone
+    backbone = deta_backbone.model
+    if isinstance(backbone, OnnxBackbone):
+        backbone = backbone.torch_backbone
+
+    onnx_path = onnx_path_for(checkpoint_path)
+    if not os.path.exists(onnx_path) or os.path.getmtime(
+        onnx_path
+    ) < os.path.getmtime(checkpoint_path):
+        print(f"[AI ONNX] 백본 ONNX export 중: {onnx_path}")
+        export_backbone(backbone, onnx_path)
+
+    session = _create_session(onnx_path, threads)
+    error = _validate(backbone, session)
+    if error > VALIDATION_ATOL:
+        raise RuntimeError(f"ONNX 백본 출력이 PyTorch와 다릅니다 (최대 오차 {error:.2e})")
+    print(f"[AI ONNX] ✅ 백본 세션 준비 (최대 오차 {error:.1e})")
+
+    deta_backbone.model = OnnxBackbone(backbone, session)
+    return model
+
+
+def disable_onnx_backbone(model):
+    """PyTorch 백본으로 되돌림 (벤치마크 비교용)"""
+    deta_backbone = model.model.model.backbone
+    if isinstance(deta_backbone.model, OnnxBackbone):
+        deta_backbone.model = deta_backbone.model.torch_backbone
+    return model
@@ -0,0 +1,132 @@
+"""
+손상 탐지 결과 캐시
+
+같은 사진이 재시도, 조사 다시 열기, 여러 사람의 검토로 반복 제출될 때
+DETA forward pass를 다시 실행하지 않도록 탐지 결과(JSON)를 저장한다.
+
+키: sha256(이미지 바이트) + 모델 식별자(체크포인트 경로/mtime) + 후처리 설정.
+모델 파일이 바뀌거나 threshold/NMS 설정이 바뀌면 키가 달라져 자연히 무효화된다.
+
+- 메모리: 직렬화된 JSON 바이트 기준 LRU (AI_RESULT_CACHE_MAX_BYTES)
+- 디스크(선택): AI_RESULT_CACHE_DIR/ab/<key>.json, 임시 파일에 쓴 뒤 rename
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+from collections import OrderedDict
+from pathlib import Path
+from threading import Lock
+from typing import Optional
+
+
+def make_result_key(image_bytes: bytes, model_identity: str, config: str) -> str:
+    """이미지 내용 해시와 모델/설정 식별자로 결과 캐시 키 생성"""
+    digest = hashlib.sha256(image_bytes).hexdigest()
+    return hashlib.sha256(f"{digest}|{model_identity}|{config}".encode()).hexdigest()
+
+
+class InferenceResultCache:
+    """바이트 상한 메모리 LRU + 선택적 디스크 캐시."""
+
+    def __init__(self, max_bytes: int, disk_dir: str = "") -> None:
+        self.max_bytes = max(0, max_bytes)
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self._items: "OrderedDict[str, bytes]" = OrderedDict()
+        self._bytes = 0
+        self._lock = Lock()
+        # 통계
+        self.hits = {"memory": 0, "disk": 0}
+        self.misses = 0
+        self.stores = 0
+
+    def _disk_path(self, key: str) -> Path:
+        return self.disk_dir / key[:2] / f"{key}.json"
+
+    def _put_memory(self, key: str, payload: bytes) -> None:
+        if len(payload) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._items.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous)
+            self._items[key] = payload
+            self._bytes += len(payload)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def get_memory(self, key: str) -> Optional[dict]:
+        """메모리 조회 (이벤트 루프에서 바로 호출 가능)"""
+        with self._lock:
+            payload = self._items.get(key)
+            if payload is None:
+                return None
+            self._items.move_to_end(key)
+            self.hits["memory"] += 1
+        return json.loads(payload)
+
+    def get_disk(self, key: str) -> Optional[dict]:
+        """디스크 조회 (적중 시 메모리로 승격). 파일 I/O이므로 스레드에서 호출"""
+        if self.disk_dir is None:
+            return None
+        try:
+            payload = self._disk_path(key).read_bytes()
+            result = json.loads(payload)
+        except (OSError, ValueError):
+            return None
+        self._put_memory(key, payload)
+        with self._lock:
+            self.hits["disk"] += 1
+        return result
+
+    def record_miss(self) -> None:
+        with self._lock:
+            self.misses += 1
+
+    def set(self, key: str, result: dict) -> bytes:
+        """메모리에 저장하고 디스크에 쓸 직렬화 바이트 반환"""
+        payload = json.dumps(result, ensure_ascii=False).encode("utf-8")
+        self._put_memory(key, payload)
+        with self._lock:
+            self.stores += 1
+        return payload
+
+    def write_disk(self, key: str, payload: bytes) -> None:
+        """디스크 저장 (실패해도 무시). 파일 I/O이므로 스레드에서 호출"""
+        if self.disk_dir is None:
+            return
+        path = self._disk_path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(
+                dir=path.parent, prefix=".", suffix=".tmp"
+            )
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(payload)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except OSError as e:
+            print(f"[AI Result Cache] 디스크 저장 실패: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits["memory"] + self.hits["disk"] + self.misses
+            return {
+                "items": len(self._items),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "disk_dir": str(self.disk_dir) if self.disk_dir else None,
+                "hits": dict(self.hits),
+                "misses": self.misses,
+                "stores": self.stores,
+                "hit_rate": (
+                    round((lookups - self.misses) / lookups, 3) if lookups else None
+                ),
+            }
@@ -3,19 +3,51 @@ AI Detection API 라우터
 /ai/* 엔드포인트 정의
 """
 
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from .service import detect_damage
+import asyncio
+import json
+import tempfile
+from typing import List, Optional, Tuple
+
+from fastapi import APIRouter, UploadFile, File, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from .service import (
+    MAX_BATCH_IMAGES,
+    MAX_IMAGE_BYTES,
+    RESOLUTION_PROFILES,
+    ImageSource,
+    archive_sources,
+    detect_damage_cached,
+    detect_damage_stream,
+    get_result_cache_stats,
+    get_scheduler_stats,
+    resolve_resolution_profile,
+    resolve_tiling,
+)
 from .loader import (
     is_model_loaded,
     get_id2label,
     get_id2label_korean,
     get_model,
+    get_model_backend,
+    is_model_quantized,
     load_ai_model,
 )
 
 router = APIRouter(tags=["AI Detection"])
 
 
+def _ensure_model_loaded() -> None:
+    """모델이 로드되지 않은 경우 자동 재로딩 시도 (실패 시 503)"""
+    if not is_model_loaded():
+        print("[AI Router] ⚠️  모델이 로드되지 않음, 자동 재로딩 시도...")
+        reloaded = load_ai_model(max_retries=2, retry_delay=1)
+        if not reloaded:
+            raise HTTPException(
+                status_code=503,
+                detail="AI 모델이 로드되지 않았습니다. 서버 관리자에게 문의하세요.",
+            )
+
+
 @router.get("/model/status")
 async def ai_model_status():
     """
@@ -26,6 +58,11 @@ async def ai_model_status():
         - available: 모델 사용 가능 여부
         - labels: 클래스 레이블 맵
         - device: 모델이 로드된 디바이스
+        - quantized: INT8 동적 양자화 여부
+        - backend: 추론 백엔드 ("pytorch" 또는 "onnx")
+        - resolution: 기본 해상도 프로필과 프로필별 리사이즈 크기
+        - batching: 추론 배치 스케줄러 통계 (배치 수, 평균/최대 배치 크기)
+        - result_cache: 탐지 결과 캐시 통계 (항목 수, 바이트, 적중률)
     """
     if not is_model_loaded():
         return {"status": "not_loaded", "available": False}
@@ -41,16 +78,40 @@ async def ai_model_status():
         "labels_korean": id2label_korean,  # 한글 레이블 추가
         "num_classes": len(id2label) if id2label else 0,
         "device": str(next(model.parameters()).device),
+        "quantized": is_model_quantized(),
+        "backend": get_model_backend(),
+        "resolution": {
+            "default": resolve_resolution_profile(),
+            "profiles": RESOLUTION_PROFILES,
+        },
+        "batching": get_scheduler_stats(),
+        "result_cache": get_result_cache_stats(),
     }
 
 
 @router.post("/damage/infer")
-async def ai_damage_infer(image: UploadFile = File(...)):
+async def ai_damage_infer(
+    response: Response,
+    image: UploadFile = File(...),
+    profile: Optional[str] = Query(
+        None, description="해상도 프로필: fast / balanced / accurate"
+    ),
+    tiled: bool = Query(False, description="겹치는 타일로 나눠 고해상도 추론"),
+    tile_size: Optional[int] = Query(None, description="타일 크기 (px)"),
+    tile_overlap: Optional[int] = Query(None, description="타일 겹침 (px)"),
+):
     """
     이미지에서 손상 영역 탐지
 
     Args:
         - image: 업로드할 이미지 파일 (JPG, PNG 등)
+        - profile: 해상도 프로필 (쿼리, 생략 시 AI_RESOLUTION_PROFILE)
+            - fast: 짧은 변 512px, 현장 빠른 확인용
+            - balanced: 짧은 변 640px
+            - accurate: 짧은 변 800px, 작은 손상 재현율 우선
+        - tiled: true면 전체 이미지와 겹치는 타일들을 함께 배치 추론해 합침
+            (전면 사진의 작은 균열 등, 타일마다 profile 해상도로 추론)
+        - tile_size, tile_overlap: 타일 크기/겹침 (생략 시 AI_TILE_SIZE, AI_TILE_OVERLAP)
 
     Returns:
         - detections: 탐지된 손상 영역 리스트
@@ -58,16 +119,15 @@ async def ai_damage_infer(image: UploadFile = File(...)):
             - score: 신뢰도 (0~1)
             - bbox: 바운딩 박스 [x1, y1, x2, y2]
         - count: 탐지된 객체 수
+        - tiles: 타일 추론에 사용한 입력 수 (전체 이미지 포함, tiled일 때만)
+
+    Headers:
+        - X-Inference-Cache: HIT-MEM / HIT-DISK (같은 이미지의 이전 결과), MISS, BYPASS
+        - X-Inference-Profile: 사용한 해상도 프로필
     """
-    # 모델이 로드되지 않은 경우 자동 재로딩 시도
-    if not is_model_loaded():
-        print("[AI Router] ⚠️  모델이 로드되지 않음, 자동 재로딩 시도...")
-        reloaded = load_ai_model(max_retries=2, retry_delay=1)
-        if not reloaded:
-            raise HTTPException(
-                status_code=503,
-                detail="AI 모델이 로드되지 않았습니다. 서버 관리자에게 문의하세요.",
-            )
+    profile = resolve_resolution_profile(profile)
+    tiling = resolve_tiling(tiled, tile_size, tile_overlap)
+    _ensure_model_loaded()
 
     try:
         contents = await image.read()
@@ -80,7 +140,10 @@ async def ai_damage_infer(image: UploadFile = File(...)):
                 status_code=400, detail="이미지 크기가 너무 큽니다. (최대 10MB)"
             )
 
-        return await detect_damage(contents)
+        result, cache_status = await detect_damage_cached(contents, profile, tiling)
+        response.headers["X-Inference-Cache"] = cache_status
+        response.headers["X-Inference-Profile"] = profile
+        return result
     except HTTPException:
         # HTTPException은 그대로 전달
         raise
@@ -107,3 +170,129 @@ async def ai_damage_infer(image: UploadFile = File(...)):
             status_code=500,
             detail=f"이미지 처리 중 오류가 발생했습니다: {error_detail}",
         )
+
+
+# 스풀 파일을 메모리에 두는 최대 크기 (넘으면 디스크 임시 파일)
+SPOOL_MEMORY_BYTES = 1024 * 1024
+SPOOL_CHUNK_BYTES = 1024 * 1024
+
+
+def _spool(fileobj, limit: Optional[int] = None, on_disk: bool = False):
+    """
+    업로드 내용을 응답 스트림이 소유하는 임시 파일로 복사.
+    UploadFile은 엔드포인트가 반환된 뒤 닫힐 수 있으므로 스트리밍 중에는 이 사본을 읽는다.
+    on_disk면 처음부터 실제 임시 파일에 쓴다 (zipfile은 seekable()을 호출하는데
+    Python 3.11 미만의 SpooledTemporaryFile에는 없음). limit을 넘으면 None
+    """
+    if on_disk:
+        spooled = tempfile.TemporaryFile()
+    else:
+        spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_BYTES)
+    fileobj.seek(0)
+    copied = 0
+    while True:
+        chunk = fileobj.read(SPOOL_CHUNK_BYTES)
+        if not chunk:
+            break
+        copied += len(chunk)
+        if limit is not None and copied > limit:
+            spooled.close()
+            return None
+        spooled.write(chunk)
+    spooled.seek(0)
+    return spooled
+
+
+def _upload_source(upload: UploadFile, spooled) -> ImageSource:
+    def load() -> bytes:
+        if spooled is None:
+            raise HTTPException(
+                status_code=400, detail="이미지 크기가 너무 큽니다. (최대 10MB)"
+            )
+        return spooled.read()
+
+    return upload.filename or "", load
+
+
+def _spool_batch(
+    images: List[UploadFile], archive: Optional[UploadFile]
+) -> Tuple[List[ImageSource], list]:
+    """업로드를 모두 임시 파일로 옮기고 (이미지 항목 목록, 닫아야 할 파일 목록) 반환"""
+    sources: List[ImageSource] = []
+    files = []
+    try:
+        for upload in images:
+            spooled = None
+            if upload.size is None or upload.size <= MAX_IMAGE_BYTES:
+                spooled = _spool(upload.file, MAX_IMAGE_BYTES)
+            if spooled is not None:
+                files.append(spooled)
+            sources.append(_upload_source(upload, spooled))
+        if archive is not None:
+            spooled = _spool(archive.file, on_disk=True)
+            files.append(spooled)
+            sources.extend(archive_sources(spooled))
+    except BaseException:
+        _close_all(files)
+        raise
+    return sources, files
+
+
+def _close_all(files: list) -> None:
+    for spooled in files:
+        spooled.close()
+
+
+@router.post("/damage/infer/batch")
+async def ai_damage_infer_batch(
+    images: Optional[List[UploadFile]] = File(None),
+    archive: Optional[UploadFile] = File(None),
+):
+    """
+    여러 이미지에서 손상 영역 일괄 탐지 (NDJSON 스트리밍)
+
+    동시 요청과 함께 배치로 추론하며, 이미지 하나가 끝날 때마다 한 줄씩 응답한다.
+    줄 순서는 처리 완료 순서이므로 index로 요청 순서를 확인한다.
+
+    Args:
+        - images: 이미지 파일 여러 개 (같은 필드 이름으로 반복)
+        - archive: 이미지가 들어 있는 zip 파일 (images와 함께 보내면 images 뒤에 처리)
+
+    Returns (application/x-ndjson, 이미지마다 한 줄):
+        - index: 요청 내 순번 (images 다음 archive 항목 순)
+        - filename: 파일 이름 (zip 내부 경로)
+        - status: 200 또는 오류 상태 코드
+        - cache: 탐지 결과 캐시 상태 (X-Inference-Cache와 동일)
+        - detections, count, grade, explanation: 성공 시 /damage/infer와 동일
+        - error: 실패 시 오류 메시지
+    """
+    # 스트리밍은 엔드포인트가 반환된 뒤에 진행되므로 업로드를 먼저 임시 파일로 옮김
+    sources, files = await asyncio.to_thread(_spool_batch, images or [], archive)
+    try:
+        if not sources:
+            raise HTTPException(
+                status_code=400, detail="images 또는 archive에 이미지가 없습니다."
+            )
+        if len(sources) > MAX_BATCH_IMAGES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"이미지는 최대 {MAX_BATCH_IMAGES}장까지 요청할 수 있습니다. (현재: {len(sources)}장)",
+            )
+
+        _ensure_model_loaded()
+    except BaseException:
+        _close_all(files)
+        raise
+
+    async def lines():
+        try:
+            async for item in detect_damage_stream(sources):
+                yield json.dumps(item, ensure_ascii=False) + "\n"
+        finally:
+            _close_all(files)
+
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"X-Image-Count": str(len(sources))},
+    )
@@ -0,0 +1,270 @@
+"""
+AI 추론 마이크로 배치 스케줄러
+
+동시에 들어온 /ai/damage/infer 요청을 짧은 대기 시간 동안 모아
+한 번의 forward pass로 처리하고, 결과를 각 요청에 나눠 돌려준다.
+CPU에서는 배치 크기 1로 여러 번 실행하는 것보다 처리량이 크게 높다.
+
+- 배치는 최대 크기(AI_BATCH_MAX_SIZE)가 차거나 대기 시간(AI_BATCH_WAIT_MS)이
+  지나면 실행된다. 실행 중에 들어온 요청은 다음 배치로 모인다.
+- 입력 크기(pixel_values의 shape)가 같은 요청끼리만 묶는다. 크기가 다른 입력을
+  패딩해 함께 실행하면 DETA의 점수가 함께 묶인 다른 입력에 따라 달라지고,
+  그 결과가 이미지 해시로 결과 캐시에 저장되기 때문이다. 크기가 다른 요청은
+  순서를 유지한 채 다음 배치로 넘어간다.
+- forward pass는 전용 스레드 하나에서만 실행되어, 모델이 바쁠 때도
+  기본 스레드 풀을 쓰는 다른 라우트(/image, /heritage)를 막지 않는다.
+- 처리 중인 요청 수는 AI_QUEUE_MAX로 제한한다. 가득 차면 기다리지 않고
+  InferenceQueueFull을 올려 호출자가 503 + Retry-After로 응답하게 한다.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import math
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, List, NamedTuple, Optional, Sequence, Tuple
+
+# (pixel_values 목록, target_sizes 목록) -> 요청별 결과 목록. 전용 스레드에서 실행됨
+BatchRunner = Callable[[Sequence[Any], Sequence[Tuple[int, int]]], List[Any]]
+
+
+class InferenceQueueFull(Exception):
+    """추론 대기열이 가득 참 (retry_after: 재시도 권장 대기 시간, 초)"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"inference queue full (retry after {retry_after}s)")
+        self.retry_after = retry_after
+
+
+class _PendingRequest(NamedTuple):
+    pixel_values: Any
+    target_size: Tuple[int, int]
+    future: asyncio.Future
+    enqueued_at: float
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return tuple(getattr(self.pixel_values, "shape", ()))
+
+
+class InferenceScheduler:
+    """요청을 모아 배치로 실행하는 스케줄러 (이벤트 루프당 하나의 실행 태스크)."""
+
+    def __init__(
+        self,
+        runner: BatchRunner,
+        max_batch_size: int,
+        max_wait_ms: float,
+        max_pending: int,
+    ):
+        self.runner = runner
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms / 1000)
+        self.max_pending = max(1, max_pending)
+        # 대기 중인 요청. 새 요청이 들어오면 _wakeup으로 실행 태스크를 깨운다
+        # (asyncio.Queue.get을 wait_for로 취소하면 Python 3.12 미만에서 꺼낸 요청이 유실될 수 있음)
+        self._pending: Deque[_PendingRequest] = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._inflight: List[_PendingRequest] = []
+        # 자리를 확보한 요청 수 (전처리 ~ 결과 반환)
+        self._reserved = 0
+        # 통계
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+        self.rejected = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.run_total = 0.0
+        self.runs = 0  # 실행이 끝난 배치 수 (run_total 평균용)
+
+    def _ensure_started(self) -> None:
+        if self._task is None or self._task.done():
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix="ai-inference"
+                )
+            # 이벤트는 실행 중인 루프에서 만든다 (Python 3.9는 생성 시점의 루프에 묶임)
+            self._wakeup = asyncio.Event()
+            if self._pending:
+                self._wakeup.set()
+            self._task = asyncio.create_task(self._run())
+
+    def retry_after(self) -> int:
+        """현재 확보된 요청을 모두 처리하는 데 걸릴 예상 시간 (초, 최소 1)"""
+        avg_run = self.run_total / self.runs if self.runs else 1.0
+        pending_batches = math.ceil(self._reserved / self.max_batch_size)
+        return max(1, math.ceil(avg_run * pending_batches))
+
+    @contextmanager
+    def reserve(self, count: int = 1):
+        """
+        요청 자리 확보 (전처리 전에 잡아 전처리 작업량도 함께 제한)
+
+        Args:
+            count: 제출할 입력 수 (타일 추론 등, max_pending 이하)
+
+        Raises:
+            ValueError: count가 max_pending보다 큼 (대기열이 비어도 확보할 수 없음)
+            InferenceQueueFull: 남은 자리가 count개보다 적음
+        """
+        count = max(1, count)
+        if count > self.max_pending:
+            raise ValueError(
+                f"입력 {count}개는 대기열 상한 {self.max_pending}개를 넘어 확보할 수 없습니다"
+            )
+        if self._reserved + count > self.max_pending:
+            self.rejected += 1
+            raise InferenceQueueFull(self.retry_after())
+        self._reserved += count
+        try:
+            yield
+        finally:
+            self._reserved -= count
+
+    async def submit(self, pixel_values: Any, target_size: Tuple[int, int]) -> Any:
+        """
+        입력 하나를 배치 대기열에 넣고 결과를 기다림
+
+        Args:
+            pixel_values: 전처리된 이미지 텐서 (C, H, W)
+            target_size: 후처리 기준 원본 크기 (height, width)
+        """
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(
+            _PendingRequest(pixel_values, target_size, future, time.perf_counter())
+        )
+        self._wakeup.set()
+        return await future
+
+    def _count_shape(self, shape: Tuple[int, ...]) -> int:
+        return sum(1 for request in self._pending if request.shape == shape)
+
+    async def _collect(self) -> List[_PendingRequest]:
+        """
+        첫 요청이 들어온 뒤 같은 크기의 요청으로 배치가 차거나 대기 시간이 지날 때까지
+        모아서 꺼냄. 시간 제한은 이벤트 대기에만 걸고 요청은 대기열에서 바로 꺼내므로
+        시간 초과로 취소돼도 요청이 사라지지 않는다.
+        """
+        while not self._pending:
+            self._wakeup.clear()
+            await self._wakeup.wait()
+
+        shape = self._pending[0].shape
+        deadline = time.perf_counter() + self.max_wait
+        while self._count_shape(shape) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                break
+
+        # 크기가 다른 요청은 건너뛰고 대기열 앞에 그대로 남김
+        batch: List[_PendingRequest] = []
+        skipped: List[_PendingRequest] = []
+        while self._pending and len(batch) < self.max_batch_size:
+            request = self._pending.popleft()
+            (batch if request.shape == shape else skipped).append(request)
+        self._pending.extendleft(reversed(skipped))
+        # 기다리다 연결이 끊긴 요청은 제외
+        return [request for request in batch if not request.future.done()]
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            self.batches += 1
+            self.items += len(batch)
+            self.largest_batch = max(self.largest_batch, len(batch))
+            for request in batch:
+                waited = started - request.enqueued_at
+                self.wait_total += waited
+                self.wait_max = max(self.wait_max, waited)
+
+            self._inflight = batch
+            try:
+                results = await loop.run_in_executor(
+                    self._executor,
+                    self.runner,
+                    [request.pixel_values for request in batch],
+                    [request.target_size for request in batch],
+                )
+            except Exception as e:
+                self._inflight = []
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+                continue
+            finally:
+                self.run_total += time.perf_counter() - started
+                self.runs += 1
+
+            self._inflight = []
+            for request, result in zip(batch, results):
+                if not request.future.done():
+                    request.future.set_result(result)
+
+    async def stop(self) -> None:
+        """실행 태스크와 전용 스레드 종료 (실행 중이거나 대기 중인 요청은 취소)"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        pending = list(self._inflight)
+        self._inflight = []
+        pending.extend(self._pending)
+        self._pending.clear()
+        self._wakeup = None
+        for request in pending:
+            if not request.future.done():
+                request.future.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": round(self.max_wait * 1000, 1),
+            "batches": self.batches,
+            "requests": self.items,
+            "avg_batch_size": (
+                round(self.items / self.batches, 2) if self.batches else None
+            ),
+            "largest_batch": self.largest_batch,
+            "queue": {
+                "depth": len(self._pending),
+                "running": len(self._inflight),
+                "reserved": self._reserved,
+                "max_pending": self.max_pending,
+                "rejected": self.rejected,
+            },
+            "wait_ms": {
+                "avg": (
+                    round(self.wait_total / self.items * 1000, 1)
+                    if self.items
+                    else None
+                ),
+                "max": round(self.wait_max * 1000, 1),
+            },
+            "batch_ms": {
+                "avg": (
+                    round(self.run_total / self.runs * 1000, 1)
+                    if self.runs
+                    else None
+                ),
+            },
+        }
@@ -5,19 +5,31 @@ AI 손상 탐지 서비스
 
 from __future__ import annotations
 
+import asyncio
 import io
+import json
+import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import torch
-from torchvision.ops import nms
+from torchvision.ops import batched_nms
 from PIL import Image
 from fastapi import HTTPException
-from typing import List, Dict, Tuple
+from typing import AsyncIterator, Callable, Dict, Iterable, List, Optional, Tuple
+from common.config import settings
 from .loader import (
     get_model,
     get_processor,
     get_id2label,
     get_id2label_korean,
+    get_model_backend,
+    get_resolved_model_path,
     is_model_loaded,
+    is_model_quantized,
 )
+from .result_cache import InferenceResultCache, make_result_key
+from .scheduler import InferenceQueueFull, InferenceScheduler
 
 # 노트북 설정과 동일한 클래스별 Threshold (visualize_test.ipynb 참고)
 CLASS_THRESHOLDS = {
@@ -30,6 +42,35 @@ CLASS_THRESHOLDS = {
 # NMS IoU Threshold (노트북과 동일)
 NMS_IOU_THRESHOLD = 0.1
 
+# 추론 해상도 프로필 (DetaImageProcessor 리사이즈 크기, 긴 변은 기본값과 같은 1333/800 비율)
+# fast: 현장 빠른 확인, balanced: 중간, accurate: 프로세서 기본값 (작은 손상 재현율 우선)
+RESOLUTION_PROFILES = {
+    "fast": {"shortest_edge": 512, "longest_edge": 853},
+    "balanced": {"shortest_edge": 640, "longest_edge": 1066},
+    "accurate": {"shortest_edge": 800, "longest_edge": 1333},
+}
+
+# 일괄 추론 (/ai/damage/infer/batch)
+MAX_BATCH_IMAGES = 300  # 요청 하나에 포함할 수 있는 최대 이미지 수
+MAX_IMAGE_BYTES = 10 * 1024 * 1024  # 이미지 1장 최대 크기 (단건 추론과 동일)
+BATCH_QUEUE_RETRIES = 5  # 대기열 초과(503) 시 Retry-After만큼 기다렸다 재시도하는 횟수
+ARCHIVE_IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".bmp", ".tif", ".tiff"}
+
+# 업로드 이미지 최대 해상도 (넘으면 비율 유지 축소, 최대 4096x4096)
+MAX_DIMENSION = 4096
+
+# 타일 추론 (/ai/damage/infer?tiled=true)
+MIN_TILE_SIZE = 256  # 최소 타일 크기 (px)
+# 요청 하나의 최대 타일 수 (4096x4096, 타일 1024/겹침 256이면 25개).
+# 전체 이미지와 함께 대기열 자리를 한 번에 확보하므로 AI_QUEUE_MAX - 1개를 넘지 않는다
+MAX_TILES = 48
+
+# 이 크기 이상의 이미지는 해시 계산을 스레드에서 실행 (이벤트 루프 보호)
+HASH_IN_THREAD_BYTES = 1024 * 1024
+
+# (파일 이름, 이미지 바이트를 읽는 함수)
+ImageSource = Tuple[str, Callable[[], bytes]]
+
 
 def _calculate_grade(detections: List[Dict]) -> Tuple[str, str]:
     """
@@ -64,154 +105,606 @@ def _calculate_grade(detections: List[Dict]) -> Tuple[str, str]:
     return grade, message
 
 
-def _filter_by_class_threshold(boxes, scores, labels, class_thresholds):
-    """클래스별로 다른 threshold 적용 (노트북과 동일한 로직)"""
-    filtered_boxes = []
-    filtered_scores = []
-    filtered_labels = []
-
-    for box, score, label in zip(boxes, scores, labels):
-        # label을 안전하게 정수로 변환
-        if torch.is_tensor(label):
-            if label.numel() == 1:
-                label_int = int(label.item())
-            else:
-                continue  # 유효하지 않은 label
-        else:
-            label_int = int(label)
+# (클래스별 threshold 항목, 디바이스) -> 클래스 ID로 조회하는 threshold 표
+_threshold_tables: Dict[Tuple[tuple, str], torch.Tensor] = {}
 
-        # 해당 클래스의 threshold 가져오기 (기본값 0.5)
-        threshold = class_thresholds.get(label_int, 0.5)
 
-        # score를 안전하게 비교
-        if torch.is_tensor(score):
-            if score.numel() == 1:
-                score_value = score.item()
-            else:
-                continue  # 유효하지 않은 score
-        else:
-            score_value = float(score)
+def _threshold_table(class_thresholds, size: int, device) -> torch.Tensor:
+    """
+    클래스 ID -> threshold 표 (설정/디바이스별로 한 번 만들어 재사용).
+    표에 없는 클래스는 0.5, 더 큰 클래스 ID가 나오면 그 크기로 다시 만든다.
+    """
+    key = (tuple(sorted(class_thresholds.items())), str(device))
+    table = _threshold_tables.get(key)
+    if table is None or table.numel() < size:
+        size = max(size, max(class_thresholds, default=0) + 1)
+        table = torch.full((size,), 0.5, dtype=torch.float64)
+        for label_id, threshold in class_thresholds.items():
+            table[label_id] = threshold
+        table = table.to(device)
+        _threshold_tables[key] = table
+    return table
+
+
+def _filter_by_class_threshold(boxes, scores, labels, class_thresholds):
+    """
+    클래스별로 다른 threshold 적용 (노트북과 동일한 기준, 텐서 연산)
 
-        if score_value >= threshold:
-            filtered_boxes.append(box)
-            filtered_scores.append(score)
-            filtered_labels.append(label)
+    클래스 ID로 threshold 표를 조회해 한 번의 마스킹으로 걸러낸다.
+    표에 없는 클래스는 0.5, 비교는 float64로 해 Python float 비교와 같은 결과를 낸다.
+    """
+    boxes = torch.as_tensor(boxes, dtype=torch.float32)
+    scores = torch.as_tensor(scores, dtype=torch.float32)
+    labels = torch.as_tensor(labels, dtype=torch.int64)
+    if labels.numel() == 0:
+        return boxes.reshape(-1, 4), scores, labels
 
-    return filtered_boxes, filtered_scores, filtered_labels
+    table = _threshold_table(class_thresholds, int(labels.max()) + 1, labels.device)
+    keep = scores.double() >= table[labels]
+    return boxes[keep], scores[keep], labels[keep]
 
 
 def _apply_nms(boxes, scores, labels, iou_threshold=0.5):
-    """NMS 적용 (노트북과 동일한 로직)"""
-    if len(boxes) == 0:
-        return [], [], []
-
-    def _prepare_tensor(values, dtype):
-        """list/tuple/tensor 입력을 안전하게 텐서로 변환"""
-        if torch.is_tensor(values):
-            tensor = values.detach()
-            if values.requires_grad:
-                tensor = tensor.clone()
-            return tensor.to(dtype=dtype)
-
-        if not isinstance(values, (list, tuple)):
-            return torch.tensor(values, dtype=dtype)
-
-        if len(values) == 0:
-            return torch.empty((0,), dtype=dtype)
-
-        prepared = []
-        for item in values:
-            if torch.is_tensor(item):
-                t = item.detach()
-                if item.requires_grad:
-                    t = t.clone()
-                prepared.append(t.to(dtype=dtype))
-            else:
-                prepared.append(torch.tensor(item, dtype=dtype))
+    """
+    클래스별 NMS 적용 (노트북과 동일한 로직, torchvision batched_nms)
 
-        try:
-            return torch.stack(prepared)
-        except RuntimeError:
-            # 스택에 실패하면 (예: 스칼라 혼합) cat 대신 1D 텐서를 생성
-            flattened = [
-                item.item() if torch.is_tensor(item) and item.numel() == 1 else item
-                for item in prepared
-            ]
-            return torch.tensor(flattened, dtype=dtype)
-
-    # 텐서로 변환
-    boxes_tensor = _prepare_tensor(boxes, torch.float32)
-    scores_tensor = _prepare_tensor(scores, torch.float32)
-    labels_tensor = _prepare_tensor(labels, torch.int64)
-
-    # 디바이스 통일
-    device = boxes_tensor.device
-    scores_tensor = scores_tensor.to(device)
-    labels_tensor = labels_tensor.to(device)
-
-    keep_indices = []
-    unique_labels = labels_tensor.unique()
-
-    # 클래스별로 NMS 적용
-    for label_tensor in unique_labels:
-        # 텐서를 스칼라로 변환 (안전하게)
-        if label_tensor.numel() == 1:
-            label_value = label_tensor.item()
-        else:
-            continue  # 유효하지 않은 label
-
-        mask = labels_tensor == label_value
-        class_boxes = boxes_tensor[mask]
-        class_scores = scores_tensor[mask]
-        class_indices = torch.where(mask)[0]
-
-        if len(class_boxes) > 0:
-            keep = nms(class_boxes, class_scores, iou_threshold)
-
-            # keep이 텐서인 경우 리스트로 변환
-            if torch.is_tensor(keep):
-                keep_list = keep.cpu().tolist()
-            else:
-                keep_list = list(keep) if isinstance(keep, (list, tuple)) else [keep]
-
-            # class_indices를 안전하게 처리
-            if torch.is_tensor(class_indices):
-                # keep_list의 인덱스를 사용하여 class_indices에서 실제 인덱스 가져오기
-                for keep_idx in keep_list:
-                    if 0 <= keep_idx < len(class_indices):
-                        original_idx = class_indices[keep_idx]
-                        # original_idx가 텐서인 경우 스칼라로 변환
-                        if torch.is_tensor(original_idx):
-                            if original_idx.numel() == 1:
-                                keep_indices.append(int(original_idx.item()))
-                            else:
-                                continue
-                        else:
-                            keep_indices.append(int(original_idx))
-            else:
-                # class_indices가 리스트인 경우
-                keep_indices.extend(
-                    [
-                        int(class_indices[i])
-                        for i in keep_list
-                        if 0 <= i < len(class_indices)
-                    ]
-                )
+    남은 탐지는 입력 순서를 유지한다 (batched_nms는 점수 순 인덱스를 반환).
+    batched_nms는 클래스마다 좌표를 큰 값만큼 옮겨 한 번에 NMS를 실행하는데,
+    float32로 옮기면 반올림 때문에 경계의 IoU가 클래스별 nms와 달라질 수 있어
+    float64로 변환해 넘긴다.
+    """
+    boxes = torch.as_tensor(boxes, dtype=torch.float32)
+    scores = torch.as_tensor(scores, dtype=torch.float32)
+    labels = torch.as_tensor(labels, dtype=torch.int64)
+    if boxes.numel() == 0:
+        return boxes.reshape(-1, 4), scores, labels
+
+    keep_mask = torch.zeros_like(labels, dtype=torch.bool)
+    keep = batched_nms(boxes.double(), scores.double(), labels, iou_threshold)
+    keep_mask[keep] = True
+    return boxes[keep_mask], scores[keep_mask], labels[keep_mask]
 
-    keep_indices = sorted(set(keep_indices))  # 중복 제거
-    filtered_boxes = [boxes[i] for i in keep_indices if i < len(boxes)]
-    filtered_scores = [scores[i] for i in keep_indices if i < len(scores)]
-    filtered_labels = [labels[i] for i in keep_indices if i < len(labels)]
 
-    return filtered_boxes, filtered_scores, filtered_labels
+def resolve_resolution_profile(profile: Optional[str] = None) -> str:
+    """
+    요청한 해상도 프로필 이름 확인 (없으면 AI_RESOLUTION_PROFILE)
 
+    Raises:
+        HTTPException: 알 수 없는 프로필 (400)
+    """
+    if not profile:
+        return DEFAULT_RESOLUTION_PROFILE
+    name = profile.lower()
+    if name not in RESOLUTION_PROFILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"알 수 없는 해상도 프로필입니다: {profile} (사용 가능: {', '.join(RESOLUTION_PROFILES)})",
+        )
+    return name
+
+
+def _capped_size(width: int, height: int) -> Tuple[int, int]:
+    """MAX_DIMENSION(4096)을 넘는 이미지의 축소 크기 (width, height). 후처리 기준 크기가 된다"""
+    if width > MAX_DIMENSION or height > MAX_DIMENSION:
+        scale = min(MAX_DIMENSION / width, MAX_DIMENSION / height)
+        return int(width * scale), int(height * scale)
+    return width, height
+
+
+def _resize_output_size(
+    height: int, width: int, size: Dict[str, int]
+) -> Tuple[int, int]:
+    """DetaImageProcessor(shortest_edge/longest_edge)와 같은 리사이즈 결과 크기 (height, width)"""
+    shortest_edge, longest_edge = size["shortest_edge"], size["longest_edge"]
+    raw_size = None
+    min_original_size = float(min(height, width))
+    max_original_size = float(max(height, width))
+    if max_original_size / min_original_size * shortest_edge > longest_edge:
+        raw_size = longest_edge * min_original_size / max_original_size
+        shortest_edge = int(round(raw_size))
+
+    if (height <= width and height == shortest_edge) or (
+        width <= height and width == shortest_edge
+    ):
+        return height, width
+    if width < height:
+        scale = raw_size if raw_size is not None else shortest_edge
+        return int(scale * height / width), shortest_edge
+    scale = raw_size if raw_size is not None else shortest_edge
+    return shortest_edge, int(scale * width / height)
+
+
+def _supports_fast_preprocess(processor, size: Dict[str, int]) -> bool:
+    """단일 패스 전처리로 같은 결과를 낼 수 있는 프로세서 설정인지 확인"""
+    return (
+        settings.AI_FAST_PREPROCESS
+        and set(size) == {"shortest_edge", "longest_edge"}
+        and processor.do_resize
+        and processor.do_rescale
+        and processor.do_normalize
+        and int(processor.resample) == Image.Resampling.BILINEAR
+    )
+
+
+def _prepare_input_fast(
+    image_bytes: bytes, processor, size: Dict[str, int]
+) -> Tuple[torch.Tensor, Tuple[int, int]]:
+    """
+    단일 패스 전처리 (_prepare_input과 같은 입력/출력)
 
-async def detect_damage(image_bytes: bytes) -> dict:
+    헤더로 최종 입력 크기를 먼저 계산해 JPEG는 축소 디코딩(draft, 1/2~1/8)하고,
+    4096 제한 리사이즈와 프로세서 리사이즈를 한 번의 bilinear 리사이즈로 합친다.
+    rescale/normalize는 uint8 이미지에서 결과 텐서로 바로 쓰는 addcmul 한 번으로 처리한다.
+    축소 디코딩 때문에 프로세서 결과와 픽셀 값이 약간 다를 수 있다 (preprocess_check.py).
+    """
+    try:
+        img = Image.open(io.BytesIO(image_bytes))
+        width, height = img.size
+        if width == 0 or height == 0:
+            raise HTTPException(
+                status_code=400, detail="이미지 크기가 유효하지 않습니다."
+            )
+        target_width, target_height = _capped_size(width, height)
+        output_height, output_width = _resize_output_size(
+            target_height, target_width, size
+        )
+        # 최종 크기 이상을 유지하는 가장 작은 배율로 디코딩 (JPEG 외 형식은 무시됨)
+        img.draft("RGB", (output_width, output_height))
+        img = img.convert("RGB")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=400, detail=f"이미지를 로드할 수 없습니다: {str(e)}"
+        )
+
+    try:
+        pixel_values = _resize_and_normalize(
+            img, (output_height, output_width), processor
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"이미지 전처리 중 오류가 발생했습니다: {str(e)}",
+        )
+
+    return pixel_values, (target_height, target_width)
+
+
+def _resize_and_normalize(
+    img: Image.Image, output_size: Tuple[int, int], processor
+) -> torch.Tensor:
+    """
+    RGB 이미지를 (height, width)로 bilinear 리사이즈 후 한 번의 텐서 연산으로 정규화.
+    결과 텐서는 배치 스케줄러 대기열에 들어가므로 재사용 버퍼 없이 호출마다 새로 할당하고,
+    uint8 이미지에서 바로 써서 중간 float 배열만 만들지 않는다.
+    """
+    output_height, output_width = output_size
+    if img.size != (output_width, output_height):
+        img = img.resize((output_width, output_height), Image.Resampling.BILINEAR)
+    pixels = torch.from_numpy(np.array(img)).permute(2, 0, 1)
+
+    # (x * rescale_factor - mean) / std = x * scale + bias
+    std = torch.tensor(processor.image_std, dtype=torch.float32).view(-1, 1, 1)
+    mean = torch.tensor(processor.image_mean, dtype=torch.float32).view(-1, 1, 1)
+    scale = processor.rescale_factor / std
+    bias = -mean / std
+    pixel_values = torch.empty(pixels.shape, dtype=torch.float32)
+    torch.addcmul(bias, pixels, scale, out=pixel_values)
+    return pixel_values
+
+
+def _prepare_input(
+    image_bytes: bytes, processor, size: Optional[Dict[str, int]] = None
+) -> Tuple[torch.Tensor, Tuple[int, int]]:
+    """
+    이미지 로드/검증, 큰 이미지 리사이즈 및 전처리
+
+    Args:
+        size: 리사이즈 크기 (RESOLUTION_PROFILES 값, None이면 프로세서 설정)
+
+    Returns:
+        (pixel_values (C, H, W), 후처리 기준 크기 (height, width))
+    """
+    # 이미지 파일 크기 검증 (10MB 제한)
+    MAX_IMAGE_SIZE = 10 * 1024 * 1024  # 10MB
+    if len(image_bytes) > MAX_IMAGE_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"이미지 크기가 너무 큽니다. (최대 {MAX_IMAGE_SIZE / (1024*1024):.0f}MB, 현재: {len(image_bytes) / (1024*1024):.2f}MB)",
+        )
+
+    if _supports_fast_preprocess(processor, size or processor.size):
+        return _prepare_input_fast(image_bytes, processor, size or processor.size)
+
+    # 이미지 로드 및 검증
+    try:
+        img = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+    except Exception as e:
+        raise HTTPException(
+            status_code=400, detail=f"이미지를 로드할 수 없습니다: {str(e)}"
+        )
+
+    # 이미지 크기 검증 (해상도 제한)
+    width, height = img.size
+    if width == 0 or height == 0:
+        raise HTTPException(status_code=400, detail="이미지 크기가 유효하지 않습니다.")
+    if width > MAX_DIMENSION or height > MAX_DIMENSION:
+        # 큰 이미지는 리사이즈
+        new_width, new_height = _capped_size(width, height)
+        img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
+        print(
+            f"[AI Service] 이미지 리사이즈: {width}x{height} -> {new_width}x{new_height}"
+        )
+
+    # 전처리
+    try:
+        encoding = processor(images=img, size=size, return_tensors="pt")
+        pixel_values = encoding["pixel_values"][0]
+    except RuntimeError as e:
+        # 메모리 부족 오류 처리
+        error_msg = str(e).lower()
+        if "out of memory" in error_msg or "cuda" in error_msg:
+            raise HTTPException(
+                status_code=507,
+                detail="메모리 부족으로 이미지를 처리할 수 없습니다. 더 작은 이미지를 사용해주세요.",
+            )
+        raise HTTPException(
+            status_code=500,
+            detail=f"이미지 전처리 중 오류가 발생했습니다: {str(e)}",
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"이미지 전처리 중 오류가 발생했습니다: {str(e)}",
+        )
+
+    return pixel_values, img.size[::-1]
+
+
+def resolve_tiling(
+    tiled: bool, tile_size: Optional[int] = None, overlap: Optional[int] = None
+) -> Optional[Tuple[int, int]]:
+    """
+    타일 추론 설정 확인 (tiled가 아니면 None)
+
+    Returns:
+        (타일 크기, 겹침) 원본 픽셀 기준
+
+    Raises:
+        HTTPException: 타일 크기/겹침이 유효하지 않음 (400)
+    """
+    if not tiled:
+        return None
+    tile_size = tile_size or settings.AI_TILE_SIZE
+    overlap = settings.AI_TILE_OVERLAP if overlap is None else overlap
+    if tile_size < MIN_TILE_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"타일 크기는 {MIN_TILE_SIZE}px 이상이어야 합니다. (현재: {tile_size}px)",
+        )
+    if overlap < 0 or overlap * 2 > tile_size:
+        raise HTTPException(
+            status_code=400,
+            detail=f"타일 겹침은 0 이상, 타일 크기의 절반 이하여야 합니다. (현재: {overlap}px)",
+        )
+    return tile_size, overlap
+
+
+def _tile_starts(length: int, tile_size: int, overlap: int) -> List[int]:
+    """한 축의 타일 시작 위치 (마지막 타일은 이미지 끝에 맞춰 모든 타일 크기를 같게 함)"""
+    if length <= tile_size:
+        return [0]
+    stride = tile_size - overlap
+    starts = list(range(0, length - tile_size, stride))
+    starts.append(length - tile_size)
+    return starts
+
+
+def _tile_grid(
+    width: int, height: int, tile_size: int, overlap: int
+) -> List[Tuple[int, int, int, int]]:
+    """(x1, y1, x2, y2) 타일 목록"""
+    return [
+        (x, y, min(x + tile_size, width), min(y + tile_size, height))
+        for y in _tile_starts(height, tile_size, overlap)
+        for x in _tile_starts(width, tile_size, overlap)
+    ]
+
+
+def _count_tile_inputs(image_bytes: bytes, tile_size: int, overlap: int) -> int:
+    """
+    헤더만 읽어 타일 추론 입력 수 계산 (대기열 자리 확보용)
+
+    Raises:
+        HTTPException: 이미지를 읽을 수 없거나 타일이 한도를 넘음 (400)
+    """
+    try:
+        width, height = _capped_size(*Image.open(io.BytesIO(image_bytes)).size)
+    except Exception as e:
+        raise HTTPException(
+            status_code=400, detail=f"이미지를 로드할 수 없습니다: {str(e)}"
+        )
+    tiles = len(_tile_grid(width, height, tile_size, overlap))
+    max_tiles = min(MAX_TILES, _scheduler.max_pending - 1)
+    if tiles > 1 and tiles > max_tiles:
+        raise HTTPException(
+            status_code=400,
+            detail=f"타일이 너무 많습니다. (최대 {max_tiles}개, 현재: {tiles}개) 타일 크기를 늘려주세요.",
+        )
+    # 전체 이미지 1장 + 타일 (타일이 하나면 전체 이미지만)
+    return 1 if tiles == 1 else tiles + 1
+
+
+def _prepare_tiles(
+    image_bytes: bytes, processor, size: Dict[str, int], tile_size: int, overlap: int
+) -> Tuple[List[Tuple[torch.Tensor, Tuple[int, int]]], List[Tuple[int, int]]]:
+    """
+    타일 추론 입력 준비: 전체 이미지 1장 + 겹치는 타일들 (타일은 원본 해상도에서 자름)
+
+    전체 이미지는 타일 경계에 걸친 큰 손상을, 타일은 전체 축소 시 사라지는
+    작은 균열을 잡는다. 좌표는 MAX_DIMENSION 축소 후 이미지 기준 (단건 추론과 동일).
+
+    Returns:
+        ([(pixel_values, 후처리 기준 크기)], [입력별 (x, y) 오프셋])
+    """
+    if len(image_bytes) > MAX_IMAGE_BYTES:
+        raise HTTPException(
+            status_code=400, detail="이미지 크기가 너무 큽니다. (최대 10MB)"
+        )
+    try:
+        img = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+    except Exception as e:
+        raise HTTPException(
+            status_code=400, detail=f"이미지를 로드할 수 없습니다: {str(e)}"
+        )
+    width, height = img.size
+    if width == 0 or height == 0:
+        raise HTTPException(status_code=400, detail="이미지 크기가 유효하지 않습니다.")
+    capped_width, capped_height = _capped_size(width, height)
+    if (capped_width, capped_height) != (width, height):
+        img = img.resize((capped_width, capped_height), Image.Resampling.LANCZOS)
+
+    fast = _supports_fast_preprocess(processor, size)
+
+    def prepare(region: Image.Image) -> torch.Tensor:
+        if fast:
+            output_size = _resize_output_size(region.height, region.width, size)
+            return _resize_and_normalize(region, output_size, processor)
+        return processor(images=region, size=size, return_tensors="pt")[
+            "pixel_values"
+        ][0]
+
+    tiles = _tile_grid(capped_width, capped_height, tile_size, overlap)
+    try:
+        inputs = [(prepare(img), (capped_height, capped_width))]
+        offsets = [(0, 0)]
+        if len(tiles) > 1:
+            for x1, y1, x2, y2 in tiles:
+                inputs.append((prepare(img.crop((x1, y1, x2, y2))), (y2 - y1, x2 - x1)))
+                offsets.append((x1, y1))
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"이미지 전처리 중 오류가 발생했습니다: {str(e)}",
+        )
+    print(
+        f"[AI Service] 타일 추론: {capped_width}x{capped_height}, "
+        f"타일 {len(tiles)}개 ({tile_size}px, 겹침 {overlap}px)"
+    )
+    return inputs, offsets
+
+
+def _merge_tile_results(
+    results: List[Dict], offsets: List[Tuple[int, int]]
+) -> Dict[str, torch.Tensor]:
+    """타일별 탐지 결과를 전체 이미지 좌표로 옮겨 하나로 합침 (중복은 이후 클래스별 NMS로 제거)"""
+    boxes, scores, labels = [], [], []
+    for result, (x, y) in zip(results, offsets):
+        offset = torch.tensor([x, y, x, y], dtype=torch.float32)
+        boxes.append(result["boxes"].detach().cpu().float().reshape(-1, 4) + offset)
+        scores.append(result["scores"].detach().cpu())
+        labels.append(result["labels"].detach().cpu())
+    return {
+        "boxes": torch.cat(boxes),
+        "scores": torch.cat(scores),
+        "labels": torch.cat(labels),
+    }
+
+
+def _run_batch(
+    pixel_values_list: List[torch.Tensor], target_sizes: List[Tuple[int, int]]
+) -> List[Dict]:
+    """
+    전처리된 입력 여러 개를 오른쪽/아래로 0 패딩해 한 번에 추론 (스케줄러 스레드에서 실행)
+
+    패딩과 pixel_mask는 DetaImageProcessor의 배치 전처리와 같은 방식이다.
+    해상도가 같은 입력끼리는 배치 크기 1과 동일한 결과를 내고, 해상도가 다르면
+    백본 경계 영역 때문에 점수가 약간 달라질 수 있다. 그래서 스케줄러는 크기가 같은
+    입력끼리만 묶어 호출한다 (결과 캐시에 함께 묶인 입력에 따라 다른 결과가 저장되지 않도록).
+    """
+    model = get_model()
+    processor = get_processor()
+    device = next(model.parameters()).device
+
+    batch_size = len(pixel_values_list)
+    channels = pixel_values_list[0].shape[0]
+    max_height = max(values.shape[1] for values in pixel_values_list)
+    max_width = max(values.shape[2] for values in pixel_values_list)
+
+    pixel_values = torch.zeros(
+        (batch_size, channels, max_height, max_width),
+        dtype=pixel_values_list[0].dtype,
+    )
+    pixel_mask = torch.zeros((batch_size, max_height, max_width), dtype=torch.int64)
+    for index, values in enumerate(pixel_values_list):
+        _, height, width = values.shape
+        pixel_values[index, :, :height, :width] = values
+        pixel_mask[index, :height, :width] = 1
+
+    # 메모리 정리 (CUDA인 경우)
+    if device.type == "cuda":
+        torch.cuda.empty_cache()
+
+    with torch.no_grad():
+        outputs = model.predict(
+            pixel_values=pixel_values.to(device), pixel_mask=pixel_mask.to(device)
+        )
+
+        # target_sizes를 텐서로 변환하고 모델과 같은 디바이스로 이동
+        target_sizes_tensor = torch.tensor(target_sizes, dtype=torch.int32).to(device)
+
+        results = processor.post_process_object_detection(
+            outputs=outputs, target_sizes=target_sizes_tensor, threshold=0.05
+        )
+
+    # 추론 후 메모리 정리
+    if device.type == "cuda":
+        torch.cuda.empty_cache()
+    return results
+
+
+# 배포 기본 해상도 프로필 (잘못된 값이면 accurate)
+DEFAULT_RESOLUTION_PROFILE = settings.AI_RESOLUTION_PROFILE
+if DEFAULT_RESOLUTION_PROFILE not in RESOLUTION_PROFILES:
+    print(
+        f"[AI Service] ⚠️  알 수 없는 AI_RESOLUTION_PROFILE={DEFAULT_RESOLUTION_PROFILE}, accurate 사용"
+    )
+    DEFAULT_RESOLUTION_PROFILE = "accurate"
+
+
+# 동시 요청을 모아 배치로 추론 (전용 스레드, 처리 중 요청 수 AI_QUEUE_MAX 제한)
+_scheduler = InferenceScheduler(
+    _run_batch,
+    settings.AI_BATCH_MAX_SIZE,
+    settings.AI_BATCH_WAIT_MS,
+    settings.AI_QUEUE_MAX,
+)
+
+# 이미지 디코딩/전처리 전용 스레드 풀 (기본 스레드 풀을 다른 라우트에 남겨둠)
+_preprocess_executor = ThreadPoolExecutor(
+    max_workers=max(1, settings.AI_PREPROCESS_WORKERS),
+    thread_name_prefix="ai-preprocess",
+)
+
+
+def get_scheduler_stats() -> dict:
+    """배치 스케줄러 통계"""
+    return _scheduler.stats()
+
+
+async def stop_inference_scheduler() -> None:
+    """lifespan shutdown: 배치 스케줄러 및 전처리 스레드 풀 종료"""
+    await _scheduler.stop()
+    _preprocess_executor.shutdown(wait=False, cancel_futures=True)
+
+
+# 같은 이미지/모델/후처리 설정의 탐지 결과 재사용
+_result_cache = InferenceResultCache(
+    settings.AI_RESULT_CACHE_MAX_BYTES, settings.AI_RESULT_CACHE_DIR
+)
+
+
+def get_result_cache_stats() -> dict:
+    """탐지 결과 캐시 통계"""
+    return _result_cache.stats()
+
+
+def _model_identity() -> Optional[str]:
+    """
+    로드된 체크포인트 식별자 (경로 + mtime + 양자화 여부 + 백엔드)
+    알 수 없으면 None (캐시 사용 안 함)
+    """
+    model_path = get_resolved_model_path()
+    if not model_path:
+        return None
+    try:
+        mtime_ns = os.stat(model_path).st_mtime_ns
+    except OSError:
+        return None
+    precision = "int8" if is_model_quantized() else "fp32"
+    return f"{os.path.abspath(model_path)}:{mtime_ns}:{precision}:{get_model_backend()}"
+
+
+def _postprocess_config(
+    profile: str, tiling: Optional[Tuple[int, int]] = None
+) -> str:
+    """결과에 영향을 주는 전처리(해상도, 타일)/후처리 설정 (캐시 키에 포함)"""
+    return json.dumps(
+        {
+            "resolution": RESOLUTION_PROFILES[profile],
+            "fast_preprocess": settings.AI_FAST_PREPROCESS,
+            "tiling": tiling,
+            "class_thresholds": sorted(CLASS_THRESHOLDS.items()),
+            "nms_iou_threshold": NMS_IOU_THRESHOLD,
+        }
+    )
+
+
+async def detect_damage_cached(
+    image_bytes: bytes,
+    profile: Optional[str] = None,
+    tiling: Optional[Tuple[int, int]] = None,
+) -> Tuple[dict, str]:
+    """
+    결과 캐시를 먼저 조회하고, 없으면 detect_damage 후 저장
+
+    Returns:
+        (탐지 결과, 캐시 상태 "HIT-MEM" | "HIT-DISK" | "MISS" | "BYPASS")
+    """
+    profile = resolve_resolution_profile(profile)
+    model_identity = _model_identity()
+    cache_enabled = _result_cache.max_bytes > 0 or _result_cache.disk_dir is not None
+    if model_identity is None or not cache_enabled:
+        return await detect_damage(image_bytes, profile, tiling), "BYPASS"
+
+    config = _postprocess_config(profile, tiling)
+    if len(image_bytes) >= HASH_IN_THREAD_BYTES:
+        key = await asyncio.to_thread(
+            make_result_key, image_bytes, model_identity, config
+        )
+    else:
+        key = make_result_key(image_bytes, model_identity, config)
+
+    result = _result_cache.get_memory(key)
+    if result is not None:
+        return result, "HIT-MEM"
+    if _result_cache.disk_dir is not None:
+        result = await asyncio.to_thread(_result_cache.get_disk, key)
+        if result is not None:
+            return result, "HIT-DISK"
+
+    _result_cache.record_miss()
+    result = await detect_damage(image_bytes, profile, tiling)
+    payload = _result_cache.set(key, result)
+    if _result_cache.disk_dir is not None:
+        await asyncio.to_thread(_result_cache.write_disk, key, payload)
+    return result, "MISS"
+
+
+def _queue_full_exception(e: InferenceQueueFull) -> HTTPException:
+    """대기열 초과 시 즉시 503 응답 (Retry-After: 대기 중인 배치 처리 예상 시간)"""
+    print(f"[AI Service] 추론 대기열 초과: {e.retry_after}초 후 재시도 안내")
+    return HTTPException(
+        status_code=503,
+        detail="AI 추론 요청이 많아 처리할 수 없습니다. 잠시 후 다시 시도해주세요.",
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
+
+async def detect_damage(
+    image_bytes: bytes,
+    profile: Optional[str] = None,
+    tiling: Optional[Tuple[int, int]] = None,
+) -> dict:
     """
     이미지에서 손상 영역 탐지 (노트북 설정 적용)
 
     Args:
         image_bytes: 업로드된 이미지 바이트
+        profile: 해상도 프로필 이름 (None이면 AI_RESOLUTION_PROFILE)
+        tiling: (타일 크기, 겹침). 주어지면 전체 이미지와 겹치는 타일들을 함께
+            배치로 추론하고 전체 이미지 좌표로 합친 뒤 클래스별 NMS로 중복 제거
 
     Returns:
         탐지된 객체 리스트 (label, score, bbox)
@@ -221,6 +714,7 @@ async def detect_damage(image_bytes: bytes) -> dict:
             status_code=503,
             detail="AI 모델이 로드되지 않았습니다. 서버 로그를 확인해주세요.",
         )
+    size = RESOLUTION_PROFILES[resolve_resolution_profile(profile)]
 
     try:
         model = get_model()
@@ -245,85 +739,43 @@ async def detect_damage(image_bytes: bytes) -> dict:
                 status_code=503, detail=f"모델 디바이스 확인 실패: {str(e)}"
             )
 
-        # 이미지 파일 크기 검증 (10MB 제한)
-        MAX_IMAGE_SIZE = 10 * 1024 * 1024  # 10MB
-        if len(image_bytes) > MAX_IMAGE_SIZE:
-            raise HTTPException(
-                status_code=400,
-                detail=f"이미지 크기가 너무 큽니다. (최대 {MAX_IMAGE_SIZE / (1024*1024):.0f}MB, 현재: {len(image_bytes) / (1024*1024):.2f}MB)",
-            )
-
-        # 이미지 로드 및 검증
-        try:
-            img = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-        except Exception as e:
-            raise HTTPException(
-                status_code=400, detail=f"이미지를 로드할 수 없습니다: {str(e)}"
-            )
-
-        # 이미지 크기 검증 (해상도 제한)
-        MAX_DIMENSION = 4096  # 최대 4096x4096
-        width, height = img.size
-        if width == 0 or height == 0:
-            raise HTTPException(
-                status_code=400, detail="이미지 크기가 유효하지 않습니다."
-            )
-        if width > MAX_DIMENSION or height > MAX_DIMENSION:
-            # 큰 이미지는 리사이즈
-            scale = min(MAX_DIMENSION / width, MAX_DIMENSION / height)
-            new_width = int(width * scale)
-            new_height = int(height * scale)
-            img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-            print(
-                f"[AI Service] 이미지 리사이즈: {width}x{height} -> {new_width}x{new_height}"
-            )
-
-        # 전처리
+        # 대기열 자리를 먼저 확보하고 (가득 차면 전처리 없이 바로 503) 결과를 받을 때까지 유지
         try:
-            encoding = processor(images=img, return_tensors="pt")
-            pixel_values = encoding["pixel_values"]
-
-            # 모델과 같은 디바이스로 이동 (중요!)
-            pixel_values = pixel_values.to(device)
-        except RuntimeError as e:
-            # 메모리 부족 오류 처리
-            error_msg = str(e).lower()
-            if "out of memory" in error_msg or "cuda" in error_msg:
-                raise HTTPException(
-                    status_code=507,
-                    detail="메모리 부족으로 이미지를 처리할 수 없습니다. 더 작은 이미지를 사용해주세요.",
-                )
-            raise HTTPException(
-                status_code=500,
-                detail=f"이미지 전처리 중 오류가 발생했습니다: {str(e)}",
-            )
-        except Exception as e:
-            raise HTTPException(
-                status_code=500,
-                detail=f"이미지 전처리 중 오류가 발생했습니다: {str(e)}",
-            )
-
-        # 추론 (낮은 threshold로 먼저 추출)
-        try:
-            # 메모리 정리 (CUDA인 경우)
-            if device.type == "cuda":
-                torch.cuda.empty_cache()
-
-            with torch.no_grad():
-                outputs = model.predict(pixel_values=pixel_values)
-
-                # target_sizes를 텐서로 변환하고 모델과 같은 디바이스로 이동
-                target_sizes = torch.tensor([img.size[::-1]], dtype=torch.int32).to(
-                    device
-                )
-
-                results = processor.post_process_object_detection(
-                    outputs=outputs, target_sizes=target_sizes, threshold=0.05
-                )
-
-            # 추론 후 메모리 정리
-            if device.type == "cuda":
-                torch.cuda.empty_cache()
+            input_count = 1
+            if tiling is not None:
+                input_count = _count_tile_inputs(image_bytes, *tiling)
+            with _scheduler.reserve(input_count):
+                loop = asyncio.get_running_loop()
+                if tiling is None:
+                    # 이미지 로드/검증 및 전처리 (이벤트 루프를 막지 않도록 전처리 스레드에서 실행)
+                    pixel_values, target_size = await loop.run_in_executor(
+                        _preprocess_executor, _prepare_input, image_bytes, processor, size
+                    )
+
+                    # 추론 (낮은 threshold로 먼저 추출). 동시 요청과 함께 배치로 실행됨
+                    result = await _scheduler.submit(pixel_values, target_size)
+                    results = [result]
+                else:
+                    inputs, offsets = await loop.run_in_executor(
+                        _preprocess_executor,
+                        _prepare_tiles,
+                        image_bytes,
+                        processor,
+                        size,
+                        *tiling,
+                    )
+                    # 모든 타일을 한꺼번에 대기열에 넣어 최대 배치 크기로 묶어 추론
+                    tile_results = await asyncio.gather(
+                        *(
+                            _scheduler.submit(pixel_values, target_size)
+                            for pixel_values, target_size in inputs
+                        )
+                    )
+                    results = [_merge_tile_results(tile_results, offsets)]
+        except InferenceQueueFull as e:
+            raise _queue_full_exception(e)
+        except HTTPException:
+            raise
         except RuntimeError as e:
             # 메모리 부족 오류 처리
             error_msg = str(e).lower()
@@ -480,12 +932,15 @@ async def detect_damage(image_bytes: bytes) -> dict:
 
         grade, explanation = _calculate_grade(detections)
 
-        return {
+        response = {
             "detections": detections,
             "count": len(detections),
             "grade": grade,
             "explanation": explanation,
         }
+        if tiling is not None:
+            response["tiles"] = len(offsets)
+        return response
     except HTTPException:
         # HTTPException은 그대로 전달
         raise
@@ -500,3 +955,114 @@ async def detect_damage(image_bytes: bytes) -> dict:
         raise HTTPException(
             status_code=500, detail=f"손상 탐지 중 오류가 발생했습니다: {error_detail}"
         )
+
+
+def archive_sources(fileobj) -> List[ImageSource]:
+    """
+    zip 아카이브에서 이미지 항목 목록 생성 (바이트는 추론 직전에 하나씩 읽음)
+
+    디렉터리, 숨김 파일(__MACOSX 등), 이미지 확장자가 아닌 항목은 건너뛴다.
+
+    Raises:
+        HTTPException: 올바른 zip 파일이 아님
+    """
+    try:
+        archive = zipfile.ZipFile(fileobj)
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=400, detail="올바른 zip 파일이 아닙니다.")
+
+    sources: List[ImageSource] = []
+    for info in archive.infolist():
+        name = info.filename
+        if info.is_dir() or any(
+            part.startswith((".", "__MACOSX")) for part in name.split("/")
+        ):
+            continue
+        if os.path.splitext(name)[1].lower() not in ARCHIVE_IMAGE_EXTENSIONS:
+            continue
+
+        def load(info=info) -> bytes:
+            # 압축 해제 전에 크기 확인 (압축 폭탄 방지)
+            if info.file_size > MAX_IMAGE_BYTES:
+                raise HTTPException(
+                    status_code=400, detail="이미지 크기가 너무 큽니다. (최대 10MB)"
+                )
+            return archive.read(info)
+
+        sources.append((name, load))
+    return sources
+
+
+async def _detect_for_batch(image_bytes: bytes) -> Tuple[dict, str]:
+    """일괄 추론용 detect_damage_cached (대기열이 가득 차면 Retry-After만큼 기다렸다 재시도)"""
+    for attempt in range(BATCH_QUEUE_RETRIES + 1):
+        try:
+            return await detect_damage_cached(image_bytes)
+        except HTTPException as e:
+            retry_after = (e.headers or {}).get("Retry-After")
+            queue_full = e.status_code == 503 and retry_after is not None
+            if not queue_full or attempt == BATCH_QUEUE_RETRIES:
+                raise
+            await asyncio.sleep(int(retry_after))
+
+
+async def detect_damage_stream(sources: Iterable[ImageSource]) -> AsyncIterator[dict]:
+    """
+    여러 이미지를 추론하고 끝나는 순서대로 이미지별 결과를 내보냄
+
+    배치 스케줄러가 한 번에 모을 수 있도록 AI_BATCH_MAX_SIZE의 2배까지 동시에
+    요청하되, 다른 클라이언트의 요청이 들어올 자리를 남기기 위해 AI_QUEUE_MAX의
+    절반을 넘지 않는다. 이미지 바이트는 자리가 날 때마다 하나씩 읽는다.
+
+    Yields:
+        - 성공: index, filename, status(200), cache, detections, count, grade, explanation
+        - 실패: index, filename, status, error
+    """
+    concurrency = max(
+        1, min(settings.AI_BATCH_MAX_SIZE * 2, settings.AI_QUEUE_MAX // 2)
+    )
+
+    async def run(index: int, filename: str, load: Callable[[], bytes]) -> dict:
+        item = {"index": index, "filename": filename}
+        try:
+            image_bytes = await asyncio.to_thread(load)
+            if len(image_bytes) == 0:
+                raise HTTPException(
+                    status_code=400, detail="이미지 데이터가 비어있습니다."
+                )
+            result, cache_status = await _detect_for_batch(image_bytes)
+            return {**item, "status": 200, "cache": cache_status, **result}
+        except HTTPException as e:
+            return {**item, "status": e.status_code, "error": e.detail}
+        except Exception as e:
+            print(f"[AI Service] 일괄 추론 오류 ({filename}): {e}")
+            return {
+                **item,
+                "status": 500,
+                "error": f"이미지 처리 중 오류가 발생했습니다: {e}",
+            }
+
+    pending = set()
+    iterator = enumerate(sources)
+    exhausted = False
+    try:
+        while True:
+            while not exhausted and len(pending) < concurrency:
+                try:
+                    index, (filename, load) = next(iterator)
+                except StopIteration:
+                    exhausted = True
+                    break
+                pending.add(asyncio.create_task(run(index, filename, load)))
+            if not pending:
+                break
+
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in sorted(done, key=lambda t: t.result()["index"]):
+                yield task.result()
+    finally:
+        # 클라이언트 연결이 끊기면 남은 추론 취소
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+배치 추론 결과 일관성 확인 스크립트
+
+같은 이미지를 단독으로 요청할 때와 입력 크기가 다른 이미지들과 동시에 요청할 때
+detect_damage(/ai/damage/infer)가 같은 탐지 결과를 내는지 확인합니다.
+결과 캐시는 이미지 해시로 저장되므로, 함께 묶인 이미지에 따라 결과가 달라지면
+먼저 처리된 배치의 결과가 그대로 캐시에 남습니다.
+    - 단독 요청 vs 가로/세로 비율이 다른 이미지 2장과 동시 요청: 탐지 결과가 같아야 함
+    - 스케줄러가 입력 크기가 다른 요청을 한 배치로 묶지 않는지 (배치마다 입력 크기 1종류)
+
+배치가 확실히 모이도록 대기 시간을 --wait-ms로 늘려 실행합니다 (모델 필요).
+
+사용법:
+    python batch_consistency_check.py /path/to/photo.jpg [--profile fast] [--wait-ms 500]
+"""
+import argparse
+import asyncio
+import io
+import os
+import sys
+
+# 현재 디렉토리를 PYTHONPATH에 추가
+sys.path.insert(0, os.path.dirname(__file__))
+
+failures = []
+
+
+def check(condition, message):
+    print(f"   {'✅' if condition else '❌'} {message}")
+    if not condition:
+        failures.append(message)
+
+
+def _resized(image_bytes, width_ratio, height_ratio):
+    """가로/세로 비율을 바꾼 JPEG (전처리 후 입력 크기가 원본과 달라짐)"""
+    from PIL import Image
+
+    img = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+    size = (int(img.width * width_ratio), int(img.height * height_ratio))
+    output = io.BytesIO()
+    img.resize(size).save(output, format="JPEG", quality=90)
+    return output.getvalue()
+
+
+async def run_checks(image_bytes, profile, wait_ms):
+    from ai import service
+
+    # 배치 실행 함수가 받은 입력 크기 기록
+    batch_shapes = []
+    run_batch = service._scheduler.runner
+
+    def recording_runner(pixel_values_list, target_sizes):
+        batch_shapes.append([tuple(values.shape) for values in pixel_values_list])
+        return run_batch(pixel_values_list, target_sizes)
+
+    service._scheduler.runner = recording_runner
+    service._scheduler.max_wait = wait_ms / 1000
+
+    print("\n" + "=" * 60)
+    print("🔍 단독 요청 vs 크기가 다른 이미지와 동시 요청")
+    print("=" * 60)
+    try:
+        alone = await service.detect_damage(image_bytes, profile)
+        wide = _resized(image_bytes, 1.0, 0.5)
+        tall = _resized(image_bytes, 0.5, 1.0)
+        batch_shapes.clear()
+        mixed, *_ = await asyncio.gather(
+            service.detect_damage(image_bytes, profile),
+            service.detect_damage(wide, profile),
+            service.detect_damage(tall, profile),
+        )
+    finally:
+        await service.stop_inference_scheduler()
+
+    print(f"   배치 {len(batch_shapes)}회: {batch_shapes}")
+    check(
+        all(len(set(shapes)) == 1 for shapes in batch_shapes),
+        "배치마다 입력 크기가 하나 (크기가 다른 입력은 패딩해 묶지 않음)",
+    )
+    check(
+        mixed["detections"] == alone["detections"],
+        f"동시 요청 결과가 단독 결과와 같음 (탐지 {alone['count']}개 / {mixed['count']}개)",
+    )
+    check(mixed["grade"] == alone["grade"], f"등급 일치 ({alone['grade']} / {mixed['grade']})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("image", help="확인할 이미지 경로")
+    parser.add_argument("--profile", default=None, help="해상도 프로필 (기본: AI_RESOLUTION_PROFILE)")
+    parser.add_argument(
+        "--wait-ms", type=float, default=500, help="배치를 모으는 대기 시간 (ms)"
+    )
+    args = parser.parse_args()
+
+    from ai import loader
+
+    if not loader.load_ai_model(max_retries=1):
+        print("❌ 모델 로드 실패")
+        sys.exit(1)
+    with open(args.image, "rb") as f:
+        image_bytes = f.read()
+
+    asyncio.run(run_checks(image_bytes, args.profile, args.wait_ms))
+
+    if failures:
+        print(f"\n❌ 실패 {len(failures)}건")
+        sys.exit(1)
+    print("\n✅ 같은 이미지는 함께 요청된 이미지와 무관하게 같은 결과를 받습니다")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+일괄 추론 업로드 임시 파일 확인 스크립트
+
+/ai/damage/infer/batch는 응답 스트리밍이 엔드포인트 반환 뒤에 진행되므로
+업로드를 먼저 임시 파일로 옮깁니다 (ai/router.py _spool_batch). 다음을 확인합니다.
+    - zip 아카이브: 임시 파일로 옮긴 zip에서 항목을 실제로 읽어 원본과 같은지
+      (zipfile은 seekable()을 호출하므로 Python 3.9의 SpooledTemporaryFile로는 실패)
+    - 원본 UploadFile을 닫은 뒤에도 이미지/zip 항목을 읽을 수 있는지
+    - 10MB를 넘는 이미지와 zip 항목은 읽을 때 400, 올바르지 않은 zip은 400
+
+배포 이미지와 같은 Python(3.9)으로 실행해야 의미가 있습니다 (모델/네트워크 불필요).
+
+사용법:
+    python batch_upload_check.py
+"""
+import io
+import os
+import sys
+import zipfile
+
+# 현재 디렉토리를 PYTHONPATH에 추가
+sys.path.insert(0, os.path.dirname(__file__))
+
+from fastapi import HTTPException, UploadFile  # noqa: E402
+
+from ai.router import _close_all, _spool_batch  # noqa: E402
+from ai.service import MAX_IMAGE_BYTES  # noqa: E402
+
+failures = []
+
+
+def check(condition, message):
+    print(f"   {'✅' if condition else '❌'} {message}")
+    if not condition:
+        failures.append(message)
+
+
+def upload(filename, data):
+    return UploadFile(file=io.BytesIO(data), filename=filename, size=len(data))
+
+
+def make_zip(entries):
+    output = io.BytesIO()
+    with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in entries.items():
+            archive.writestr(name, data)
+    return output.getvalue()
+
+
+def status_of(load):
+    """load() 결과 (바이트, HTTPException 상태 코드 또는 다른 예외 문자열)"""
+    try:
+        return load()
+    except HTTPException as e:
+        return e.status_code
+    except Exception as e:
+        print(f"      {e!r}")
+        return repr(e)
+
+
+def check_archive():
+    print("\n" + "=" * 60)
+    print(f"🔍 zip 아카이브 항목 읽기 (Python {sys.version.split()[0]})")
+    print("=" * 60)
+    entries = {
+        "site/a.jpg": os.urandom(200 * 1024),
+        "site/b.png": os.urandom(3 * 1024 * 1024),  # 메모리 스풀 한도(1MB)보다 큼
+        "__MACOSX/site/._a.jpg": b"skip",
+        "notes.txt": b"skip",
+        "big.jpg": b"\0" * (MAX_IMAGE_BYTES + 1),
+    }
+    archive = upload("photos.zip", make_zip(entries))
+    sources, files = _spool_batch([], archive)
+    archive.file.close()  # 엔드포인트 반환 뒤 UploadFile이 닫힌 상황
+    try:
+        names = [name for name, _ in sources]
+        check(
+            names == ["site/a.jpg", "site/b.png", "big.jpg"],
+            f"이미지 항목만 목록에 포함 {names}",
+        )
+        loads = dict(sources)
+        for name in ("site/a.jpg", "site/b.png"):
+            data = status_of(loads[name])
+            check(data == entries[name], f"{name}: 임시 파일의 zip에서 원본과 같은 바이트를 읽음")
+        check(status_of(loads["big.jpg"]) == 400, "10MB를 넘는 항목은 읽을 때 400")
+    finally:
+        _close_all(files)
+
+    try:
+        _spool_batch([], upload("broken.zip", b"not a zip"))
+        check(False, "올바르지 않은 zip은 400")
+    except HTTPException as e:
+        check(e.status_code == 400, f"올바르지 않은 zip은 {e.status_code}")
+
+
+def check_images():
+    print("\n" + "=" * 60)
+    print("🔍 이미지 업로드 읽기")
+    print("=" * 60)
+    small = os.urandom(100 * 1024)
+    large = os.urandom(2 * 1024 * 1024)
+    images = [
+        upload("small.jpg", small),
+        upload("large.jpg", large),
+        upload("huge.jpg", b"\0" * (MAX_IMAGE_BYTES + 1)),
+    ]
+    sources, files = _spool_batch(images, None)
+    for image in images:
+        image.file.close()
+    try:
+        loads = dict(sources)
+        check(status_of(loads["small.jpg"]) == small, "작은 이미지 (메모리 스풀)")
+        check(status_of(loads["large.jpg"]) == large, "1MB를 넘는 이미지 (디스크로 넘어간 스풀)")
+        check(status_of(loads["huge.jpg"]) == 400, "10MB를 넘는 이미지는 읽을 때 400")
+        check(len(files) == 2, f"닫아야 할 임시 파일 {len(files)}개 (초과 이미지는 복사하지 않음)")
+    finally:
+        _close_all(files)
+
+
+def main():
+    check_archive()
+    check_images()
+
+    if failures:
+        print(f"\n❌ 실패 {len(failures)}건")
+        sys.exit(1)
+    print("\n✅ 일괄 추론 업로드를 임시 파일에서 읽을 수 있습니다")
+
+
+if __name__ == "__main__":
+    main()
@@ -39,5 +39,80 @@ class Settings:
     PORT: int = int(os.getenv("PORT", "8080"))
     RELOAD: bool = os.getenv("RELOAD", "false").lower() == "true"
 
+    # AI 모델 INT8 동적 양자화 (CPU 전용, transformer Linear 레이어)
+    AI_QUANTIZE: bool = os.getenv("AI_QUANTIZE", "false").lower() == "true"
+
+    # AI 추론 백엔드: "pytorch"(기본) 또는 "onnx" (CPU에서 ONNX Runtime, 실패 시 PyTorch)
+    AI_BACKEND: str = os.getenv("AI_BACKEND", "pytorch").lower()
+    AI_ONNX_THREADS: int = int(os.getenv("AI_ONNX_THREADS", "0"))  # 0: ONNX Runtime 기본값
+
+    # 추론 해상도 프로필 기본값 (fast / balanced / accurate, 요청마다 profile로 변경 가능)
+    AI_RESOLUTION_PROFILE: str = os.getenv("AI_RESOLUTION_PROFILE", "accurate").lower()
+
+    # 업로드 이미지 단일 패스 전처리 (축소 디코딩 + 1회 리사이즈 + 텐서 정규화)
+    # 모델 입력이 허용 오차 안에서 달라지므로 선택 사항 (preprocess_check.py로 확인 후 켬)
+    # false(기본)면 DetaImageProcessor 전처리 사용
+    AI_FAST_PREPROCESS: bool = os.getenv("AI_FAST_PREPROCESS", "false").lower() == "true"
+
+    # 타일 추론 (/ai/damage/infer?tiled=true) 기본 타일 크기/겹침 (원본 픽셀 기준)
+    AI_TILE_SIZE: int = int(os.getenv("AI_TILE_SIZE", "1024"))
+    AI_TILE_OVERLAP: int = int(os.getenv("AI_TILE_OVERLAP", "256"))
+
+    # AI 추론 마이크로 배치 (동시 요청을 최대 크기/대기 시간 안에서 모아 한 번에 추론)
+    AI_BATCH_MAX_SIZE: int = int(os.getenv("AI_BATCH_MAX_SIZE", "4"))
+    AI_BATCH_WAIT_MS: float = float(os.getenv("AI_BATCH_WAIT_MS", "10"))
+    # 전처리~추론 중인 요청 상한 (초과 시 503 + Retry-After) 및 전처리 스레드 수
+    AI_QUEUE_MAX: int = int(os.getenv("AI_QUEUE_MAX", "32"))
+    AI_PREPROCESS_WORKERS: int = int(os.getenv("AI_PREPROCESS_WORKERS", "2"))
+    # 탐지 결과 캐시 (이미지 해시 + 모델 + 후처리 설정 기준). 0이면 메모리 캐시 끔, 경로가 없으면 디스크 캐시 끔
+    AI_RESULT_CACHE_MAX_BYTES: int = int(
+        os.getenv("AI_RESULT_CACHE_MAX_BYTES", str(16 * 1024 * 1024))
+    )
+    AI_RESULT_CACHE_DIR: str = os.getenv("AI_RESULT_CACHE_DIR", "")
+
+    # 이미지 프록시 업스트림 HTTP 클라이언트 (Firebase Storage)
+    IMAGE_HTTP2: bool = os.getenv("IMAGE_HTTP2", "true").lower() == "true"
+    IMAGE_HTTP_MAX_CONNECTIONS: int = int(os.getenv("IMAGE_HTTP_MAX_CONNECTIONS", "50"))
+    IMAGE_HTTP_MAX_KEEPALIVE: int = int(os.getenv("IMAGE_HTTP_MAX_KEEPALIVE", "20"))
+    IMAGE_HTTP_KEEPALIVE_EXPIRY: float = float(
+        os.getenv("IMAGE_HTTP_KEEPALIVE_EXPIRY", "60")
+    )
+    IMAGE_HTTP_CONNECT_TIMEOUT: float = float(
+        os.getenv("IMAGE_HTTP_CONNECT_TIMEOUT", "10")
+    )
+    IMAGE_HTTP_READ_TIMEOUT: float = float(os.getenv("IMAGE_HTTP_READ_TIMEOUT", "30"))
+
+    # 워커 간 공유 이미지 캐시 (mmap, 기본 꺼짐). 켜져 있으면 프로세스 메모리 캐시는 작은 L1로 동작
+    # /dev/shm에 IMAGE_SHARED_CACHE_MB만큼 여유가 있어야 함 (Docker는 shm_size 설정)
+    IMAGE_SHARED_CACHE: bool = os.getenv("IMAGE_SHARED_CACHE", "false").lower() == "true"
+    IMAGE_SHARED_CACHE_MB: int = int(os.getenv("IMAGE_SHARED_CACHE_MB", "256"))
+    IMAGE_SHARED_CACHE_PATH: str = os.getenv("IMAGE_SHARED_CACHE_PATH", "")
+    IMAGE_L1_CACHE_ITEMS: int = int(os.getenv("IMAGE_L1_CACHE_ITEMS", "100"))
+    # 메모리 캐시 빈도 기반 승인 (TinyLFU)
+    IMAGE_CACHE_ADMISSION: bool = (
+        os.getenv("IMAGE_CACHE_ADMISSION", "true").lower() == "true"
+    )
+
+    # 디스크 캐시 쓰기 대기열 크기 (가득 차면 디스크 저장 생략) 및 정리 주기 (초)
+    IMAGE_DISK_WRITE_QUEUE: int = int(os.getenv("IMAGE_DISK_WRITE_QUEUE", "256"))
+    IMAGE_DISK_JANITOR_INTERVAL: int = int(
+        os.getenv("IMAGE_DISK_JANITOR_INTERVAL", "120")
+    )
+
+    # 재시작 후 접근 빈도 상위 항목을 메모리로 미리 로드 (0이면 비활성화)
+    IMAGE_WARMUP_ITEMS: int = int(os.getenv("IMAGE_WARMUP_ITEMS", "200"))
+    IMAGE_WARMUP_MAX_MB: int = int(os.getenv("IMAGE_WARMUP_MAX_MB", "128"))
+
+    # 이미지 프리페치 (캐시 워밍)
+    IMAGE_PREFETCH_CONCURRENCY: int = int(os.getenv("IMAGE_PREFETCH_CONCURRENCY", "4"))
+    IMAGE_PREFETCH_MAX_URLS: int = int(os.getenv("IMAGE_PREFETCH_MAX_URLS", "500"))
+
+    # 업스트림 실패 네거티브 캐시 (4xx 응답, 연속 타임아웃). TTL 0이면 비활성화
+    IMAGE_NEGATIVE_CACHE_TTL: int = int(os.getenv("IMAGE_NEGATIVE_CACHE_TTL", "60"))
+    IMAGE_NEGATIVE_TIMEOUT_TTL: int = int(os.getenv("IMAGE_NEGATIVE_TIMEOUT_TTL", "30"))
+    IMAGE_NEGATIVE_TIMEOUT_THRESHOLD: int = int(
+        os.getenv("IMAGE_NEGATIVE_TIMEOUT_THRESHOLD", "2")
+    )
+
 
 settings = Settings()
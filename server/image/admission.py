@@ -0,0 +1,82 @@
+"""
+TinyLFU 방식 메모리 캐시 승인 정책
+
+갤러리를 한 번 훑어보는 요청만으로 자주 쓰이는 썸네일이 밀려나지 않도록,
+새 항목은 축출 대상보다 최근 요청 빈도가 높을 때만 메모리에 들인다.
+
+빈도는 count-min sketch(4행, 4비트 포화 카운터)로 근사하고,
+일정 횟수(샘플 크기)마다 모든 카운터를 절반으로 줄여 오래된 인기도를 잊는다.
+"""
+
+from __future__ import annotations
+
+from threading import Lock
+
+DEPTH = 4
+MAX_COUNT = 15  # 4비트 카운터와 동일한 상한
+
+
+def _next_power_of_two(value: int) -> int:
+    return 1 << max(0, value - 1).bit_length()
+
+
+class CountMinSketch:
+    """에이징을 포함한 count-min sketch."""
+
+    def __init__(self, width: int, sample_size: int) -> None:
+        self.width = _next_power_of_two(max(16, width))
+        self._mask = self.width - 1
+        self.sample_size = max(1, sample_size)
+        self._rows = [bytearray(self.width) for _ in range(DEPTH)]
+        self._additions = 0
+        self.resets = 0
+
+    def _indexes(self, key: str):
+        # 캐시 키는 md5 hex이므로 서로 다른 8자리 구간을 독립 해시로 사용
+        for row in range(DEPTH):
+            yield int(key[row * 8 : row * 8 + 8], 16) & self._mask
+
+    def increment(self, key: str) -> None:
+        added = False
+        for row, index in zip(self._rows, self._indexes(key)):
+            if row[index] < MAX_COUNT:
+                row[index] += 1
+                added = True
+        if added:
+            self._additions += 1
+            if self._additions >= self.sample_size:
+                self._age()
+
+    def estimate(self, key: str) -> int:
+        return min(row[index] for row, index in zip(self._rows, self._indexes(key)))
+
+    def _age(self) -> None:
+        """모든 카운터 절반으로 (최근 빈도 위주로 유지)"""
+        for row in self._rows:
+            for index in range(self.width):
+                row[index] >>= 1
+        self._additions //= 2
+        self.resets += 1
+
+
+class TinyLFUAdmission:
+    """빈도 비교 기반 승인 정책."""
+
+    def __init__(self, capacity: int) -> None:
+        # 샘플 크기는 캐시 용량의 10배 (TinyLFU 논문 권장값)
+        self.sketch = CountMinSketch(width=capacity * 8, sample_size=capacity * 10)
+        self._lock = Lock()
+
+    def record(self, key: str) -> None:
+        """요청 1건 기록"""
+        with self._lock:
+            self.sketch.increment(key)
+
+    def admit(self, candidate: str, victim: str) -> bool:
+        """후보가 축출 대상보다 자주 요청됐을 때만 승인"""
+        with self._lock:
+            return self.sketch.estimate(candidate) > self.sketch.estimate(victim)
+
+    def frequency(self, key: str) -> int:
+        with self._lock:
+            return self.sketch.estimate(key)
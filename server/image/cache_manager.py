@@ -3,137 +3,502 @@
 
 Firebase Storage 원본을 반복해서 다운로드하지 않도록
 프록시된 이미지를 파일로 저장하고 재사용한다.
+
+본문은 내용 해시(sha256)로 이름 붙인 blob으로 한 번만 저장하고,
+캐시 키별 메타데이터(.json)가 blob을 참조한다. 서로 다른 URL/파라미터가
+같은 바이트를 만들어도 디스크 예산은 한 번만 차지한다.
+
+디렉토리 구조 (해시 앞 4자리로 2단계 분산):
+    .cache/meta/ab/cd/<key>.json
+    .cache/blobs/ab/cd/<sha256>.bin
+    .cache/placeholders/ab/cd/<key>.json   (원본 항목의 저화질 플레이스홀더)
+
+모든 파일은 임시 파일에 쓴 뒤 rename으로 교체하므로 읽는 쪽은 락 없이도
+반쯤 쓰인 파일을 보지 않는다. 여러 워커 프로세스 사이에서는 .lock 파일의
+flock으로 쓰기(공유 락)와 정리/마이그레이션/접근 빈도 반영(배타 락)을 구분한다.
 """
 
 from __future__ import annotations
 
+import hashlib
 import json
+import os
+import tempfile
 import time
+from collections import Counter
+from contextlib import contextmanager
 from pathlib import Path
 from threading import Lock
-from typing import Optional, Tuple
+from typing import Iterator, List, Optional, Tuple
+
+from .metrics import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows 등: 프로세스 간 락 없이 동작 (단일 워커 가정)
+    fcntl = None
 
 # 캐시 파라미터 (메모리 캐시와 동일한 TTL 사용)
 DEFAULT_TTL = 4 * 60 * 60  # 4시간
 MAX_CACHE_ITEMS = 800
 MAX_CACHE_SIZE_BYTES = 512 * 1024 * 1024  # 512MB
 
+# 참조가 없는 blob/임시 파일도 이 시간 동안은 지우지 않음
+# (다른 워커가 막 참조하거나 쓰고 있는 경우 보호)
+ORPHAN_GRACE_SECONDS = 60
+
+# 플레이스홀더는 원본이 바뀌지 않는 한 유효하므로 본문보다 오래 유지
+PLACEHOLDER_TTL = 7 * 24 * 60 * 60  # 7일
+
+
+def _shard(name: str) -> Path:
+    return Path(name[:2]) / name[2:4]
+
+
+def _atomic_write(path: Path, data: bytes) -> None:
+    """같은 디렉토리의 임시 파일에 쓴 뒤 rename으로 교체"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
 
 class DiskImageCache:
     """간단한 디스크 캐시 구현."""
 
     def __init__(self) -> None:
         self.cache_dir = Path(__file__).resolve().parent / ".cache"
-        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.meta_dir = self.cache_dir / "meta"
+        self.blob_dir = self.cache_dir / "blobs"
+        self.placeholder_dir = self.cache_dir / "placeholders"
+        self.meta_dir.mkdir(parents=True, exist_ok=True)
+        self.blob_dir.mkdir(parents=True, exist_ok=True)
         self._lock = Lock()
-        self._last_cleanup = 0.0
+        self._lock_fd: Optional[int] = None
+        # 접근 빈도 (주기적으로 메타데이터의 hits/last_access에 반영)
+        self._access_lock = Lock()
+        self._access_counts: Counter = Counter()
+        self._migrate_flat_layout()
 
-    def _data_path(self, key: str) -> Path:
-        return self.cache_dir / f"{key}.bin"
+    # ---------- 경로 ----------
 
     def _meta_path(self, key: str) -> Path:
-        return self.cache_dir / f"{key}.json"
+        return self.meta_dir / _shard(key) / f"{key}.json"
+
+    def _blob_path(self, digest: str) -> Path:
+        return self.blob_dir / _shard(digest) / f"{digest}.bin"
+
+    def _placeholder_path(self, key: str) -> Path:
+        return self.placeholder_dir / _shard(key) / f"{key}.json"
+
+    def _iter_meta_paths(self) -> Iterator[Path]:
+        return self.meta_dir.glob("*/*/*.json")
+
+    def _iter_blob_paths(self) -> Iterator[Path]:
+        return self.blob_dir.glob("*/*/*.bin")
+
+    # ---------- 프로세스 간 락 ----------
+
+    @contextmanager
+    def _process_lock(self, exclusive: bool):
+        """쓰기는 공유 락, 정리/마이그레이션/메타데이터 재작성은 배타 락 (같은 프로세스 안은 self._lock으로 직렬화)"""
+        if fcntl is None:
+            yield
+            return
+        if self._lock_fd is None:
+            self._lock_fd = os.open(
+                str(self.cache_dir / ".lock"), os.O_RDWR | os.O_CREAT, 0o644
+            )
+        fcntl.flock(self._lock_fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    # ---------- 마이그레이션 ----------
+
+    def _migrate_flat_layout(self) -> None:
+        """
+        이전 평면 구조(.cache/<key>.json + <key>.bin, .cache/blobs/<sha256>.bin)를
+        분산 디렉토리 구조로 옮긴다. 여러 워커가 동시에 시작해도 한 번만 수행된다.
+        """
+        flat_meta = list(self.cache_dir.glob("*.json"))
+        flat_blobs = list(self.blob_dir.glob("*.bin"))
+        if not flat_meta and not flat_blobs:
+            return
+
+        with self._lock, self._process_lock(exclusive=True):
+            migrated = 0
+            for blob_path in self.blob_dir.glob("*.bin"):
+                target = self._blob_path(blob_path.stem)
+                target.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(blob_path, target)
+
+            for meta_path in self.cache_dir.glob("*.json"):
+                key = meta_path.stem
+                legacy_data_path = self.cache_dir / f"{key}.bin"
+                try:
+                    metadata = json.loads(meta_path.read_text())
+                    if not metadata.get("blob"):
+                        data = legacy_data_path.read_bytes()
+                        digest = hashlib.sha256(data).hexdigest()
+                        blob_path = self._blob_path(digest)
+                        if not blob_path.exists():
+                            _atomic_write(blob_path, data)
+                        metadata["blob"] = digest
+                        metadata.setdefault("size", len(data))
+                    _atomic_write(
+                        self._meta_path(key), json.dumps(metadata).encode()
+                    )
+                    migrated += 1
+                except Exception:
+                    pass
+                meta_path.unlink(missing_ok=True)  # type: ignore[attr-defined]
+                legacy_data_path.unlink(missing_ok=True)  # type: ignore[attr-defined]
+
+            # 메타데이터 없이 남은 이전 본문 정리
+            for data_path in self.cache_dir.glob("*.bin"):
+                data_path.unlink(missing_ok=True)  # type: ignore[attr-defined]
+
+            if migrated:
+                print(f"[Image Cache] 디스크 캐시 {migrated}개 항목을 분산 디렉토리로 이전")
+
+    # ---------- 조회 ----------
 
     def _delete(self, key: str) -> None:
+        """키 참조 삭제 (blob은 정리 단계에서 참조 수를 보고 삭제)"""
         try:
-            self._data_path(key).unlink(missing_ok=True)  # type: ignore[attr-defined]
+            self._meta_path(key).unlink(missing_ok=True)  # type: ignore[attr-defined]
         except Exception:
             pass
+
+    def _read_meta(self, key: str) -> Optional[dict]:
         try:
-            self._meta_path(key).unlink(missing_ok=True)  # type: ignore[attr-defined]
+            metadata = json.loads(self._meta_path(key).read_text())
+        except FileNotFoundError:
+            return None
         except Exception:
-            pass
+            self._delete(key)
+            return None
+        if not metadata.get("blob"):
+            self._delete(key)
+            return None
+        return metadata
 
-    def get(self, key: str) -> Optional[Tuple[bytes, str]]:
-        """디스크 캐시 조회."""
-        data_path = self._data_path(key)
-        meta_path = self._meta_path(key)
-        if not data_path.exists() or not meta_path.exists():
+    def get_meta(self, key: str) -> Optional[dict]:
+        """
+        유효한 항목의 메타데이터 조회 (본문은 읽지 않음).
+
+        Returns:
+            {"timestamp", "size", "content_type", "etag", "blob"} 또는 None
+        """
+        metadata = self._read_meta(key)
+        if metadata is None:
             return None
 
         try:
-            metadata = json.loads(meta_path.read_text())
             timestamp = float(metadata.get("timestamp", 0))
             ttl = int(metadata.get("ttl", DEFAULT_TTL))
+            size = self._blob_path(metadata["blob"]).stat().st_size
         except Exception:
             self._delete(key)
             return None
 
         if time.time() - timestamp > ttl:
             self._delete(key)
+            metrics.record_eviction("disk", "ttl")
+            return None
+
+        return {
+            "timestamp": timestamp,
+            "size": size,
+            "content_type": metadata.get("content_type", "image/jpeg"),
+            # etag가 없는 이전 항목은 저장 시점 기준으로 대체
+            "etag": metadata.get("etag") or f"{key}-{size}-{int(timestamp)}",
+            "blob": metadata["blob"],
+        }
+
+    def get(self, key: str) -> Optional[Tuple[bytes, str]]:
+        """디스크 캐시 조회."""
+        metadata = self.get_meta(key)
+        if metadata is None:
+            return None
+
+        try:
+            data = self._blob_path(metadata["blob"]).read_bytes()
+        except FileNotFoundError:
+            self._delete(key)
+            return None
+
+        return data, metadata["content_type"]
+
+    def read_range(self, key: str, start: int, end: int) -> Optional[bytes]:
+        """본문 중 [start, end] 구간만 읽기 (end 포함, get과 같이 만료 항목은 None)."""
+        metadata = self.get_meta(key)
+        if metadata is None:
             return None
 
         try:
-            data = data_path.read_bytes()
+            with self._blob_path(metadata["blob"]).open("rb") as f:
+                f.seek(start)
+                data = f.read(end - start + 1)
         except FileNotFoundError:
             self._delete(key)
             return None
 
-        content_type = metadata.get("content_type", "image/jpeg")
-        return data, content_type
+        if len(data) != end - start + 1:
+            return None
+        return data
 
-    def set(self, key: str, data: bytes, content_type: str) -> None:
-        """캐시에 저장."""
+    # ---------- 저장/정리 ----------
+
+    def set(
+        self, key: str, data: bytes, content_type: str, etag: Optional[str] = None
+    ) -> None:
+        """캐시에 저장 (같은 내용의 blob이 이미 있으면 참조만 추가)."""
         if not data:
             return
 
+        digest = hashlib.sha256(data).hexdigest()
         with self._lock:
             try:
-                self.cache_dir.mkdir(parents=True, exist_ok=True)
-                self._data_path(key).write_bytes(data)
-                metadata = {
-                    "timestamp": time.time(),
-                    "ttl": DEFAULT_TTL,
-                    "size": len(data),
-                    "content_type": content_type,
-                }
-                self._meta_path(key).write_text(json.dumps(metadata))
+                with self._process_lock(exclusive=False):
+                    blob_path = self._blob_path(digest)
+                    if blob_path.exists():
+                        # 정리 단계에서 고아 blob으로 오인되지 않도록 갱신
+                        os.utime(blob_path)
+                    else:
+                        _atomic_write(blob_path, data)
+                    previous = self._read_meta(key) or {}
+                    metadata = {
+                        "timestamp": time.time(),
+                        "ttl": DEFAULT_TTL,
+                        "size": len(data),
+                        "content_type": content_type,
+                        "etag": etag or hashlib.md5(data).hexdigest(),
+                        "blob": digest,
+                        # 다시 저장돼도 누적 접근 빈도는 유지
+                        "hits": int(previous.get("hits", 0)),
+                        "last_access": previous.get("last_access"),
+                    }
+                    _atomic_write(self._meta_path(key), json.dumps(metadata).encode())
             except Exception:
                 return
 
-            self._cleanup_if_needed()
+    def cleanup(self, min_interval: float = 0) -> bool:
+        """
+        TTL 및 최대 용량에 따라 정리 (blob은 참조 수가 0이 되면 삭제).
 
-    def _cleanup_if_needed(self, force: bool = False) -> None:
-        """TTL 및 최대 용량에 따라 정리."""
-        now = time.time()
-        if not force and now - self._last_cleanup < 120:
-            return
+        janitor 태스크에서 주기적으로 호출한다. 여러 워커 중 min_interval 안에
+        이미 정리한 곳이 있으면 건너뛴다. 정리 수행 여부 반환
+        """
+        marker = self.cache_dir / ".janitor"
+        with self._lock, self._process_lock(exclusive=True):
+            now = time.time()
+            try:
+                if now - marker.stat().st_mtime < min_interval:
+                    return False
+            except FileNotFoundError:
+                pass
+            self._cleanup(now)
+            marker.touch()
+        return True
 
-        self._last_cleanup = now
+    def _cleanup(self, now: float) -> None:
         entries = []
-        total_size = 0
+        refcounts: Counter = Counter()
+        blob_sizes = {}
 
-        for meta_path in self.cache_dir.glob("*.json"):
+        for meta_path in self._iter_meta_paths():
             key = meta_path.stem
-            data_path = self._data_path(key)
-            if not data_path.exists():
-                meta_path.unlink(missing_ok=True)
+            metadata = self._read_meta(key)
+            if metadata is None:
                 continue
 
+            blob = metadata["blob"]
             try:
-                metadata = json.loads(meta_path.read_text())
-            except Exception:
+                size = self._blob_path(blob).stat().st_size
+            except FileNotFoundError:
                 self._delete(key)
                 continue
 
             timestamp = float(metadata.get("timestamp", 0))
-            size = int(metadata.get("size", data_path.stat().st_size))
-
             if now - timestamp > DEFAULT_TTL:
                 self._delete(key)
+                metrics.record_eviction("disk", "ttl")
                 continue
 
-            entries.append((key, timestamp, size))
-            total_size += size
+            refcounts[blob] += 1
+            blob_sizes[blob] = size
+            entries.append((key, timestamp, blob))
 
+        # 고아 blob 및 중단된 쓰기의 임시 파일 정리
+        for path in list(self._iter_blob_paths()) + list(
+            self.cache_dir.glob("*/*/*/.*.tmp")
+        ):
+            if path.suffix == ".bin" and path.stem in refcounts:
+                continue
+            try:
+                if now - path.stat().st_mtime > ORPHAN_GRACE_SECONDS:
+                    path.unlink()
+            except FileNotFoundError:
+                continue
+
+        # 용량은 중복 제거된 실제 바이트 기준
+        total_size = sum(blob_sizes.values())
         if len(entries) > MAX_CACHE_ITEMS or total_size > MAX_CACHE_SIZE_BYTES:
             entries.sort(key=lambda item: item[1])  # 오래된 항목부터 제거
             while entries and (
                 len(entries) > MAX_CACHE_ITEMS or total_size > MAX_CACHE_SIZE_BYTES
             ):
-                key, _, size = entries.pop(0)
+                key, _, blob = entries.pop(0)
                 self._delete(key)
-                total_size -= size
+                metrics.record_eviction("disk", "capacity")
+                refcounts[blob] -= 1
+                if refcounts[blob] <= 0:
+                    self._blob_path(blob).unlink(missing_ok=True)  # type: ignore[attr-defined]
+                    total_size -= blob_sizes[blob]
+
+        for path in self.placeholder_dir.glob("*/*/*.json"):
+            try:
+                if now - path.stat().st_mtime > PLACEHOLDER_TTL:
+                    path.unlink()
+            except FileNotFoundError:
+                continue
+
+    # ---------- 플레이스홀더 ----------
+
+    def get_placeholder(self, key: str) -> Optional[dict]:
+        """플레이스홀더 조회 (없거나 만료되면 None)"""
+        path = self._placeholder_path(key)
+        try:
+            if time.time() - path.stat().st_mtime > PLACEHOLDER_TTL:
+                return None
+            return json.loads(path.read_text())
+        except FileNotFoundError:
+            return None
+        except Exception:
+            path.unlink(missing_ok=True)  # type: ignore[attr-defined]
+            return None
+
+    def has_placeholder(self, key: str) -> bool:
+        try:
+            return (
+                time.time() - self._placeholder_path(key).stat().st_mtime
+                <= PLACEHOLDER_TTL
+            )
+        except FileNotFoundError:
+            return False
+
+    def set_placeholder(self, key: str, placeholder: dict) -> None:
+        """플레이스홀더 저장 (수백 바이트라 용량 예산에는 포함하지 않음)"""
+        try:
+            _atomic_write(
+                self._placeholder_path(key), json.dumps(placeholder).encode()
+            )
+        except OSError:
+            pass
+
+    # ---------- 접근 빈도 ----------
+
+    def record_access(self, key: str) -> None:
+        """요청 1건 기록 (메모리에만 누적, flush_access_log에서 디스크 반영)"""
+        with self._access_lock:
+            self._access_counts[key] += 1
+
+    def flush_access_log(self) -> int:
+        """
+        누적된 접근 수를 메타데이터의 hits/last_access에 반영.
+
+        메타데이터를 읽고 다시 쓰는 사이에 다른 워커의 set()이 끼어들면 새 항목을
+        이전 내용으로 덮어쓰게 되므로 배타 락으로 쓰기(공유 락)와 직렬화한다.
+        """
+        with self._access_lock:
+            pending, self._access_counts = self._access_counts, Counter()
+        if not pending:
+            return 0
+
+        now = time.time()
+        flushed = 0
+        with self._lock, self._process_lock(exclusive=True):
+            for key, count in pending.items():
+                metadata = self._read_meta(key)
+                if metadata is None:
+                    continue
+                metadata["hits"] = int(metadata.get("hits", 0)) + count
+                metadata["last_access"] = now
+                try:
+                    _atomic_write(self._meta_path(key), json.dumps(metadata).encode())
+                    flushed += 1
+                except OSError:
+                    continue
+        return flushed
+
+    def hottest(self, max_items: int, max_bytes: int) -> List[str]:
+        """접근 빈도가 높은 유효 항목 키 (개수/바이트 예산 내)"""
+        now = time.time()
+        candidates = []
+        for meta_path in self._iter_meta_paths():
+            try:
+                metadata = json.loads(meta_path.read_text())
+                timestamp = float(metadata.get("timestamp", 0))
+                hits = int(metadata.get("hits", 0))
+                size = int(metadata.get("size", 0))
+            except Exception:
+                continue
+            if hits <= 0 or now - timestamp > int(metadata.get("ttl", DEFAULT_TTL)):
+                continue
+            last_access = float(metadata.get("last_access") or 0)
+            candidates.append((hits, last_access, size, meta_path.stem))
+
+        candidates.sort(reverse=True)
+        keys = []
+        total_size = 0
+        for _, _, size, key in candidates:
+            if len(keys) >= max_items:
+                break
+            if total_size + size > max_bytes:
+                continue
+            keys.append(key)
+            total_size += size
+        return keys
+
+    def usage(self) -> dict:
+        """디스크 상주 항목 수 및 바이트 (통계용)"""
+        items = 0
+        logical_size = 0
+        for meta_path in self._iter_meta_paths():
+            try:
+                metadata = json.loads(meta_path.read_text())
+            except Exception:
+                continue
+            items += 1
+            logical_size += int(metadata.get("size", 0))
+
+        blobs = 0
+        total_size = 0
+        for blob_path in self._iter_blob_paths():
+            try:
+                total_size += blob_path.stat().st_size
+                blobs += 1
+            except FileNotFoundError:
+                continue
+        return {
+            "items": items,
+            "blobs": blobs,
+            "bytes": total_size,
+            "logical_bytes": logical_size,
+            "max_items": MAX_CACHE_ITEMS,
+            "max_bytes": MAX_CACHE_SIZE_BYTES,
+        }
 
 
 disk_cache = DiskImageCache()
@@ -0,0 +1,66 @@
+"""
+Firebase Storage 업스트림 HTTP 클라이언트
+
+캐시 미스마다 새 AsyncClient를 만들면 DNS/TCP/TLS 설정 비용을 매번 지불하므로,
+앱 lifespan 동안 유지되는 단일 클라이언트를 공유한다 (HTTP/2 멀티플렉싱).
+"""
+
+from __future__ import annotations
+
+import importlib.util
+from typing import Optional
+
+import httpx
+
+from common.config import settings
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _http2_available() -> bool:
+    """h2 패키지가 설치되어 있어야 HTTP/2 사용 가능"""
+    return importlib.util.find_spec("h2") is not None
+
+
+def _build_client() -> httpx.AsyncClient:
+    http2 = settings.IMAGE_HTTP2
+    if http2 and not _http2_available():
+        print("[Image Proxy] ⚠️  h2 패키지가 없어 HTTP/1.1로 동작합니다")
+        http2 = False
+
+    return httpx.AsyncClient(
+        http2=http2,
+        timeout=httpx.Timeout(
+            settings.IMAGE_HTTP_READ_TIMEOUT,
+            connect=settings.IMAGE_HTTP_CONNECT_TIMEOUT,
+        ),
+        limits=httpx.Limits(
+            max_connections=settings.IMAGE_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.IMAGE_HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=settings.IMAGE_HTTP_KEEPALIVE_EXPIRY,
+        ),
+        headers={"User-Agent": "heritage-proxy/1.0"},
+    )
+
+
+async def start_http_client() -> None:
+    """lifespan startup에서 공유 클라이언트 생성"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+
+
+async def close_http_client() -> None:
+    """lifespan shutdown에서 커넥션 풀 정리"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """공유 클라이언트 반환 (lifespan 밖에서 호출되면 지연 생성)"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+    return _client
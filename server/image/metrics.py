@@ -0,0 +1,180 @@
+"""
+이미지 캐시 텔레메트리
+
+티어별(메모리/공유 메모리/디스크 쓰기 대기열/디스크/업스트림) 히트·미스, 축출 사유, 변환/다운로드 지연 분포,
+자주 요청되는 키를 프로세스 단위로 집계한다. 캐시 예산 조정용.
+"""
+
+from __future__ import annotations
+
+import bisect
+import time
+from collections import Counter
+from threading import Lock
+from typing import Dict, List, Optional
+
+# 지연 히스토그램 버킷 상한 (초)
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+# 핫 키 추적 한도 (초과 시 상위 절반만 유지)
+MAX_TRACKED_KEYS = 5000
+TOP_KEYS = 20
+
+
+class LatencyHistogram:
+    """고정 버킷 누적 히스토그램 (Prometheus 형식과 동일한 의미)."""
+
+    def __init__(self, buckets: List[float] = LATENCY_BUCKETS) -> None:
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # 마지막은 +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+    def snapshot(self) -> dict:
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(self.buckets + ["+Inf"], self.counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        return {
+            "count": self.count,
+            "sum_seconds": round(self.total, 6),
+            "avg_ms": round(self.total / self.count * 1000, 3) if self.count else None,
+            "buckets": buckets,
+        }
+
+
+class ImageCacheMetrics:
+    """이미지 프록시 캐시 카운터."""
+
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.started_at = time.time()
+            self.requests: Dict[str, int] = {
+                "memory": 0,
+                "shared": 0,
+                "pending": 0,  # 디스크 쓰기 대기열 (write-behind)에서 응답
+                "disk": 0,
+                "upstream": 0,
+                "negative": 0,
+            }
+            self.upstream_errors = 0
+            # 네거티브 캐시 저장 수 (사유별)
+            self.negative_stored: Dict[str, int] = {"status": 0, "timeout": 0}
+            # 디스크 쓰기 대기열 (write-behind)
+            self.disk_writes: Dict[str, int] = {"queued": 0, "written": 0, "dropped": 0}
+            self.evictions: Dict[str, Dict[str, int]] = {
+                "memory": {"ttl": 0, "capacity": 0},
+                "shared": {"ttl": 0, "capacity": 0},
+                "disk": {"ttl": 0, "capacity": 0},
+            }
+            # 메모리 캐시 승인 정책 결과 (가득 찬 상태에서의 신규 항목)
+            self.admission: Dict[str, int] = {"admitted": 0, "rejected": 0}
+            # 캐시 히트 전 처음 보는 토큰의 업스트림 확인 결과
+            self.token_checks: Dict[str, int] = {"passed": 0, "failed": 0}
+            self.transform_latency = LatencyHistogram()
+            self.upstream_latency = LatencyHistogram()
+            self._key_hits: Counter = Counter()
+            self._key_labels: Dict[str, str] = {}
+
+    def record_request(self, tier: str, cache_key: str, label: str) -> None:
+        """프록시 요청 1건 기록 (tier: memory | shared | pending | disk | upstream | negative)"""
+        with self._lock:
+            self.requests[tier] += 1
+            self._key_hits[cache_key] += 1
+            self._key_labels.setdefault(cache_key, label)
+            if len(self._key_hits) > MAX_TRACKED_KEYS:
+                self._trim_keys()
+
+    def _trim_keys(self) -> None:
+        keep = dict(self._key_hits.most_common(MAX_TRACKED_KEYS // 2))
+        self._key_hits = Counter(keep)
+        self._key_labels = {k: v for k, v in self._key_labels.items() if k in keep}
+
+    def record_upstream_error(self) -> None:
+        with self._lock:
+            self.upstream_errors += 1
+
+    def record_negative_store(self, reason: str) -> None:
+        """네거티브 캐시 저장 기록 (reason: status | timeout)"""
+        with self._lock:
+            self.negative_stored[reason] += 1
+
+    def record_disk_write(self, outcome: str) -> None:
+        """디스크 쓰기 대기열 기록 (outcome: queued | written | dropped)"""
+        with self._lock:
+            self.disk_writes[outcome] += 1
+
+    def record_eviction(self, tier: str, reason: str, count: int = 1) -> None:
+        """축출 기록 (tier: memory | shared | disk, reason: ttl | capacity)"""
+        if count <= 0:
+            return
+        with self._lock:
+            self.evictions[tier][reason] += count
+
+    def record_admission(self, admitted: bool) -> None:
+        with self._lock:
+            self.admission["admitted" if admitted else "rejected"] += 1
+
+    def record_token_check(self, passed: bool) -> None:
+        with self._lock:
+            self.token_checks["passed" if passed else "failed"] += 1
+
+    def observe_transform(self, seconds: float) -> None:
+        with self._lock:
+            self.transform_latency.observe(seconds)
+
+    def observe_upstream(self, seconds: float) -> None:
+        with self._lock:
+            self.upstream_latency.observe(seconds)
+
+    def snapshot(self, resident: Optional[dict] = None) -> dict:
+        """현재 통계 (resident: 티어별 상주 항목/바이트, 호출자가 계산)"""
+        with self._lock:
+            total = sum(self.requests.values())
+            ratios = {
+                tier: (round(count / total, 4) if total else None)
+                for tier, count in self.requests.items()
+            }
+            return {
+                "uptime_seconds": round(time.time() - self.started_at, 1),
+                "requests": {"total": total, **self.requests},
+                "hit_ratio": {
+                    **ratios,
+                    "overall": (
+                        round((total - self.requests["upstream"]) / total, 4)
+                        if total
+                        else None
+                    ),
+                },
+                "upstream_errors": self.upstream_errors,
+                "negative_cache": {
+                    "hits": self.requests["negative"],
+                    "stored": dict(self.negative_stored),
+                },
+                "resident": resident or {},
+                "evictions": {tier: dict(v) for tier, v in self.evictions.items()},
+                "admission": dict(self.admission),
+                "token_checks": dict(self.token_checks),
+                "disk_writes": dict(self.disk_writes),
+                "latency": {
+                    "transform": self.transform_latency.snapshot(),
+                    "upstream_fetch": self.upstream_latency.snapshot(),
+                },
+                "hot_keys": [
+                    {"key": key, "label": self._key_labels.get(key), "requests": n}
+                    for key, n in self._key_hits.most_common(TOP_KEYS)
+                ],
+            }
+
+
+metrics = ImageCacheMetrics()
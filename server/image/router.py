@@ -3,51 +3,167 @@
 Firebase Storage 이미지를 서버를 통해 프록시하여 CORS 문제 해결
 """
 
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel
+import base64
 import httpx
 import io
-from typing import Optional
-from .cache_manager import disk_cache
-import hashlib
-import time
+from typing import List, Optional
+from .metrics import metrics
+from .service import (
+    CachedImage,
+    build_sheet,
+    cache_usage,
+    ensure_token_validated,
+    fetch_crops,
+    fetch_variant,
+    get_placeholder,
+    get_placeholders,
+    get_prefetch_job,
+    lookup_cached,
+    lookup_negative,
+    make_cache_key,
+    make_crop_key,
+    negative_exception,
+    read_cached_range,
+    record_access,
+    start_prefetch,
+    token_validated,
+    validate_image_url,
+)
+from .utils import (
+    RangeNotSatisfiable,
+    http_date,
+    if_range_matches,
+    parse_bbox,
+    parse_range_header,
+)
 
 router = APIRouter()
 
-# 간단한 메모리 캐시 (LRU 방식)
-# key -> (data, timestamp, media_type)
-_image_cache = {}
-_cache_max_size = 500  # 최대 캐시 항목 수 (300 -> 500으로 증가)
-_cache_ttl = 14400  # 4시간 (초) (2시간 -> 4시간으로 증가)
+_TIER_BY_STATUS = {
+    "HIT-MEM": "memory",
+    "HIT-SHM": "shared",
+    "HIT-PENDING": "pending",
+    "HIT-DISK": "disk",
+}
 
 
-def _get_cache_key(url: str) -> str:
-    """URL을 기반으로 캐시 키 생성"""
-    return hashlib.md5(url.encode()).hexdigest()
+class PrefetchVariant(BaseModel):
+    """프리페치할 변형 (proxy 쿼리 파라미터와 동일)"""
 
+    maxWidth: Optional[int] = None
+    maxHeight: Optional[int] = None
+    quality: Optional[int] = None
 
-def _clean_cache():
-    """오래된 캐시 항목 제거"""
-    current_time = time.time()
-    keys_to_remove = []
 
-    for key, (_, timestamp, _) in list(_image_cache.items()):
-        if current_time - timestamp > _cache_ttl:
-            keys_to_remove.append(key)
+class PrefetchRequest(BaseModel):
+    """프리페치 요청 본문"""
 
-    for key in keys_to_remove:
-        del _image_cache[key]
+    urls: List[str]
+    variants: List[PrefetchVariant] = []
 
-    # 캐시 크기 제한
-    if len(_image_cache) > _cache_max_size:
-        # 가장 오래된 항목 제거
-        sorted_items = sorted(_image_cache.items(), key=lambda x: x[1][1])
-        for key, _ in sorted_items[: len(_image_cache) - _cache_max_size]:
-            del _image_cache[key]
+
+class PlaceholderBatchRequest(BaseModel):
+    """플레이스홀더 일괄 조회 요청 본문"""
+
+    urls: List[str]
+
+
+class SheetRequest(BaseModel):
+    """썸네일 시트 요청 본문"""
+
+    urls: List[str]
+    tile: int = 128
+    columns: Optional[int] = None
+    quality: Optional[int] = None
+    inline: bool = False
+
+
+def _upstream_exception(e: Exception) -> HTTPException:
+    """업스트림/처리 오류를 응답 상태 코드로 변환"""
+    if isinstance(e, HTTPException):
+        return e
+    if isinstance(e, httpx.TimeoutException):
+        return HTTPException(status_code=504, detail="이미지 로드 시간 초과")
+    if isinstance(e, httpx.HTTPStatusError):
+        return HTTPException(
+            status_code=e.response.status_code,
+            detail=f"이미지 로드 실패: {e.response.status_code}",
+        )
+    return HTTPException(status_code=500, detail=f"이미지 프록시 오류: {str(e)}")
+
+
+def _image_headers(entry: CachedImage) -> dict:
+    return {
+        "Cache-Control": "public, max-age=31536000, immutable",
+        "Access-Control-Allow-Origin": "*",
+        "Access-Control-Allow-Methods": "GET",
+        "Access-Control-Allow-Headers": "*",
+        "Access-Control-Expose-Headers": "Content-Range, Accept-Ranges, ETag",
+        "Accept-Ranges": "bytes",
+        "ETag": f'"{entry.etag}"',
+        "Last-Modified": http_date(entry.timestamp),
+        "X-Cache": entry.cache_status,
+        "X-Content-Length": str(entry.size),
+    }
+
+
+def _image_response(
+    request: Request, cache_key: str, entry: CachedImage
+) -> Optional[Response]:
+    """
+    이미지 응답 생성 (Range 요청이면 206 부분 응답)
+
+    디스크 항목은 필요한 구간만 파일에서 읽는다.
+    본문을 읽을 수 없으면 None (호출자가 업스트림에서 다시 가져옴)
+    """
+    headers = _image_headers(entry)
+    range_header = request.headers.get("range")
+
+    if range_header and if_range_matches(
+        request.headers.get("if-range"), entry.etag, headers["Last-Modified"]
+    ):
+        try:
+            byte_range = parse_range_header(range_header, entry.size)
+        except RangeNotSatisfiable:
+            headers["Content-Range"] = f"bytes */{entry.size}"
+            return Response(status_code=416, headers=headers)
+
+        if byte_range:
+            start, end = byte_range
+            if entry.data is not None:
+                body = entry.data[start : end + 1]
+            else:
+                body = read_cached_range(cache_key, start, end)
+                if body is None:
+                    return None
+            headers["Content-Range"] = f"bytes {start}-{end}/{entry.size}"
+            return Response(
+                content=body,
+                status_code=206,
+                media_type=entry.media_type,
+                headers=headers,
+            )
+
+    image_data = entry.data
+    if image_data is None:
+        cached = lookup_cached(cache_key)
+        if cached is None or cached.data is None:
+            return None
+        image_data = cached.data
+
+    return StreamingResponse(
+        io.BytesIO(image_data),
+        media_type=entry.media_type,
+        headers=headers,
+    )
 
 
 @router.get("/proxy")
 async def proxy_image(
+    request: Request,
     url: str,
     maxWidth: Optional[int] = None,
     maxHeight: Optional[int] = None,
@@ -62,171 +178,250 @@ async def proxy_image(
         maxHeight: 최대 높이 (선택)
         quality: 이미지 품질 (1-100, 선택)
 
+    Range / If-Range 헤더를 지원하여 중단된 다운로드를 이어받을 수 있다 (206).
+
     Returns:
         이미지 데이터 (StreamingResponse)
     """
-    if not url:
-        raise HTTPException(status_code=400, detail="URL이 필요합니다")
-
-    # Firebase Storage URL 검증
-    if not url.startswith("https://firebasestorage.googleapis.com/"):
-        raise HTTPException(
-            status_code=400, detail="유효하지 않은 Firebase Storage URL입니다"
-        )
+    validate_image_url(url)
 
     # 캐시 키 생성 (URL + 파라미터 포함)
-    cache_key = _get_cache_key(f"{url}:{maxWidth}:{maxHeight}:{quality}")
-
-    # 캐시 확인
-    _clean_cache()
-    if cache_key in _image_cache:
-        cached_data, _, cached_media_type = _image_cache[cache_key]
-        return StreamingResponse(
-            io.BytesIO(cached_data),
-            media_type=cached_media_type,
-            headers={
-                "Cache-Control": "public, max-age=31536000, immutable",
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Methods": "GET",
-                "Access-Control-Allow-Headers": "*",
-                "X-Cache": "HIT-MEM",
-                "X-Content-Length": str(len(cached_data)),
-            },
-        )
+    cache_key = make_cache_key(url, maxWidth, maxHeight, quality)
+
+    # 이번 요청까지 빈도에 반영한 뒤 조회 (메모리 캐시 승인 판단에 사용)
+    record_access(cache_key)
+
+    # 캐시 확인 (메모리 → 디스크). Range 요청은 디스크 본문을 구간만 읽음
+    cached = lookup_cached(cache_key, load_data="range" not in request.headers)
+    # 캐시 키에는 토큰이 없으므로 처음 보는 토큰이면 업스트림에서 권한을 먼저 확인
+    if cached and not token_validated(url):
+        try:
+            await ensure_token_validated(url)
+        except Exception as e:
+            raise _upstream_exception(e)
+    # 최근 4xx/반복 타임아웃이 난 원본은 업스트림에 다시 요청하지 않음
+    negative = None if cached else lookup_negative(url)
+    if cached:
+        tier = _TIER_BY_STATUS[cached.cache_status]
+    else:
+        tier = "negative" if negative else "upstream"
+    metrics.record_request(
+        tier, cache_key, f"{url.split('?')[0]}:{maxWidth}:{maxHeight}:{quality}"
+    )
+    if cached:
+        response = _image_response(request, cache_key, cached)
+        if response is not None:
+            return response
+    if negative:
+        raise negative_exception(negative)
 
-    disk_cached = disk_cache.get(cache_key)
-    if disk_cached:
-        cached_data, cached_media_type = disk_cached
-        return StreamingResponse(
-            io.BytesIO(cached_data),
-            media_type=cached_media_type,
-            headers={
-                "Cache-Control": "public, max-age=31536000, immutable",
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Methods": "GET",
-                "Access-Control-Allow-Headers": "*",
-                "X-Cache": "HIT-DISK",
-                "X-Content-Length": str(len(cached_data)),
-            },
+    try:
+        entry = await fetch_variant(
+            url, maxWidth, maxHeight, quality, cache_key=cache_key
         )
+        return _image_response(request, cache_key, entry)
 
-    try:
-        async with httpx.AsyncClient(
-            timeout=httpx.Timeout(30.0, connect=10.0)
-        ) as client:
-            response = await client.get(url)
-            response.raise_for_status()
-
-            image_data = response.content
-
-            # 이미지 리사이즈/압축 (PIL 사용)
-            if maxWidth or maxHeight or quality:
-                try:
-                    from PIL import Image
-
-                    img = Image.open(io.BytesIO(image_data))
-
-                    # 리사이즈
-                    if maxWidth or maxHeight:
-                        original_width, original_height = img.size
-                        if maxWidth and maxHeight:
-                            # 비율 유지하면서 리사이즈
-                            ratio = min(
-                                maxWidth / original_width, maxHeight / original_height
-                            )
-                            new_width = int(original_width * ratio)
-                            new_height = int(original_height * ratio)
-                        elif maxWidth:
-                            ratio = maxWidth / original_width
-                            new_width = maxWidth
-                            new_height = int(original_height * ratio)
-                        else:
-                            ratio = maxHeight / original_height
-                            new_width = int(original_width * ratio)
-                            new_height = maxHeight
-
-                        if new_width < original_width or new_height < original_height:
-                            img = img.resize(
-                                (new_width, new_height), Image.Resampling.LANCZOS
-                            )
-
-                    # 품질 조정 및 최적화
-                    output = io.BytesIO()
-                    quality_value = quality if quality and 1 <= quality <= 100 else 85
-                    img_format = img.format or "JPEG"
-
-                    # WebP 형식으로 변환 시도 (더 작은 파일 크기)
-                    try:
-                        if img_format != "PNG" and img.mode != "RGBA":
-                            # JPEG는 WebP로 변환 (더 작은 크기)
-                            img.save(
-                                output, format="WEBP", quality=quality_value, method=6
-                            )
-                            image_data = output.getvalue()
-                        elif img_format == "PNG":
-                            img.save(output, format="PNG", optimize=True)
-                            image_data = output.getvalue()
-                        else:
-                            img.save(
-                                output,
-                                format="JPEG",
-                                quality=quality_value,
-                                optimize=True,
-                            )
-                            image_data = output.getvalue()
-                    except Exception:
-                        # WebP 변환 실패 시 원본 형식 사용
-                        if img_format == "PNG":
-                            img.save(output, format="PNG", optimize=True)
-                        else:
-                            img.save(
-                                output,
-                                format="JPEG",
-                                quality=quality_value,
-                                optimize=True,
-                            )
-                        image_data = output.getvalue()
-                except Exception as e:
-                    # 이미지 처리 실패 시 원본 사용
-                    print(f"[Image Proxy] 이미지 처리 실패, 원본 사용: {e}")
-
-            # 이미지 데이터를 스트리밍으로 반환
-            # WebP 변환 시 media_type 변경
-            media_type = (
-                "image/webp"
-                if image_data[:4] == b"RIFF"
-                else response.headers.get("content-type", "image/jpeg")
-            )
+    except Exception as e:
+        raise _upstream_exception(e)
 
-            # 캐시에 저장 (크기 제한 완화)
-            if (
-                len(image_data) < 15 * 1024 * 1024
-            ):  # 15MB 이하만 캐시 (10MB -> 15MB로 증가)
-                _image_cache[cache_key] = (image_data, time.time(), media_type)
-                disk_cache.set(cache_key, image_data, media_type)
-
-            return StreamingResponse(
-                io.BytesIO(image_data),
-                media_type=media_type,
-                headers={
-                    "Cache-Control": "public, max-age=31536000, immutable",
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Methods": "GET",
-                    "Access-Control-Allow-Headers": "*",
-                    "X-Cache": "MISS",
-                    "X-Content-Length": str(len(image_data)),
-                },
-            )
 
-    except httpx.TimeoutException:
-        raise HTTPException(status_code=504, detail="이미지 로드 시간 초과")
-    except httpx.HTTPStatusError as e:
-        raise HTTPException(
-            status_code=e.response.status_code,
-            detail=f"이미지 로드 실패: {e.response.status_code}",
+@router.get("/crop")
+async def crop_damage_regions(
+    request: Request,
+    url: str,
+    bbox: List[str] = Query(...),
+    maxWidth: Optional[int] = None,
+    pad: int = 0,
+    quality: Optional[int] = None,
+):
+    """
+    캐시된 원본에서 손상 영역을 잘라 반환
+
+    Args:
+        url: Firebase Storage 이미지 URL
+        bbox: x1,y1,x2,y2 (원본 픽셀 좌표, 여러 번 지정 가능)
+        maxWidth: 크롭 결과 최대 너비 (선택)
+        pad: bbox 주변 여백 (픽셀)
+        quality: 이미지 품질 (1-100, 선택)
+
+    Returns:
+        bbox가 하나면 이미지 데이터, 여러 개면 crops 목록 (data URI) JSON
+    """
+    validate_image_url(url)
+    try:
+        bboxes = [parse_bbox(value) for value in bbox]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if pad < 0:
+        raise HTTPException(status_code=400, detail="pad는 0 이상이어야 합니다")
+
+    try:
+        entries = await fetch_crops(url, bboxes, maxWidth, pad, quality)
+    except Exception as e:
+        raise _upstream_exception(e)
+
+    keys = [make_crop_key(url, region, maxWidth, pad, quality) for region in bboxes]
+    label = url.split("?")[0]
+    for cache_key, region, entry in zip(keys, bbox, entries):
+        metrics.record_request(
+            _TIER_BY_STATUS.get(entry.cache_status, "upstream"),
+            cache_key,
+            f"{label}:crop={region}:{maxWidth}:{pad}:{quality}",
         )
+
+    if len(entries) == 1:
+        response = _image_response(request, keys[0], entries[0])
+        if response is not None:
+            return response
+
+    return JSONResponse(
+        {
+            "crops": [
+                {
+                    "bbox": list(region),
+                    "media_type": entry.media_type,
+                    "size": entry.size,
+                    "etag": entry.etag,
+                    "cache": entry.cache_status,
+                    "data": f"data:{entry.media_type};base64,"
+                    + base64.b64encode(entry.data).decode("ascii"),
+                }
+                for region, entry in zip(bboxes, entries)
+            ]
+        },
+        headers={
+            "Cache-Control": "public, max-age=86400",
+            "Access-Control-Allow-Origin": "*",
+        },
+    )
+
+
+@router.post("/sheet")
+async def create_sheet(request: SheetRequest):
+    """
+    여러 썸네일을 하나의 스프라이트 이미지로 합성 (갤러리 격자를 한 번에 로드)
+
+    Args:
+        urls: Firebase Storage 이미지 URL 목록 (최대 100, 순서대로 배치)
+        tile: 정사각형 칸 크기 (픽셀)
+        columns: 열 수 (기본: 정사각형에 가깝게)
+        quality: 스프라이트 품질 (1-100)
+        inline: true면 스프라이트를 data URI로 함께 반환
+
+    Returns:
+        sheet_id, sprite(/image/sheet/{sheet_id}), width, height, tiles(url, x, y, w, h),
+        missing(로드하지 못한 URL). missing이 있으면 시트는 캐시되지 않고 data로만 반환
+    """
+    sheet_id, entry, sheet_map = await build_sheet(
+        request.urls, request.tile, request.columns, request.quality
+    )
+    metrics.record_request(
+        _TIER_BY_STATUS.get(entry.cache_status, "upstream"),
+        sheet_id,
+        f"sheet:{len(request.urls)}x{request.tile}",
+    )
+
+    body = {
+        **sheet_map,
+        "sprite": f"/image/sheet/{sheet_id}",
+        "etag": entry.etag,
+        "cache": entry.cache_status,
+    }
+    if request.inline or sheet_map["missing"]:
+        body["data"] = f"data:{entry.media_type};base64," + base64.b64encode(
+            entry.data
+        ).decode("ascii")
+    return JSONResponse(body, headers={"Access-Control-Allow-Origin": "*"})
+
+
+@router.get("/sheet/{sheet_id}")
+async def get_sheet(request: Request, sheet_id: str):
+    """
+    캐시된 썸네일 시트 스프라이트 이미지 (없으면 404, POST /image/sheet로 다시 생성)
+
+    토큰을 다시 확인하지 않는다. sheet_id에 URL 토큰이 포함되어 있어
+    POST /image/sheet 응답을 받은 쪽만 알 수 있다 (make_sheet_key).
+    """
+    if len(sheet_id) != 32 or any(c not in "0123456789abcdef" for c in sheet_id):
+        raise HTTPException(status_code=400, detail="유효하지 않은 sheet_id입니다")
+    cached = lookup_cached(sheet_id, load_data="range" not in request.headers)
+    response = _image_response(request, sheet_id, cached) if cached else None
+    if response is None:
+        raise HTTPException(status_code=404, detail="시트를 찾을 수 없습니다")
+    return response
+
+
+@router.get("/placeholder")
+async def image_placeholder(url: str):
+    """
+    저화질 플레이스홀더(LQIP) 조회
+
+    썸네일이 오기 전에 먼저 보여줄 약 1KB 크기의 JPEG(data URI)와 원본 크기를 반환.
+    프록시가 원본을 처음 받을 때 한 번 생성되며, 아직 없으면 404.
+
+    Returns:
+        url, width, height, placeholder, placeholder_width, placeholder_height
+    """
+    try:
+        placeholder = await get_placeholder(url)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"이미지 프록시 오류: {str(e)}")
+        raise _upstream_exception(e)
+    return JSONResponse(
+        placeholder,
+        headers={
+            "Cache-Control": "public, max-age=86400",
+            "Access-Control-Allow-Origin": "*",
+        },
+    )
+
+
+@router.post("/placeholder/batch")
+async def image_placeholder_batch(request: PlaceholderBatchRequest):
+    """
+    여러 이미지의 플레이스홀더를 한 번에 조회 (갤러리 한 페이지 분량)
+
+    Returns:
+        placeholders: {url: 플레이스홀더}, missing: 아직 생성되지 않은 URL 목록
+    """
+    return await get_placeholders(request.urls)
+
+
+@router.post("/prefetch", status_code=202)
+async def prefetch_images(request: PrefetchRequest):
+    """
+    여러 이미지를 백그라운드에서 미리 받아 메모리/디스크 캐시를 채움
+
+    Args:
+        urls: Firebase Storage 이미지 URL 목록
+        variants: 변형 목록 (maxWidth, maxHeight, quality). 비우면 원본만
+
+    Returns:
+        작업 상태 (job_id로 /image/prefetch/{job_id} 조회)
+    """
+    variants = [variant.dict() for variant in request.variants]
+    return start_prefetch(request.urls, variants)
+
+
+@router.get("/prefetch/{job_id}")
+async def prefetch_status(job_id: str):
+    """프리페치 작업 진행 상황 및 실패 목록 조회"""
+    return get_prefetch_job(job_id)
+
+
+@router.get("/stats")
+async def image_cache_stats():
+    """
+    이미지 캐시 통계
+
+    Returns:
+        - requests / hit_ratio: 티어별(memory, shared, pending, disk, upstream) 요청 수와 비율
+        - resident: 티어별 상주 항목 수와 바이트, 설정된 한도
+        - evictions: 티어별 축출 수 (ttl, capacity)
+        - negative_cache: 업스트림 실패 기억으로 건너뛴 요청 수, 사유별 저장 수
+        - latency: 변환 시간, 업스트림 다운로드 지연 히스토그램
+        - hot_keys: 가장 많이 요청된 캐시 키
+    """
+    return metrics.snapshot(resident=await cache_usage())
 
 
 @router.get("/proxy/health")
@@ -243,4 +438,7 @@ async def proxy_info():
         "description": "Firebase Storage 이미지를 CORS 문제 없이 프록시",
         "usage": "/image/proxy?url=<firebase_storage_url>",
         "example": "/image/proxy?url=https://firebasestorage.googleapis.com/...",
+        "placeholder": "/image/placeholder?url=<firebase_storage_url>",
+        "crop": "/image/crop?url=<firebase_storage_url>&bbox=x1,y1,x2,y2",
+        "stats": "/image/stats",
     }
@@ -0,0 +1,1308 @@
+"""
+이미지 프록시 비즈니스 로직
+캐시 조회, Firebase Storage 다운로드, 리사이즈/압축 변환
+"""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import hashlib
+import io
+import math
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import httpx
+from fastapi import HTTPException
+
+from common.config import settings
+from .admission import TinyLFUAdmission
+from .cache_manager import disk_cache
+from .http_client import get_http_client
+from .metrics import metrics
+from .shared_cache import shared_cache
+from .utils import canonical_image_url, image_url_token
+
+FIREBASE_STORAGE_PREFIX = "https://firebasestorage.googleapis.com/"
+MAX_CACHEABLE_BYTES = 15 * 1024 * 1024  # 15MB 이하만 캐시 (10MB -> 15MB로 증가)
+
+# 간단한 메모리 캐시 (LRU 방식)
+# key -> (data, timestamp, media_type, etag)
+# 워커 간 공유 캐시를 실제로 열 수 있으면 그 앞단의 작은 L1으로 동작
+_image_cache = {}
+_cache_max_size = (
+    settings.IMAGE_L1_CACHE_ITEMS if shared_cache.available() else 500
+)  # 최대 캐시 항목 수 (300 -> 500으로 증가)
+_cache_ttl = 14400  # 4시간 (초) (2시간 -> 4시간으로 증가)
+# 가득 찼을 때 한 번 훑고 지나가는 요청이 인기 항목을 밀어내지 않도록 빈도 비교 후 승인
+_admission = (
+    TinyLFUAdmission(_cache_max_size) if settings.IMAGE_CACHE_ADMISSION else None
+)
+
+
+class CachedImage(NamedTuple):
+    """캐시 조회 결과. data가 None이면 디스크에 본문이 남아 있음 (메타데이터만 로드)"""
+
+    data: Optional[bytes]
+    media_type: str
+    size: int
+    etag: str
+    timestamp: float
+    # "HIT-MEM" | "HIT-SHM" | "HIT-PENDING" (디스크 쓰기 대기 중) | "HIT-DISK" | "MISS"
+    cache_status: str
+
+
+def _get_cache_key(url: str) -> str:
+    """URL을 기반으로 캐시 키 생성"""
+    return hashlib.md5(url.encode()).hexdigest()
+
+
+def make_cache_key(
+    url: str,
+    maxWidth: Optional[int] = None,
+    maxHeight: Optional[int] = None,
+    quality: Optional[int] = None,
+) -> str:
+    """
+    캐시 키 생성 (URL + 변환 파라미터 포함)
+
+    URL은 토큰을 제외한 Firebase 객체 식별자로 정규화한다.
+    업스트림 요청에는 호출자가 보낸 URL(토큰 포함)을 그대로 사용.
+    """
+    return _get_cache_key(
+        f"{canonical_image_url(url)}:{maxWidth}:{maxHeight}:{quality}"
+    )
+
+
+def validate_image_url(url: str) -> None:
+    """Firebase Storage URL 검증"""
+    if not url:
+        raise HTTPException(status_code=400, detail="URL이 필요합니다")
+
+    if not url.startswith(FIREBASE_STORAGE_PREFIX):
+        raise HTTPException(
+            status_code=400, detail="유효하지 않은 Firebase Storage URL입니다"
+        )
+
+
+def _clean_cache():
+    """오래된 캐시 항목 제거"""
+    current_time = time.time()
+    keys_to_remove = []
+
+    for key, (_, timestamp, _, _) in list(_image_cache.items()):
+        if current_time - timestamp > _cache_ttl:
+            keys_to_remove.append(key)
+
+    for key in keys_to_remove:
+        del _image_cache[key]
+    metrics.record_eviction("memory", "ttl", len(keys_to_remove))
+
+    # 캐시 크기 제한
+    if len(_image_cache) > _cache_max_size:
+        # 가장 오래된 항목 제거
+        sorted_items = sorted(_image_cache.items(), key=lambda x: x[1][1])
+        overflow = sorted_items[: len(_image_cache) - _cache_max_size]
+        for key, _ in overflow:
+            del _image_cache[key]
+        metrics.record_eviction("memory", "capacity", len(overflow))
+
+
+def _put_memory(cache_key: str, entry: tuple) -> bool:
+    """
+    메모리 캐시에 저장. 가득 찼으면 가장 오래된 항목(축출 대상)보다
+    최근 요청 빈도가 높을 때만 교체한다. 승인 여부 반환
+    """
+    if cache_key in _image_cache or len(_image_cache) < _cache_max_size:
+        _image_cache[cache_key] = entry
+        return True
+
+    victim = min(_image_cache, key=lambda key: _image_cache[key][1])
+    if _admission is not None and not _admission.admit(cache_key, victim):
+        metrics.record_admission(False)
+        return False
+
+    del _image_cache[victim]
+    metrics.record_eviction("memory", "capacity")
+    metrics.record_admission(True)
+    _image_cache[cache_key] = entry
+    return True
+
+
+def _storage_usage() -> Tuple[dict, dict]:
+    """공유 메모리 / 디스크 티어 상주량 (슬롯과 샤드 디렉토리를 모두 훑음)"""
+    return shared_cache.usage(), disk_cache.usage()
+
+
+async def cache_usage() -> dict:
+    """
+    티어별 상주 항목 수 및 바이트
+
+    공유 메모리 슬롯과 디스크 샤드를 훑는 집계는 스레드에서 실행하고,
+    이벤트 루프에서만 바뀌는 프로세스 내 캐시는 루프에서 바로 센다.
+    """
+    shared_usage, disk_usage = await asyncio.to_thread(_storage_usage)
+    return {
+        "memory": {
+            "items": len(_image_cache),
+            "bytes": sum(len(entry[0]) for entry in _image_cache.values()),
+            "max_items": _cache_max_size,
+            "ttl_seconds": _cache_ttl,
+        },
+        "shared": shared_usage,
+        "disk": {
+            **disk_usage,
+            "write_queue": {
+                "pending": len(_pending_disk_writes),
+                "max": settings.IMAGE_DISK_WRITE_QUEUE,
+            },
+        },
+        "negative": {"items": len(_negative_cache)},
+    }
+
+
+def lookup_cached(cache_key: str, load_data: bool = True) -> Optional[CachedImage]:
+    """
+    메모리(L1) → 공유 메모리 → 디스크 순으로 캐시 조회
+
+    Args:
+        load_data: False이면 디스크 항목은 메타데이터만 조회 (Range 응답용)
+    """
+    _clean_cache()
+    if cache_key in _image_cache:
+        cached_data, timestamp, cached_media_type, etag = _image_cache[cache_key]
+        return CachedImage(
+            cached_data, cached_media_type, len(cached_data), etag, timestamp, "HIT-MEM"
+        )
+
+    shared = shared_cache.get(cache_key)
+    if shared is not None:
+        cached_data, timestamp, cached_media_type, etag = shared
+        _put_memory(cache_key, shared)
+        return CachedImage(
+            cached_data, cached_media_type, len(cached_data), etag, timestamp, "HIT-SHM"
+        )
+
+    pending = _pending_disk_writes.get(cache_key)
+    if pending is not None:
+        cached_data, timestamp, cached_media_type, etag = pending
+        return CachedImage(
+            cached_data,
+            cached_media_type,
+            len(cached_data),
+            etag,
+            timestamp,
+            "HIT-PENDING",
+        )
+
+    metadata = disk_cache.get_meta(cache_key)
+    if metadata is None:
+        return None
+
+    cached_data = None
+    if load_data:
+        disk_cached = disk_cache.get(cache_key)
+        if disk_cached is None:
+            return None
+        cached_data = disk_cached[0]
+        # 다른 워커도 디스크를 다시 읽지 않도록 공유 캐시에 올림
+        shared_cache.set(
+            cache_key, cached_data, metadata["content_type"], metadata["etag"]
+        )
+
+    return CachedImage(
+        cached_data,
+        metadata["content_type"],
+        metadata["size"],
+        metadata["etag"],
+        metadata["timestamp"],
+        "HIT-DISK",
+    )
+
+
+def record_access(cache_key: str) -> None:
+    """접근 빈도 기록 (메모리 캐시 승인 판단 및 재시작 후 워밍업 순위용)"""
+    if _admission is not None:
+        _admission.record(cache_key)
+    disk_cache.record_access(cache_key)
+
+
+def read_cached_range(cache_key: str, start: int, end: int) -> Optional[bytes]:
+    """디스크 캐시 항목에서 [start, end] 구간만 읽기"""
+    return disk_cache.read_range(cache_key, start, end)
+
+
+def store_cached(cache_key: str, image_data: bytes, media_type: str) -> str:
+    """
+    메모리, 공유 메모리 캐시에 저장하고 디스크 저장은 대기열에 넣은 뒤 ETag 반환
+    (응답이 디스크 쓰기를 기다리지 않음)
+    """
+    etag = hashlib.md5(image_data).hexdigest()
+    if len(image_data) < MAX_CACHEABLE_BYTES:
+        _put_memory(cache_key, (image_data, time.time(), media_type, etag))
+        shared_cache.set(cache_key, image_data, media_type, etag)
+        _queue_disk_write(cache_key, image_data, media_type, etag)
+    return etag
+
+
+# ==================== 디스크 쓰기 대기열 (write-behind) ====================
+
+# 백그라운드 작업이 시작되면 생성 (그 전에는 동기 저장)
+_disk_write_queue: Optional[asyncio.Queue] = None
+# 아직 디스크에 쓰이지 않은 항목. key -> (data, timestamp, media_type, etag)
+# 이벤트 루프에서만 접근하며, 쓰기 전에 들어온 조회도 여기서 응답한다
+_pending_disk_writes: Dict[str, Tuple[bytes, float, str, str]] = {}
+
+
+def _queue_disk_write(
+    cache_key: str, image_data: bytes, media_type: str, etag: str
+) -> None:
+    if _disk_write_queue is None:
+        disk_cache.set(cache_key, image_data, media_type, etag)
+        return
+
+    entry = (image_data, time.time(), media_type, etag)
+    if cache_key in _pending_disk_writes:
+        # 이미 대기 중인 키는 값만 최신으로 교체
+        _pending_disk_writes[cache_key] = entry
+        return
+    try:
+        _disk_write_queue.put_nowait(cache_key)
+    except asyncio.QueueFull:
+        metrics.record_disk_write("dropped")
+        return
+    _pending_disk_writes[cache_key] = entry
+    metrics.record_disk_write("queued")
+
+
+async def _write_pending(cache_key: str) -> None:
+    # 쓰는 동안 같은 키가 다시 저장되면 최신 값으로 한 번 더 쓴다
+    while True:
+        entry = _pending_disk_writes.get(cache_key)
+        if entry is None:
+            return
+        image_data, _, media_type, etag = entry
+        try:
+            await asyncio.to_thread(
+                disk_cache.set, cache_key, image_data, media_type, etag
+            )
+        except Exception as e:
+            _pending_disk_writes.pop(cache_key, None)
+            print(f"[Image Cache] 디스크 저장 실패: {e}")
+            return
+        metrics.record_disk_write("written")
+        if _pending_disk_writes.get(cache_key) is entry:
+            del _pending_disk_writes[cache_key]
+            return
+
+
+async def _disk_write_worker() -> None:
+    while True:
+        cache_key = await _disk_write_queue.get()
+        try:
+            await _write_pending(cache_key)
+        finally:
+            _disk_write_queue.task_done()
+
+
+async def _drain_disk_writes() -> None:
+    """종료 시 남은 대기열을 모두 디스크에 기록"""
+    for cache_key in list(_pending_disk_writes):
+        await _write_pending(cache_key)
+
+
+# ==================== 네거티브 캐시 (업스트림 실패) ====================
+
+# 삭제되었거나 토큰이 폐기된 객체를 재시도마다 다시 요청하지 않도록 실패를 잠시 기억
+# 원본 URL 키 -> NegativeEntry. 같은 원본의 모든 변형이 공유
+_negative_cache: Dict[str, "NegativeEntry"] = {}
+# 원본 URL 키 -> 연속 타임아웃 횟수
+_timeout_streaks: Dict[str, int] = {}
+_MAX_NEGATIVE_ITEMS = 2000
+
+# 일시적인 4xx는 기억하지 않음
+_TRANSIENT_STATUS_CODES = {408, 429}
+
+
+class NegativeEntry(NamedTuple):
+    status_code: int
+    detail: str
+    expires_at: float
+
+
+def _negative_key(url: str) -> str:
+    # 폐기된 토큰의 403이 새 토큰 요청까지 막지 않도록 토큰을 포함한 전체 URL 기준
+    return _get_cache_key(url)
+
+
+def _store_negative(url: str, status_code: int, detail: str, ttl: int, reason: str):
+    if ttl <= 0:
+        return
+    now = time.time()
+    if len(_negative_cache) >= _MAX_NEGATIVE_ITEMS:
+        for key in [k for k, v in _negative_cache.items() if v.expires_at <= now]:
+            del _negative_cache[key]
+        if len(_negative_cache) >= _MAX_NEGATIVE_ITEMS:
+            # 가장 먼저 만료될 항목 제거
+            del _negative_cache[
+                min(_negative_cache, key=lambda k: _negative_cache[k].expires_at)
+            ]
+    _negative_cache[_negative_key(url)] = NegativeEntry(
+        status_code, detail, now + ttl
+    )
+    metrics.record_negative_store(reason)
+
+
+def _record_upstream_result(url: str, error: Optional[Exception]) -> None:
+    """업스트림 결과에 따라 네거티브 캐시 갱신"""
+    key = _negative_key(url)
+    if error is None:
+        _timeout_streaks.pop(key, None)
+        return
+
+    if isinstance(error, httpx.TimeoutException):
+        streak = _timeout_streaks.get(key, 0) + 1
+        if streak >= settings.IMAGE_NEGATIVE_TIMEOUT_THRESHOLD:
+            _timeout_streaks.pop(key, None)
+            _store_negative(
+                url,
+                504,
+                "이미지 로드 시간 초과",
+                settings.IMAGE_NEGATIVE_TIMEOUT_TTL,
+                "timeout",
+            )
+        else:
+            if len(_timeout_streaks) >= _MAX_NEGATIVE_ITEMS:
+                _timeout_streaks.clear()
+            _timeout_streaks[key] = streak
+    elif isinstance(error, httpx.HTTPStatusError):
+        status_code = error.response.status_code
+        if 400 <= status_code < 500 and status_code not in _TRANSIENT_STATUS_CODES:
+            _store_negative(
+                url,
+                status_code,
+                f"이미지 로드 실패: {status_code}",
+                settings.IMAGE_NEGATIVE_CACHE_TTL,
+                "status",
+            )
+
+
+def negative_exception(entry: NegativeEntry) -> HTTPException:
+    """네거티브 캐시 항목을 업스트림 실패와 같은 상태 코드의 응답으로 변환"""
+    return HTTPException(
+        status_code=entry.status_code,
+        detail=entry.detail,
+        headers={
+            "X-Cache": "HIT-NEG",
+            "Retry-After": str(max(1, int(entry.expires_at - time.time()))),
+            "Access-Control-Allow-Origin": "*",
+        },
+    )
+
+
+def lookup_negative(url: str) -> Optional[NegativeEntry]:
+    """최근 실패한 원본이면 NegativeEntry, 아니면 None"""
+    key = _negative_key(url)
+    entry = _negative_cache.get(key)
+    if entry is None:
+        return None
+    if entry.expires_at <= time.time():
+        _negative_cache.pop(key, None)
+        return None
+    return entry
+
+
+# ==================== 토큰 확인 ====================
+
+# 캐시 키는 토큰을 뺀 Firebase 객체 식별자이므로, 캐시된 바이트를 돌려주기 전에
+# 요청 URL의 토큰(없는 경우 포함)이 그 객체에 대해 업스트림에서 통과된 적 있는지 확인한다.
+# 객체 키 -> 통과한 토큰 해시 (원문은 보관하지 않음). 프로세스별, 오래 안 쓰인 객체부터 제거
+_validated_tokens: "OrderedDict[str, set]" = OrderedDict()
+_MAX_VALIDATED_OBJECTS = 10000
+_MAX_TOKENS_PER_OBJECT = 8
+
+
+def _token_entry(url: str) -> Optional[Tuple[str, str]]:
+    """(객체 키, 토큰 해시). 정규화되지 않는 URL(전체 URL이 캐시 키)이면 None"""
+    canonical = canonical_image_url(url)
+    if canonical == url:
+        return None
+    token = image_url_token(url) or ""
+    return _get_cache_key(canonical), hashlib.sha256(token.encode()).hexdigest()
+
+
+def token_validated(url: str) -> bool:
+    """이 URL의 토큰으로 캐시 히트를 돌려줘도 되는지"""
+    entry = _token_entry(url)
+    if entry is None:
+        return True
+    object_key, token_hash = entry
+    tokens = _validated_tokens.get(object_key)
+    if tokens is None or token_hash not in tokens:
+        return False
+    _validated_tokens.move_to_end(object_key)
+    return True
+
+
+def _record_validated_token(url: str) -> None:
+    """업스트림이 이 URL(토큰 포함)을 허용했음을 기록"""
+    entry = _token_entry(url)
+    if entry is None:
+        return
+    object_key, token_hash = entry
+    tokens = _validated_tokens.pop(object_key, set())
+    if len(tokens) >= _MAX_TOKENS_PER_OBJECT:
+        tokens.clear()  # 재발급이 잦은 객체는 최근 토큰부터 다시 확인
+    tokens.add(token_hash)
+    _validated_tokens[object_key] = tokens
+    if len(_validated_tokens) > _MAX_VALIDATED_OBJECTS:
+        _validated_tokens.popitem(last=False)
+
+
+async def ensure_token_validated(url: str) -> None:
+    """
+    처음 보는 토큰이면 1바이트 Range 요청으로 업스트림 접근 권한을 확인하고 기록.
+    거절되면 다운로드와 같은 예외를 내고 네거티브 캐시에 반영한다.
+
+    Raises:
+        HTTPException: 최근 실패한 URL (네거티브 캐시)
+        httpx.TimeoutException, httpx.HTTPStatusError
+    """
+    if token_validated(url):
+        return
+    negative = lookup_negative(url)
+    if negative is not None:
+        raise negative_exception(negative)
+
+    client = get_http_client()
+    try:
+        # 본문은 읽지 않음 (Range를 무시하고 200으로 답해도 헤더만 확인)
+        async with client.stream("GET", url, headers={"Range": "bytes=0-0"}) as response:
+            response.raise_for_status()
+    except Exception as e:
+        metrics.record_token_check(False)
+        _record_upstream_result(url, e)
+        raise
+    metrics.record_token_check(True)
+    _record_upstream_result(url, None)
+    _record_validated_token(url)
+
+
+async def _token_allowed(url: str, semaphore: asyncio.Semaphore) -> bool:
+    """여러 URL을 확인할 때 사용 (업스트림 동시 요청 수 제한, 실패는 False)"""
+    if token_validated(url):
+        return True
+    async with semaphore:
+        try:
+            await ensure_token_validated(url)
+            return True
+        except Exception:
+            return False
+
+
+async def download_original(url: str) -> Tuple[bytes, str]:
+    """
+    공유 클라이언트로 Firebase Storage 원본 다운로드
+
+    Raises:
+        httpx.TimeoutException, httpx.HTTPStatusError
+    """
+    client = get_http_client()
+    started = time.perf_counter()
+    try:
+        response = await client.get(url)
+        response.raise_for_status()
+    except Exception as e:
+        metrics.record_upstream_error()
+        _record_upstream_result(url, e)
+        raise
+    finally:
+        metrics.observe_upstream(time.perf_counter() - started)
+    _record_upstream_result(url, None)
+    _record_validated_token(url)
+    return response.content, response.headers.get("content-type", "image/jpeg")
+
+
+def transform_image(
+    image_data: bytes,
+    maxWidth: Optional[int] = None,
+    maxHeight: Optional[int] = None,
+    quality: Optional[int] = None,
+) -> bytes:
+    """이미지 리사이즈/압축 (PIL 사용). 실패 시 원본 반환"""
+    if not (maxWidth or maxHeight or quality):
+        return image_data
+
+    started = time.perf_counter()
+    try:
+        from PIL import Image
+
+        img = Image.open(io.BytesIO(image_data))
+
+        # 리사이즈
+        if maxWidth or maxHeight:
+            original_width, original_height = img.size
+            if maxWidth and maxHeight:
+                # 비율 유지하면서 리사이즈
+                ratio = min(maxWidth / original_width, maxHeight / original_height)
+                new_width = int(original_width * ratio)
+                new_height = int(original_height * ratio)
+            elif maxWidth:
+                ratio = maxWidth / original_width
+                new_width = maxWidth
+                new_height = int(original_height * ratio)
+            else:
+                ratio = maxHeight / original_height
+                new_width = int(original_width * ratio)
+                new_height = maxHeight
+
+            if new_width < original_width or new_height < original_height:
+                img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
+
+        # 품질 조정 및 최적화
+        output = io.BytesIO()
+        quality_value = quality if quality and 1 <= quality <= 100 else 85
+        img_format = img.format or "JPEG"
+
+        # WebP 형식으로 변환 시도 (더 작은 파일 크기)
+        try:
+            if img_format != "PNG" and img.mode != "RGBA":
+                # JPEG는 WebP로 변환 (더 작은 크기)
+                img.save(output, format="WEBP", quality=quality_value, method=6)
+                image_data = output.getvalue()
+            elif img_format == "PNG":
+                img.save(output, format="PNG", optimize=True)
+                image_data = output.getvalue()
+            else:
+                img.save(
+                    output,
+                    format="JPEG",
+                    quality=quality_value,
+                    optimize=True,
+                )
+                image_data = output.getvalue()
+        except Exception:
+            # WebP 변환 실패 시 원본 형식 사용
+            if img_format == "PNG":
+                img.save(output, format="PNG", optimize=True)
+            else:
+                img.save(
+                    output,
+                    format="JPEG",
+                    quality=quality_value,
+                    optimize=True,
+                )
+            image_data = output.getvalue()
+    except Exception as e:
+        # 이미지 처리 실패 시 원본 사용
+        print(f"[Image Proxy] 이미지 처리 실패, 원본 사용: {e}")
+    finally:
+        metrics.observe_transform(time.perf_counter() - started)
+
+    return image_data
+
+
+def _media_type_for(image_data: bytes, upstream_content_type: str) -> str:
+    """WebP 변환 시 media_type 변경"""
+    return "image/webp" if image_data[:4] == b"RIFF" else upstream_content_type
+
+
+# ==================== 플레이스홀더 (LQIP) ====================
+
+PLACEHOLDER_SIZE = 32  # 긴 변 기준 픽셀 (JPEG 약 1KB 이하)
+PLACEHOLDER_QUALITY = 50
+MAX_PLACEHOLDER_BATCH = 100
+# 백그라운드 생성 동시 실행 수 / 대기 한도 (초과분은 건너뛰고 다음 미스 때 다시 시도)
+MAX_PLACEHOLDER_WORKERS = 2
+MAX_PLACEHOLDER_PENDING = 32
+
+
+def _placeholder_key(url: str) -> str:
+    """원본(변환 없음) 캐시 항목과 같은 키"""
+    return make_cache_key(url)
+
+
+def make_placeholder(image_data: bytes) -> Optional[dict]:
+    """원본에서 작은 JPEG 플레이스홀더(data URI)와 원본 크기 생성. 실패 시 None"""
+    try:
+        from PIL import Image
+
+        img = Image.open(io.BytesIO(image_data))
+        width, height = img.size
+        # JPEG는 디코딩 단계에서 축소 (전체 해상도 디코딩 생략)
+        img.draft("RGB", (PLACEHOLDER_SIZE * 4, PLACEHOLDER_SIZE * 4))
+        img = img.convert("RGB")
+        img.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE), Image.Resampling.BILINEAR)
+
+        output = io.BytesIO()
+        img.save(output, format="JPEG", quality=PLACEHOLDER_QUALITY, optimize=True)
+    except Exception as e:
+        print(f"[Image Proxy] 플레이스홀더 생성 실패: {e}")
+        return None
+
+    encoded = base64.b64encode(output.getvalue()).decode("ascii")
+    return {
+        "width": width,
+        "height": height,
+        "placeholder": f"data:image/jpeg;base64,{encoded}",
+        "placeholder_width": img.width,
+        "placeholder_height": img.height,
+    }
+
+
+# 백그라운드 플레이스홀더 생성 태스크 (플레이스홀더 키 -> 태스크, GC 방지 겸 중복 제거)
+_placeholder_tasks: Dict[str, asyncio.Task] = {}
+# 실행 중인 이벤트 루프에서 처음 사용할 때 생성
+_placeholder_semaphore: Optional[asyncio.Semaphore] = None
+
+
+async def _generate_placeholder(url: str, original: bytes) -> None:
+    global _placeholder_semaphore
+    if _placeholder_semaphore is None:
+        _placeholder_semaphore = asyncio.Semaphore(MAX_PLACEHOLDER_WORKERS)
+    async with _placeholder_semaphore:
+        await asyncio.to_thread(ensure_placeholder, url, original)
+
+
+def _schedule_placeholder(url: str, original: bytes) -> None:
+    """
+    플레이스홀더 생성/저장을 응답 경로 밖에서 실행.
+    이미 있거나 같은 원본을 생성 중이면 건너뛰고, 대기 중인 작업이 많으면 버린다.
+    """
+    key = _placeholder_key(url)
+    if key in _placeholder_tasks or len(_placeholder_tasks) >= MAX_PLACEHOLDER_PENDING:
+        return
+    if disk_cache.has_placeholder(key):
+        return
+    task = asyncio.create_task(_generate_placeholder(url, original))
+    _placeholder_tasks[key] = task
+    task.add_done_callback(lambda _: _placeholder_tasks.pop(key, None))
+
+
+def ensure_placeholder(url: str, original: bytes) -> None:
+    """원본을 처음 받았을 때 한 번만 플레이스홀더를 만들어 디스크 캐시 옆에 저장"""
+    key = _placeholder_key(url)
+    if disk_cache.has_placeholder(key):
+        return
+    placeholder = make_placeholder(original)
+    if placeholder is not None:
+        disk_cache.set_placeholder(key, placeholder)
+
+
+async def get_placeholder(url: str) -> dict:
+    """
+    플레이스홀더 조회 (아직 프록시된 적 없는 원본이면 404)
+
+    Raises:
+        HTTPException, httpx.TimeoutException, httpx.HTTPStatusError (토큰 확인 실패)
+    """
+    validate_image_url(url)
+    placeholder = await asyncio.to_thread(
+        disk_cache.get_placeholder, _placeholder_key(url)
+    )
+    if placeholder is None:
+        raise HTTPException(
+            status_code=404, detail="플레이스홀더가 아직 생성되지 않았습니다"
+        )
+    await ensure_token_validated(url)
+    return {"url": url, **placeholder}
+
+
+def _read_placeholders(urls: List[str]) -> Dict[str, dict]:
+    found = {}
+    for url in urls:
+        if url.startswith(FIREBASE_STORAGE_PREFIX):
+            placeholder = disk_cache.get_placeholder(_placeholder_key(url))
+            if placeholder is not None:
+                found[url] = placeholder
+    return found
+
+
+async def get_placeholders(urls: List[str]) -> dict:
+    """
+    여러 URL의 플레이스홀더 일괄 조회
+    (없거나 토큰 확인에 실패한 항목은 missing에 포함)
+    """
+    if len(urls) > MAX_PLACEHOLDER_BATCH:
+        raise HTTPException(
+            status_code=400,
+            detail=f"한 번에 최대 {MAX_PLACEHOLDER_BATCH}개 URL까지 요청할 수 있습니다",
+        )
+
+    urls = list(dict.fromkeys(urls))
+    found = await asyncio.to_thread(_read_placeholders, urls)
+    semaphore = asyncio.Semaphore(settings.IMAGE_PREFETCH_CONCURRENCY)
+    allowed = await asyncio.gather(
+        *(_token_allowed(url, semaphore) for url in found)
+    )
+    items = {url: found[url] for url, ok in zip(found, allowed) if ok}
+    missing = [url for url in urls if url not in items]
+    return {"placeholders": items, "missing": missing}
+
+
+async def fetch_variant(
+    url: str,
+    maxWidth: Optional[int] = None,
+    maxHeight: Optional[int] = None,
+    quality: Optional[int] = None,
+    cache_key: Optional[str] = None,
+) -> CachedImage:
+    """업스트림에서 원본을 받아 변환 후 캐시에 저장"""
+    original, content_type = await download_original(url)
+    _schedule_placeholder(url, original)
+    image_data = transform_image(original, maxWidth, maxHeight, quality)
+    media_type = _media_type_for(image_data, content_type)
+
+    etag = store_cached(
+        cache_key or make_cache_key(url, maxWidth, maxHeight, quality),
+        image_data,
+        media_type,
+    )
+    return CachedImage(
+        image_data, media_type, len(image_data), etag, time.time(), "MISS"
+    )
+
+
+# ==================== 손상 영역 크롭 ====================
+
+MAX_CROP_BBOXES = 20
+
+
+def make_crop_key(
+    url: str,
+    bbox: Tuple[int, int, int, int],
+    maxWidth: Optional[int] = None,
+    pad: int = 0,
+    quality: Optional[int] = None,
+) -> str:
+    """크롭 변형 캐시 키 (원본 URL + 영역 + 변환 파라미터)"""
+    region = ",".join(str(v) for v in bbox)
+    return _get_cache_key(
+        f"{canonical_image_url(url)}#crop={region};pad={pad}:{maxWidth}:None:{quality}"
+    )
+
+
+async def load_original(url: str) -> bytes:
+    """
+    변환 없는 원본을 캐시에서 가져오고, 없으면 다운로드해 원본 항목으로 저장
+
+    Raises:
+        HTTPException: 최근 실패한 원본 (네거티브 캐시)
+        httpx.TimeoutException, httpx.HTTPStatusError
+    """
+    cache_key = make_cache_key(url)
+    cached = lookup_cached(cache_key)
+    if cached is not None and cached.data is not None:
+        await ensure_token_validated(url)
+        return cached.data
+
+    negative = lookup_negative(url)
+    if negative is not None:
+        raise negative_exception(negative)
+
+    original, content_type = await download_original(url)
+    _schedule_placeholder(url, original)
+    store_cached(cache_key, original, content_type)
+    return original
+
+
+def crop_image(
+    image_data: bytes,
+    bboxes: List[Tuple[int, int, int, int]],
+    maxWidth: Optional[int] = None,
+    pad: int = 0,
+    quality: Optional[int] = None,
+) -> List[bytes]:
+    """원본을 한 번만 디코딩해 여러 영역을 잘라 WebP(투명 이미지는 PNG)로 인코딩"""
+    from PIL import Image
+
+    started = time.perf_counter()
+    try:
+        img = Image.open(io.BytesIO(image_data))
+        img.load()
+        width, height = img.size
+        quality_value = quality if quality and 1 <= quality <= 100 else 85
+        has_alpha = img.mode in ("RGBA", "LA", "PA") or "transparency" in img.info
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if has_alpha else "RGB")
+
+        crops = []
+        for x1, y1, x2, y2 in bboxes:
+            box = (
+                max(0, x1 - pad),
+                max(0, y1 - pad),
+                min(width, x2 + pad),
+                min(height, y2 + pad),
+            )
+            if box[0] >= box[2] or box[1] >= box[3]:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"bbox가 이미지 범위({width}x{height})를 벗어났습니다: "
+                    f"{x1},{y1},{x2},{y2}",
+                )
+            region = img.crop(box)
+            if maxWidth and region.width > maxWidth:
+                new_height = max(1, int(region.height * maxWidth / region.width))
+                region = region.resize((maxWidth, new_height), Image.Resampling.LANCZOS)
+
+            output = io.BytesIO()
+            if has_alpha:
+                region.save(output, format="PNG", optimize=True)
+            else:
+                region.save(output, format="WEBP", quality=quality_value, method=4)
+            crops.append(output.getvalue())
+        return crops
+    finally:
+        metrics.observe_transform(time.perf_counter() - started)
+
+
+async def fetch_crops(
+    url: str,
+    bboxes: List[Tuple[int, int, int, int]],
+    maxWidth: Optional[int] = None,
+    pad: int = 0,
+    quality: Optional[int] = None,
+) -> List[CachedImage]:
+    """
+    bbox별 크롭 조회. 캐시에 없는 영역만 캐시된 원본에서 잘라 저장
+
+    Raises:
+        HTTPException, httpx.TimeoutException, httpx.HTTPStatusError
+    """
+    if len(bboxes) > MAX_CROP_BBOXES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"한 번에 최대 {MAX_CROP_BBOXES}개 영역까지 요청할 수 있습니다",
+        )
+
+    keys = [make_crop_key(url, bbox, maxWidth, pad, quality) for bbox in bboxes]
+    results: List[Optional[CachedImage]] = []
+    for cache_key in keys:
+        record_access(cache_key)
+        results.append(lookup_cached(cache_key))
+
+    missing = [i for i, entry in enumerate(results) if entry is None]
+    if len(missing) < len(results):
+        await ensure_token_validated(url)
+    if missing:
+        original = await load_original(url)
+        crops = await asyncio.to_thread(
+            crop_image, original, [bboxes[i] for i in missing], maxWidth, pad, quality
+        )
+        for i, image_data in zip(missing, crops):
+            media_type = "image/png" if image_data[:4] == b"\x89PNG" else "image/webp"
+            etag = store_cached(keys[i], image_data, media_type)
+            results[i] = CachedImage(
+                image_data, media_type, len(image_data), etag, time.time(), "MISS"
+            )
+    return results
+
+
+# ==================== 썸네일 시트 (스프라이트) ====================
+
+MAX_SHEET_URLS = 100
+MIN_SHEET_TILE = 16
+MAX_SHEET_TILE = 512
+SHEET_BACKGROUND = (240, 240, 240)
+
+
+def make_sheet_key(
+    urls: List[str], tile: int, columns: int, quality: Optional[int] = None
+) -> str:
+    """
+    시트 캐시 키 (URL 순서 + 토큰 + 타일 크기 + 열 수 + 품질)
+
+    GET /image/sheet/{sheet_id}는 토큰을 다시 확인하지 않으므로 sheet_id가 접근 권한 역할을
+    한다. 토큰을 키에 넣어 객체 경로만 아는 쪽은 캐시된 시트의 sheet_id를 계산할 수 없게 한다.
+    """
+    canonical = "\n".join(
+        f"{canonical_image_url(url)}#{image_url_token(url) or ''}" for url in urls
+    )
+    return _get_cache_key(f"{canonical}:sheet:{tile}:{columns}:{quality}")
+
+
+def sheet_layout(urls: List[str], tile: int, columns: int) -> List[dict]:
+    """타일 좌표 (모든 칸은 tile x tile 정사각형이므로 URL 순서만으로 결정)"""
+    return [
+        {
+            "url": url,
+            "x": (index % columns) * tile,
+            "y": (index // columns) * tile,
+            "w": tile,
+            "h": tile,
+        }
+        for index, url in enumerate(urls)
+    ]
+
+
+async def _load_sheet_tile(
+    url: str, tile: int, semaphore: asyncio.Semaphore
+) -> Optional[bytes]:
+    """
+    시트 타일 원본 이미지 (캐시된 2배 크기 썸네일 변형, 없으면 받아서 저장).
+    2배 크기면 3:2, 16:9 비율도 짧은 변이 타일보다 커서 확대 없이 채울 수 있다.
+    실패하면 None
+    """
+    try:
+        validate_image_url(url)
+    except HTTPException:
+        return None
+
+    cache_key = make_cache_key(url, tile * 2, tile * 2)
+    record_access(cache_key)
+    cached = lookup_cached(cache_key)
+    if cached is not None:
+        return cached.data if await _token_allowed(url, semaphore) else None
+    if lookup_negative(url) is not None:
+        return None
+
+    async with semaphore:
+        try:
+            entry = await fetch_variant(url, tile * 2, tile * 2, cache_key=cache_key)
+        except Exception as e:
+            print(f"[Image Sheet] 타일 로드 실패: {_describe_error(e)}")
+            return None
+    return entry.data
+
+
+def compose_sheet(
+    tiles: List[Optional[bytes]], tile: int, columns: int, quality: Optional[int]
+) -> bytes:
+    """타일을 격자로 배치해 WebP 스프라이트 생성 (각 칸은 가운데 기준 cover 크롭)"""
+    from PIL import Image, ImageOps
+
+    started = time.perf_counter()
+    try:
+        rows = max(1, -(-len(tiles) // columns))
+        sheet = Image.new("RGB", (columns * tile, rows * tile), SHEET_BACKGROUND)
+        for index, image_data in enumerate(tiles):
+            if image_data is None:
+                continue
+            try:
+                img = Image.open(io.BytesIO(image_data))
+                img.draft("RGB", (tile, tile))
+                cell = ImageOps.fit(
+                    img.convert("RGB"), (tile, tile), Image.Resampling.LANCZOS
+                )
+            except Exception as e:
+                print(f"[Image Sheet] 타일 변환 실패: {e}")
+                continue
+            sheet.paste(cell, ((index % columns) * tile, (index // columns) * tile))
+
+        output = io.BytesIO()
+        quality_value = quality if quality and 1 <= quality <= 100 else 80
+        sheet.save(output, format="WEBP", quality=quality_value, method=4)
+        return output.getvalue()
+    finally:
+        metrics.observe_transform(time.perf_counter() - started)
+
+
+async def build_sheet(
+    urls: List[str],
+    tile: int,
+    columns: Optional[int] = None,
+    quality: Optional[int] = None,
+) -> Tuple[str, CachedImage, dict]:
+    """
+    썸네일 시트 생성 또는 캐시 조회
+
+    Returns:
+        (sheet_id, 스프라이트, 타일 맵). 로드하지 못한 타일이 있으면 시트를 캐시하지 않음
+    """
+    if not urls:
+        raise HTTPException(status_code=400, detail="URL 목록이 비어있습니다")
+    if len(urls) > MAX_SHEET_URLS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"한 번에 최대 {MAX_SHEET_URLS}개 URL까지 요청할 수 있습니다",
+        )
+    if not MIN_SHEET_TILE <= tile <= MAX_SHEET_TILE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"tile은 {MIN_SHEET_TILE}~{MAX_SHEET_TILE} 사이여야 합니다",
+        )
+    columns = min(columns or math.ceil(math.sqrt(len(urls))), len(urls))
+    if columns < 1:
+        raise HTTPException(status_code=400, detail="columns는 1 이상이어야 합니다")
+
+    sheet_id = make_sheet_key(urls, tile, columns, quality)
+    rows = -(-len(urls) // columns)
+    sheet_map = {
+        "sheet_id": sheet_id,
+        "width": columns * tile,
+        "height": rows * tile,
+        "tile": tile,
+        "columns": columns,
+        "tiles": sheet_layout(urls, tile, columns),
+        "missing": [],
+    }
+
+    record_access(sheet_id)
+    cached = lookup_cached(sheet_id)
+    semaphore = asyncio.Semaphore(settings.IMAGE_PREFETCH_CONCURRENCY)
+    if cached is not None and all(
+        await asyncio.gather(*(_token_allowed(url, semaphore) for url in urls))
+    ):
+        return sheet_id, cached, sheet_map
+
+    tiles = await asyncio.gather(
+        *(_load_sheet_tile(url, tile, semaphore) for url in urls)
+    )
+    sheet_data = await asyncio.to_thread(compose_sheet, tiles, tile, columns, quality)
+
+    sheet_map["missing"] = [url for url, data in zip(urls, tiles) if data is None]
+    if sheet_map["missing"]:
+        etag = hashlib.md5(sheet_data).hexdigest()
+    else:
+        etag = store_cached(sheet_id, sheet_data, "image/webp")
+    entry = CachedImage(
+        sheet_data, "image/webp", len(sheet_data), etag, time.time(), "MISS"
+    )
+    return sheet_id, entry, sheet_map
+
+
+# ==================== 프리페치 (캐시 워밍) ====================
+
+# job_id -> 진행 상태
+_prefetch_jobs: Dict[str, dict] = {}
+# 실행 중인 태스크 참조 유지 (GC 방지)
+_prefetch_tasks: set = set()
+_MAX_PREFETCH_JOBS = 50
+
+
+def _describe_error(e: Exception) -> str:
+    if isinstance(e, httpx.TimeoutException):
+        return "이미지 로드 시간 초과"
+    if isinstance(e, httpx.HTTPStatusError):
+        return f"이미지 로드 실패: {e.response.status_code}"
+    if isinstance(e, HTTPException):
+        return str(e.detail)
+    return str(e)
+
+
+def _record_failures(job: dict, url: str, variants: List[dict], error: str) -> None:
+    for variant in variants:
+        job["failed"] += 1
+        job["failures"].append({"url": url, "variant": variant, "error": error})
+
+
+def _trim_prefetch_jobs() -> None:
+    """완료된 오래된 작업부터 제거"""
+    finished = [
+        job for job in _prefetch_jobs.values() if job["status"] != "running"
+    ]
+    finished.sort(key=lambda job: job["created_at"])
+    while len(_prefetch_jobs) > _MAX_PREFETCH_JOBS and finished:
+        _prefetch_jobs.pop(finished.pop(0)["job_id"], None)
+
+
+async def _prefetch_url(
+    job: dict, url: str, variants: List[dict], semaphore: asyncio.Semaphore
+) -> None:
+    """URL 하나에 대해 원본을 한 번만 받아 모든 변형을 캐시에 채움"""
+    try:
+        validate_image_url(url)
+    except HTTPException as e:
+        _record_failures(job, url, variants, _describe_error(e))
+        return
+
+    pending = []
+    for variant in variants:
+        cache_key = make_cache_key(url, **variant)
+        if lookup_cached(cache_key, load_data=False):
+            job["cached"] += 1
+            job["completed"] += 1
+        else:
+            pending.append((variant, cache_key))
+
+    if not pending:
+        return
+
+    negative = lookup_negative(url)
+    if negative is not None:
+        _record_failures(
+            job, url, [variant for variant, _ in pending], negative.detail
+        )
+        return
+
+    async with semaphore:
+        try:
+            original, content_type = await download_original(url)
+        except Exception as e:
+            _record_failures(
+                job, url, [variant for variant, _ in pending], _describe_error(e)
+            )
+            return
+
+        await asyncio.to_thread(ensure_placeholder, url, original)
+        for variant, cache_key in pending:
+            try:
+                image_data = await asyncio.to_thread(
+                    transform_image, original, **variant
+                )
+                store_cached(
+                    cache_key, image_data, _media_type_for(image_data, content_type)
+                )
+                job["fetched"] += 1
+                job["completed"] += 1
+            except Exception as e:
+                _record_failures(job, url, [variant], _describe_error(e))
+
+
+async def _run_prefetch(job: dict, urls: List[str], variants: List[dict]) -> None:
+    semaphore = asyncio.Semaphore(settings.IMAGE_PREFETCH_CONCURRENCY)
+    try:
+        await asyncio.gather(
+            *(_prefetch_url(job, url, variants, semaphore) for url in urls)
+        )
+    finally:
+        job["status"] = "completed"
+        job["finished_at"] = time.time()
+        print(
+            f"[Image Prefetch] {job['job_id']} 완료: "
+            f"{job['completed']}/{job['total']} (실패 {job['failed']})"
+        )
+
+
+def start_prefetch(urls: List[str], variants: List[dict]) -> dict:
+    """백그라운드 프리페치 작업 시작"""
+    urls = list(dict.fromkeys(urls))  # 순서 유지 중복 제거
+    if not urls:
+        raise HTTPException(status_code=400, detail="URL 목록이 비어있습니다")
+    if len(urls) > settings.IMAGE_PREFETCH_MAX_URLS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"한 번에 최대 {settings.IMAGE_PREFETCH_MAX_URLS}개 URL까지 요청할 수 있습니다",
+        )
+    variants = variants or [{}]
+
+    job_id = uuid.uuid4().hex
+    job = {
+        "job_id": job_id,
+        "status": "running",
+        "total": len(urls) * len(variants),
+        "completed": 0,
+        "cached": 0,
+        "fetched": 0,
+        "failed": 0,
+        "failures": [],
+        "created_at": time.time(),
+        "finished_at": None,
+    }
+    _prefetch_jobs[job_id] = job
+    _trim_prefetch_jobs()
+
+    task = asyncio.create_task(_run_prefetch(job, urls, variants))
+    _prefetch_tasks.add(task)
+    task.add_done_callback(_prefetch_tasks.discard)
+    return job
+
+
+def get_prefetch_job(job_id: str) -> dict:
+    """프리페치 작업 상태 조회"""
+    job = _prefetch_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="프리페치 작업을 찾을 수 없습니다")
+    return job
+
+
+# ==================== 시작 워밍업 / 백그라운드 작업 ====================
+
+# 백그라운드 태스크 참조 (lifespan 종료 시 취소)
+_background_tasks: List[asyncio.Task] = []
+ACCESS_LOG_FLUSH_INTERVAL = 60  # 초
+
+
+def _load_warm_entry(cache_key: str) -> Optional[tuple]:
+    """
+    디스크 항목 하나를 공유 캐시로 올리고 메모리(L1) 항목을 반환 (스레드에서 실행).
+    메모리 캐시 반영은 이벤트 루프에서 호출자가 한다.
+    """
+    shared = shared_cache.get(cache_key)
+    if shared is not None:
+        return shared
+
+    metadata = disk_cache.get_meta(cache_key)
+    disk_cached = disk_cache.get(cache_key) if metadata else None
+    if disk_cached is None:
+        return None
+    data, media_type = disk_cached
+    shared_cache.set(cache_key, data, media_type, metadata["etag"])
+    return (data, metadata["timestamp"], media_type, metadata["etag"])
+
+
+async def warm_memory_cache() -> None:
+    """
+    디스크 캐시에서 접근 빈도가 높은 항목을 메모리로 미리 올림.
+    lifespan에서 태스크로 실행되어 서버 준비를 지연시키지 않는다.
+    """
+    started = time.perf_counter()
+    max_bytes = settings.IMAGE_WARMUP_MAX_MB * 1024 * 1024
+    keys = await asyncio.to_thread(
+        disk_cache.hottest, settings.IMAGE_WARMUP_ITEMS, max_bytes
+    )
+
+    loaded = 0
+    loaded_bytes = 0
+    for cache_key in keys:
+        if cache_key in _image_cache:
+            continue
+        entry = await asyncio.to_thread(_load_warm_entry, cache_key)
+        if entry is None:
+            continue
+        if len(_image_cache) < _cache_max_size:
+            _image_cache[cache_key] = entry
+        loaded += 1
+        loaded_bytes += len(entry[0])
+
+    print(
+        f"[Image Cache] 워밍업 완료: {loaded}개 "
+        f"({loaded_bytes / (1024 * 1024):.1f}MB, {time.perf_counter() - started:.2f}s)"
+    )
+
+
+async def _flush_access_log_periodically() -> None:
+    while True:
+        await asyncio.sleep(ACCESS_LOG_FLUSH_INTERVAL)
+        try:
+            await asyncio.to_thread(disk_cache.flush_access_log)
+        except Exception as e:
+            print(f"[Image Cache] 접근 빈도 기록 실패: {e}")
+
+
+async def _run_disk_janitor() -> None:
+    """디스크 캐시 TTL/용량 정리 (요청 경로 밖에서 주기적으로)"""
+    interval = settings.IMAGE_DISK_JANITOR_INTERVAL
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            # 다른 워커가 방금 정리했으면 건너뜀
+            await asyncio.to_thread(disk_cache.cleanup, interval * 0.9)
+        except Exception as e:
+            print(f"[Image Cache] 디스크 캐시 정리 실패: {e}")
+
+
+async def start_background_tasks() -> None:
+    """lifespan startup: 디스크 쓰기, 정리, 워밍업 및 접근 빈도 기록 태스크 시작"""
+    global _disk_write_queue
+    _disk_write_queue = asyncio.Queue(maxsize=max(1, settings.IMAGE_DISK_WRITE_QUEUE))
+    _background_tasks.append(asyncio.create_task(_disk_write_worker()))
+    _background_tasks.append(asyncio.create_task(_run_disk_janitor()))
+    if settings.IMAGE_WARMUP_ITEMS > 0:
+        _background_tasks.append(asyncio.create_task(warm_memory_cache()))
+    _background_tasks.append(asyncio.create_task(_flush_access_log_periodically()))
+
+
+async def stop_background_tasks() -> None:
+    """lifespan shutdown: 태스크 취소 후 남은 디스크 쓰기 및 접근 빈도 기록"""
+    global _disk_write_queue
+    for task in _background_tasks:
+        task.cancel()
+    await asyncio.gather(*_background_tasks, return_exceptions=True)
+    _background_tasks.clear()
+    await _drain_disk_writes()
+    _disk_write_queue = None
+    await asyncio.to_thread(disk_cache.flush_access_log)
@@ -0,0 +1,405 @@
+"""
+워커 간 공유 이미지 캐시 (mmap 슬랩)
+
+uvicorn --workers N 환경에서 프로세스마다 메모리 캐시를 따로 두면
+히트율은 1/N로 떨어지고 메모리는 N배가 된다. 같은 호스트의 모든 워커가
+하나의 메모리 매핑 파일을 공유하도록 한다.
+
+구조:
+    [파일 헤더] [크기 클래스 0 슬롯들] [크기 클래스 1 슬롯들] ...
+
+- 크기 클래스별 고정 크기 슬롯, 4-way set-associative 배치
+  (키 해시로 세트를 고르고, 세트 안에서 빈 슬롯 → 만료 슬롯 → 가장 오래된 슬롯 순으로 교체)
+- 읽기는 락 없이 seqlock으로 검증 (쓰는 중이거나 읽는 동안 바뀌면 미스 처리)
+- 쓰기는 세트 단위 fcntl 레코드 락으로 프로세스 간 직렬화
+
+파일 이름에 레이아웃 버전과 전체 크기를 넣는다 (heritage_image_cache.hsic0001-<크기>.slab).
+다른 워커가 매핑 중일 수 있는 파일은 줄이거나 다시 만들지 않으며 (SIGBUS),
+설정이 바뀌면 새 이름의 파일을 쓰고 TTL 동안 쓰이지 않은 이전 파일은 지운다.
+"""
+
+from __future__ import annotations
+
+import mmap
+import os
+import struct
+import time
+from pathlib import Path
+from threading import Lock
+from typing import List, Optional, Tuple
+
+from common.config import settings
+from .cache_manager import DEFAULT_TTL
+from .metrics import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows 등 fcntl이 없는 환경에서는 비활성화
+    fcntl = None
+
+MAGIC = b"HSIC0001"
+# magic, total_size, class 수
+FILE_HEADER = struct.Struct("<8sQI")
+FILE_HEADER_SIZE = 64
+
+# seq, key(md5 digest), length, timestamp, media_type, etag
+SLOT_HEADER = struct.Struct("<I16sId32s32s")
+SLOT_HEADER_SIZE = 128
+SEQ = struct.Struct("<I")
+SEQ_MASK = 0xFFFFFFFF
+
+WAYS = 4
+
+# (슬롯 데이터 크기, 전체 예산 중 비율)
+SIZE_CLASSES = [
+    (64 * 1024, 0.40),
+    (256 * 1024, 0.30),
+    (1024 * 1024, 0.20),
+    (4 * 1024 * 1024, 0.10),
+]
+
+
+def _default_path() -> Path:
+    if settings.IMAGE_SHARED_CACHE_PATH:
+        return Path(settings.IMAGE_SHARED_CACHE_PATH)
+    shm = Path("/dev/shm")
+    if shm.is_dir():
+        return shm / "heritage_image_cache.slab"
+    return Path(__file__).resolve().parent / ".shm" / "image_cache.slab"
+
+
+def _versioned_path(base: Path, total_size: int) -> Path:
+    """레이아웃 버전과 크기를 넣은 슬랩 경로 (설정이 다른 워커끼리 같은 파일을 쓰지 않음)"""
+    version = MAGIC.decode("ascii").lower()
+    return base.with_name(f"{base.stem}.{version}-{total_size}{base.suffix}")
+
+
+def _allocate(fd: int, total_size: int) -> None:
+    """
+    슬랩 전체의 페이지를 미리 확보한다.
+
+    sparse 파일은 /dev/shm이 가득 차면 매핑된 페이지에 처음 쓸 때 SIGBUS가 나므로
+    (Docker 기본 shm_size는 64MB) 여유 공간을 확인하고 posix_fallocate로 미리 할당해
+    실패하면 예외로 공유 캐시를 끈다. posix_fallocate가 없는 macOS는 늘리기만 한다.
+    """
+    stat = os.fstat(fd)
+    missing = total_size - stat.st_blocks * 512
+    if missing <= 0:
+        return
+    fs = os.fstatvfs(fd)
+    available = fs.f_bavail * fs.f_frsize
+    if available < missing:
+        raise RuntimeError(
+            f"공유 캐시 공간 부족 (필요 {missing / (1024 * 1024):.0f}MB, "
+            f"여유 {available / (1024 * 1024):.0f}MB)"
+        )
+    if hasattr(os, "posix_fallocate"):
+        os.posix_fallocate(fd, 0, total_size)  # 기존 내용 유지, 빈 구간만 할당
+    elif stat.st_size < total_size:
+        os.ftruncate(fd, total_size)
+
+
+class _SizeClass:
+    def __init__(self, slot_data_size: int, num_sets: int, base_offset: int) -> None:
+        self.slot_data_size = slot_data_size
+        self.slot_size = SLOT_HEADER_SIZE + slot_data_size
+        self.num_sets = num_sets
+        self.base_offset = base_offset
+
+    @property
+    def total_size(self) -> int:
+        return self.slot_size * WAYS * self.num_sets
+
+    def set_offset(self, set_index: int) -> int:
+        return self.base_offset + set_index * self.slot_size * WAYS
+
+    def slot_offsets(self, set_index: int) -> List[int]:
+        start = self.set_offset(set_index)
+        return [start + way * self.slot_size for way in range(WAYS)]
+
+
+class SharedImageCache:
+    """mmap 기반 워커 간 공유 캐시."""
+
+    def __init__(self, path: Optional[Path] = None, budget_bytes: Optional[int] = None):
+        self.base_path = Path(path or _default_path())
+        self.budget_bytes = budget_bytes or settings.IMAGE_SHARED_CACHE_MB * 1024 * 1024
+        self.path = _versioned_path(self.base_path, self._layout()[1])
+        self.enabled = settings.IMAGE_SHARED_CACHE and fcntl is not None
+        self.ttl = DEFAULT_TTL
+        self._mm: Optional[mmap.mmap] = None
+        self._fd: Optional[int] = None
+        self._classes: List[_SizeClass] = []
+        self._lock = Lock()
+        self._open_failed = False
+        self._touched_at = 0.0
+
+    # ---------- 초기화 ----------
+
+    def _layout(self) -> Tuple[List[_SizeClass], int]:
+        classes = []
+        offset = FILE_HEADER_SIZE
+        for slot_data_size, share in SIZE_CLASSES:
+            slot_size = SLOT_HEADER_SIZE + slot_data_size
+            num_sets = max(1, int(self.budget_bytes * share) // (slot_size * WAYS))
+            size_class = _SizeClass(slot_data_size, num_sets, offset)
+            classes.append(size_class)
+            offset += size_class.total_size
+        return classes, offset
+
+    def _ensure_open(self) -> bool:
+        if self._mm is not None:
+            return True
+        if not self.enabled or self._open_failed:
+            return False
+
+        with self._lock:
+            if self._mm is not None:
+                return True
+            try:
+                classes, total_size = self._layout()
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                fd = os.open(str(self.path), os.O_RDWR | os.O_CREAT, 0o600)
+                try:
+                    self._init_file(fd, total_size, len(classes))
+                except BaseException:
+                    os.close(fd)
+                    raise
+                # 사용 중인 슬랩은 mtime을 갱신 (TTL 동안 쓰이지 않은 슬랩만 정리 대상)
+                os.utime(fd)
+                self._touched_at = time.time()
+
+                self._mm = mmap.mmap(fd, total_size, mmap.MAP_SHARED)
+                self._fd = fd
+                self._classes = classes
+                print(
+                    f"[Image Cache] 공유 캐시 사용: {self.path} "
+                    f"({total_size / (1024 * 1024):.0f}MB)"
+                )
+                self._remove_stale_files()
+                return True
+            except Exception as e:
+                print(f"[Image Cache] ⚠️  공유 캐시 비활성화: {e}")
+                self._open_failed = True
+                return False
+
+    @staticmethod
+    def _init_file(fd: int, total_size: int, num_classes: int) -> None:
+        """
+        새 파일이면 크기를 늘리고 헤더를 쓴다 (파일 전체 락으로 한 워커만 수행).
+
+        이미 매핑된 파일을 줄이면 다른 워커가 SIGBUS로 죽으므로 파일은 늘리기만 하고,
+        헤더가 다르면 덮어쓰지 않고 예외로 공유 캐시를 끈다.
+        """
+        fcntl.lockf(fd, fcntl.LOCK_EX)
+        try:
+            header = os.pread(fd, FILE_HEADER.size, 0).ljust(FILE_HEADER.size, b"\0")
+            is_new = header == bytes(FILE_HEADER.size)
+            if not is_new:
+                magic, size, classes = FILE_HEADER.unpack(header)
+                if (magic, size, classes) != (MAGIC, total_size, num_classes):
+                    raise RuntimeError(
+                        f"슬랩 헤더 불일치 ({magic!r}, {size}, {classes})"
+                    )
+            _allocate(fd, total_size)
+            if is_new:
+                os.pwrite(fd, FILE_HEADER.pack(MAGIC, total_size, num_classes), 0)
+        finally:
+            fcntl.lockf(fd, fcntl.LOCK_UN)
+
+    def _remove_stale_files(self) -> None:
+        """
+        TTL 동안 쓰이지 않은 이전 버전/크기의 슬랩 삭제.
+        아직 매핑 중인 워커가 있어도 unlink는 매핑을 유지하므로 안전하다.
+        """
+        pattern = f"{self.base_path.stem}.*{self.base_path.suffix}"
+        candidates = [self.base_path, *self.path.parent.glob(pattern)]
+        cutoff = time.time() - self.ttl
+        for candidate in candidates:
+            if candidate == self.path:
+                continue
+            try:
+                if candidate.stat().st_mtime < cutoff:
+                    candidate.unlink()
+                    print(f"[Image Cache] 이전 공유 캐시 파일 삭제: {candidate}")
+            except OSError:
+                continue
+
+    def close(self) -> None:
+        with self._lock:
+            if self._mm is not None:
+                self._mm.close()
+                self._mm = None
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+    # ---------- 내부 유틸 ----------
+
+    @staticmethod
+    def _digest(key: str) -> bytes:
+        return bytes.fromhex(key)
+
+    def _set_index(self, size_class: _SizeClass, digest: bytes) -> int:
+        return int.from_bytes(digest[:8], "little") % size_class.num_sets
+
+    def _class_for(self, size: int) -> Optional[_SizeClass]:
+        for size_class in self._classes:
+            if size <= size_class.slot_data_size:
+                return size_class
+        return None
+
+    def _lock_set(self, size_class: _SizeClass, set_index: int, op: int) -> None:
+        fcntl.lockf(
+            self._fd,
+            op,
+            size_class.slot_size * WAYS,
+            size_class.set_offset(set_index),
+        )
+
+    def _read_slot(
+        self, offset: int, digest: Optional[bytes]
+    ) -> Optional[Tuple[bytes, float, str, str]]:
+        """seqlock 읽기. 키가 다르거나 쓰는 중이면 None"""
+        mm = self._mm
+        seq_before, slot_key, length, timestamp, media_type, etag = (
+            SLOT_HEADER.unpack_from(mm, offset)
+        )
+        if seq_before & 1 or length == 0:
+            return None
+        if digest is not None and slot_key != digest:
+            return None
+
+        data_start = offset + SLOT_HEADER_SIZE
+        data = mm[data_start : data_start + length]
+        (seq_after,) = SEQ.unpack_from(mm, offset)
+        if seq_after != seq_before:
+            return None
+        return (
+            data,
+            timestamp,
+            media_type.rstrip(b"\0").decode("ascii", "replace"),
+            etag.rstrip(b"\0").decode("ascii", "replace"),
+        )
+
+    # ---------- 공개 API ----------
+
+    def available(self) -> bool:
+        """공유 캐시를 실제로 쓸 수 있는지 (필요하면 이 시점에 슬랩을 연다)"""
+        return self._ensure_open()
+
+    def get(self, key: str) -> Optional[Tuple[bytes, float, str, str]]:
+        """
+        공유 캐시 조회 (락 없음)
+
+        Returns:
+            (data, timestamp, media_type, etag) 또는 None
+        """
+        if not self._ensure_open():
+            return None
+
+        # 크기가 바뀌어 다시 저장된 키는 다른 클래스에 이전 버전이 남을 수 있으므로
+        # 모든 클래스를 확인해 가장 최근 항목을 사용
+        digest = self._digest(key)
+        latest = None
+        for size_class in self._classes:
+            set_index = self._set_index(size_class, digest)
+            for offset in size_class.slot_offsets(set_index):
+                entry = self._read_slot(offset, digest)
+                if entry is not None and (latest is None or entry[1] > latest[1]):
+                    latest = entry
+
+        if latest is None or time.time() - latest[1] > self.ttl:
+            return None
+        return latest
+
+    def set(self, key: str, data: bytes, media_type: str, etag: str) -> None:
+        """공유 캐시에 저장 (가장 큰 슬롯보다 크면 저장하지 않음)"""
+        if not data or not self._ensure_open():
+            return
+        size_class = self._class_for(len(data))
+        if size_class is None:
+            return
+
+        digest = self._digest(key)
+        set_index = self._set_index(size_class, digest)
+        now = time.time()
+        mm = self._mm
+
+        with self._lock:
+            self._lock_set(size_class, set_index, fcntl.LOCK_EX)
+            try:
+                victim = None
+                victim_reason = None
+                oldest = None
+                for offset in size_class.slot_offsets(set_index):
+                    _, slot_key, length, timestamp, _, _ = SLOT_HEADER.unpack_from(
+                        mm, offset
+                    )
+                    if slot_key == digest or length == 0:
+                        victim, victim_reason = offset, None
+                        break
+                    if now - timestamp > self.ttl:
+                        victim, victim_reason = offset, "ttl"
+                        break
+                    if oldest is None or timestamp < oldest[1]:
+                        oldest = (offset, timestamp)
+                if victim is None:
+                    victim, victim_reason = oldest[0], "capacity"
+                if victim_reason:
+                    metrics.record_eviction("shared", victim_reason)
+
+                (seq,) = SEQ.unpack_from(mm, victim)
+                writing = ((seq + 1) | 1) & SEQ_MASK
+                SEQ.pack_into(mm, victim, writing)  # 쓰기 시작 (홀수)
+                data_start = victim + SLOT_HEADER_SIZE
+                mm[data_start : data_start + len(data)] = data
+                SLOT_HEADER.pack_into(
+                    mm,
+                    victim,
+                    writing,
+                    digest,
+                    len(data),
+                    now,
+                    media_type.encode("ascii", "replace")[:32],
+                    etag.encode("ascii", "replace")[:32],
+                )
+                SEQ.pack_into(mm, victim, (writing + 1) & SEQ_MASK)  # 쓰기 완료 (짝수)
+            finally:
+                self._lock_set(size_class, set_index, fcntl.LOCK_UN)
+
+            if now - self._touched_at > self.ttl / 4:
+                os.utime(self._fd)
+                self._touched_at = now
+
+    def usage(self) -> dict:
+        """공유 캐시 상주 항목 수 및 바이트 (통계용)"""
+        if not self._ensure_open():
+            return {"enabled": False}
+
+        items = 0
+        total_size = 0
+        now = time.time()
+        for size_class in self._classes:
+            for set_index in range(size_class.num_sets):
+                for offset in size_class.slot_offsets(set_index):
+                    _, _, length, timestamp, _, _ = SLOT_HEADER.unpack_from(
+                        self._mm, offset
+                    )
+                    if length and now - timestamp <= self.ttl:
+                        items += 1
+                        total_size += length
+        return {
+            "enabled": True,
+            "path": str(self.path),
+            "items": items,
+            "bytes": total_size,
+            "max_bytes": self.budget_bytes,
+            "slots": {
+                str(size_class.slot_data_size): size_class.num_sets * WAYS
+                for size_class in self._classes
+            },
+        }
+
+
+shared_cache = SharedImageCache()
@@ -0,0 +1,137 @@
+"""
+이미지 프록시 유틸리티 함수들
+HTTP Range / If-Range 헤더 해석, 크롭 영역 파라미터 해석, 캐시 키용 URL 정규화
+"""
+
+from __future__ import annotations
+
+import re
+from email.utils import formatdate
+from typing import Optional, Tuple
+from urllib.parse import parse_qsl, unquote, urlencode, urlsplit
+
+FIREBASE_STORAGE_HOST = "firebasestorage.googleapis.com"
+# /v0/b/<bucket>/o/<percent-encoded object path>
+FIREBASE_OBJECT_PATH = re.compile(r"^/v0/b/([^/]+)/o/(.+)$")
+# 같은 객체라도 공유/재발급 시 바뀌는 쿼리 파라미터
+VOLATILE_QUERY_PARAMS = {"token"}
+
+
+class RangeNotSatisfiable(ValueError):
+    """요청 구간이 본문 범위를 벗어남 (416)"""
+
+
+def http_date(timestamp: float) -> str:
+    """Last-Modified 형식 (RFC 7231 IMF-fixdate)"""
+    return formatdate(timestamp, usegmt=True)
+
+
+def parse_range_header(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    단일 바이트 구간 Range 헤더 해석
+
+    Returns:
+        (start, end) 포함 구간. 해석할 수 없거나 다중 구간이면 None (전체 응답)
+
+    Raises:
+        RangeNotSatisfiable: 구간이 본문 크기를 벗어남
+    """
+    if not range_header:
+        return None
+
+    unit, _, spec = range_header.strip().partition("=")
+    if unit.strip().lower() != "bytes" or not spec or "," in spec:
+        return None
+
+    start_str, sep, end_str = spec.strip().partition("-")
+    if not sep:
+        return None
+    start_str, end_str = start_str.strip(), end_str.strip()
+
+    try:
+        start = int(start_str) if start_str else None
+        end = int(end_str) if end_str else None
+    except ValueError:
+        return None
+
+    if start is None:
+        # bytes=-N : 마지막 N바이트
+        if end is None:
+            return None
+        if end <= 0 or size == 0:
+            raise RangeNotSatisfiable(range_header)
+        return max(size - end, 0), size - 1
+
+    if start < 0 or (end is not None and end < start):
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable(range_header)
+    if end is None:
+        end = size - 1
+    return start, min(end, size - 1)
+
+
+def if_range_matches(
+    if_range: Optional[str], etag: str, last_modified: Optional[str]
+) -> bool:
+    """If-Range 조건 확인 (없으면 항상 True)"""
+    if not if_range:
+        return True
+
+    if_range = if_range.strip()
+    if if_range.startswith('"') or if_range.startswith("W/"):
+        # 약한 ETag는 If-Range에 사용할 수 없음
+        return if_range == f'"{etag}"'
+    return last_modified is not None and if_range == last_modified
+
+
+def parse_bbox(value: str) -> Tuple[int, int, int, int]:
+    """
+    "x1,y1,x2,y2" 형식 bbox 해석 (/ai/damage/infer 결과의 실수 좌표 허용)
+
+    Raises:
+        ValueError: 형식이 잘못되었거나 넓이가 0
+    """
+    parts = [part.strip() for part in value.split(",")]
+    if len(parts) != 4:
+        raise ValueError(f"bbox는 x1,y1,x2,y2 형식이어야 합니다: {value}")
+    try:
+        x1, y1, x2, y2 = (int(round(float(part))) for part in parts)
+    except (ValueError, OverflowError):
+        raise ValueError(f"bbox 좌표는 숫자여야 합니다: {value}")
+    if x1 < 0 or y1 < 0 or x2 <= x1 or y2 <= y1:
+        raise ValueError(f"유효하지 않은 bbox입니다: {value}")
+    return x1, y1, x2, y2
+
+
+def canonical_image_url(url: str) -> str:
+    """
+    캐시 키용 URL 정규화
+
+    Firebase Storage 다운로드 URL은 토큰을 제외한 버킷 + 객체 경로로 식별한다
+    (generation, alt 등 나머지 쿼리는 정렬해 유지). 토큰이 바뀌거나 같은 객체가
+    다른 토큰으로 공유돼도 같은 캐시 항목을 사용한다. 다른 형식은 그대로 반환.
+    """
+    parts = urlsplit(url)
+    match = FIREBASE_OBJECT_PATH.match(parts.path)
+    if parts.netloc != FIREBASE_STORAGE_HOST or match is None:
+        return url
+
+    bucket, object_path = match.groups()
+    query = sorted(
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key not in VOLATILE_QUERY_PARAMS
+    )
+    canonical = f"firebase://{unquote(bucket)}/{unquote(object_path)}"
+    if query:
+        canonical += "?" + urlencode(query)
+    return canonical
+
+
+def image_url_token(url: str) -> Optional[str]:
+    """다운로드 URL의 token 쿼리 값 (없으면 None)"""
+    for key, value in parse_qsl(urlsplit(url).query, keep_blank_values=True):
+        if key == "token":
+            return value
+    return None
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+이미지 프록시 토큰 확인 스크립트
+
+캐시 키는 토큰을 뺀 Firebase 객체 식별자이므로, 캐시된 바이트가 업스트림에서
+허용된 적 없는 토큰으로 새어 나가지 않는지 확인합니다.
+    - 프록시: 캐시된 객체라도 처음 보는 토큰이나 토큰 없는 URL은 업스트림이 거절하면
+      같은 상태 코드(403)로 응답
+    - 썸네일 시트: GET /image/sheet/{sheet_id}는 토큰을 다시 확인하지 않으므로,
+      토큰 없이(또는 다른 토큰으로) 계산한 sheet_id로는 캐시된 시트를 받을 수 없음 (404)
+
+업스트림(Firebase Storage)은 httpx.MockTransport로 흉내 내고 디스크 캐시는 임시 디렉토리를
+사용합니다 (모델/네트워크 불필요).
+
+사용법:
+    python image_token_check.py
+"""
+import asyncio
+import io
+import os
+import sys
+import tempfile
+from pathlib import Path
+from urllib.parse import quote
+
+# 현재 디렉토리를 PYTHONPATH에 추가
+sys.path.insert(0, os.path.dirname(__file__))
+
+import httpx  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+from PIL import Image  # noqa: E402
+
+from image import http_client, service  # noqa: E402
+from image.cache_manager import disk_cache  # noqa: E402
+from image.router import router as image_router  # noqa: E402
+
+BUCKET_URL = "https://firebasestorage.googleapis.com/v0/b/heritage-check.appspot.com/o/"
+# 객체 경로 -> 업스트림이 허용하는 토큰
+OBJECTS = {"photos/a.jpg": "token-a", "photos/b.jpg": "token-b"}
+TILE = 32
+
+failures = []
+upstream_requests = []
+
+
+def check(condition, message):
+    print(f"   {'✅' if condition else '❌'} {message}")
+    if not condition:
+        failures.append(message)
+
+
+def object_url(name, token=None):
+    url = f"{BUCKET_URL}{quote(name, safe='')}?alt=media"
+    if token is not None:
+        url += f"&token={token}"
+    return url
+
+
+def _jpeg(color):
+    output = io.BytesIO()
+    Image.new("RGB", (256, 192), color).save(output, format="JPEG")
+    return output.getvalue()
+
+
+IMAGES = {name: _jpeg((index * 90, 120, 200)) for index, name in enumerate(OBJECTS)}
+
+
+def upstream(request):
+    """Firebase Storage 흉내: 객체별 토큰이 맞을 때만 200"""
+    name = request.url.path.split("/o/", 1)[-1]
+    token = request.url.params.get("token")
+    upstream_requests.append((name, token))
+    if name not in OBJECTS:
+        return httpx.Response(404)
+    if token != OBJECTS[name]:
+        return httpx.Response(403)
+    return httpx.Response(
+        200, content=IMAGES[name], headers={"Content-Type": "image/jpeg"}
+    )
+
+
+def use_temp_disk_cache(directory):
+    """저장소의 image/.cache 대신 임시 디렉토리 사용"""
+    disk_cache.cache_dir = Path(directory)
+    disk_cache.meta_dir = disk_cache.cache_dir / "meta"
+    disk_cache.blob_dir = disk_cache.cache_dir / "blobs"
+    disk_cache.placeholder_dir = disk_cache.cache_dir / "placeholders"
+    disk_cache.meta_dir.mkdir(parents=True, exist_ok=True)
+    disk_cache.blob_dir.mkdir(parents=True, exist_ok=True)
+    disk_cache._lock_fd = None
+
+
+async def check_proxy(client):
+    print("\n" + "=" * 60)
+    print("🔍 프록시: 캐시된 객체의 토큰 확인")
+    print("=" * 60)
+    name, token = next(iter(OBJECTS.items()))
+
+    response = await client.get("/image/proxy", params={"url": object_url(name, token)})
+    check(response.status_code == 200, f"올바른 토큰으로 첫 요청 {response.status_code}")
+    response = await client.get("/image/proxy", params={"url": object_url(name, token)})
+    check(
+        response.status_code == 200 and response.headers.get("X-Cache") == "HIT-MEM",
+        f"같은 토큰은 캐시에서 응답 ({response.headers.get('X-Cache')})",
+    )
+
+    for label, url in [
+        ("다른 토큰", object_url(name, "guessed")),
+        ("토큰 없음", object_url(name)),
+    ]:
+        before = len(upstream_requests)
+        response = await client.get("/image/proxy", params={"url": url})
+        check(
+            response.status_code == 403,
+            f"{label}: 캐시된 객체여도 {response.status_code} "
+            f"(업스트림 확인 {len(upstream_requests) - before}회)",
+        )
+
+
+async def check_sheet(client):
+    print("\n" + "=" * 60)
+    print("🔍 썸네일 시트: sheet_id로 캐시된 시트 조회")
+    print("=" * 60)
+    urls = [object_url(name, token) for name, token in OBJECTS.items()]
+    response = await client.post("/image/sheet", json={"urls": urls, "tile": TILE})
+    body = response.json()
+    check(
+        response.status_code == 200 and body.get("missing") == [],
+        f"올바른 토큰으로 시트 생성 {response.status_code} (missing {body.get('missing')})",
+    )
+    sheet_id, columns = body["sheet_id"], body["columns"]
+
+    response = await client.get(f"/image/sheet/{sheet_id}")
+    check(
+        response.status_code == 200
+        and response.headers.get("content-type") == "image/webp",
+        f"응답받은 sheet_id로 스프라이트 조회 {response.status_code}",
+    )
+
+    forged = {
+        "토큰 없이": [object_url(name) for name in OBJECTS],
+        "다른 토큰으로": [object_url(name, "guessed") for name in OBJECTS],
+    }
+    for label, forged_urls in forged.items():
+        forged_id = service.make_sheet_key(forged_urls, TILE, columns, None)
+        response = await client.get(f"/image/sheet/{forged_id}")
+        check(
+            forged_id != sheet_id and response.status_code in (403, 404),
+            f"{label} 계산한 sheet_id는 {response.status_code}",
+        )
+
+    response = await client.post(
+        "/image/sheet", json={"urls": forged["다른 토큰으로"], "tile": TILE}
+    )
+    body = response.json()
+    check(
+        len(body.get("missing", [])) == len(OBJECTS),
+        f"다른 토큰으로 시트 생성 요청: 캐시된 타일도 모두 missing ({len(body.get('missing', []))}개)",
+    )
+    response = await client.get(f"/image/sheet/{body['sheet_id']}")
+    check(response.status_code == 404, f"그 시트는 캐시되지 않음 ({response.status_code})")
+
+
+async def run_checks():
+    app = FastAPI()
+    app.include_router(image_router, prefix="/image")
+    http_client._client = httpx.AsyncClient(transport=httpx.MockTransport(upstream))
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://check") as client:
+            await check_proxy(client)
+            await check_sheet(client)
+        # 백그라운드 플레이스홀더 생성이 끝날 때까지 대기
+        await asyncio.gather(
+            *list(service._placeholder_tasks.values()), return_exceptions=True
+        )
+    finally:
+        await http_client.close_http_client()
+
+
+def main():
+    with tempfile.TemporaryDirectory(prefix="image_token_check_") as directory:
+        use_temp_disk_cache(directory)
+        asyncio.run(run_checks())
+
+    if failures:
+        print(f"\n❌ 실패 {len(failures)}건")
+        sys.exit(1)
+    print("\n✅ 캐시된 이미지는 허용된 토큰으로만 제공됩니다")
+
+
+if __name__ == "__main__":
+    main()
@@ -10,15 +10,20 @@ from image.router import router as image_router
 from common.config import settings
 from common.middleware import setup_middleware
 
-# AI 모델 로더
+# AI 모델 로더 및 추론 배치 스케줄러
 from ai.loader import load_ai_model
+from ai.service import stop_inference_scheduler
+
+# 이미지 프록시 업스트림 클라이언트 및 캐시 백그라운드 작업
+from image.http_client import start_http_client, close_http_client
+from image.service import start_background_tasks, stop_background_tasks
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
     애플리케이션 생명주기 관리
-    - startup: AI 모델 로드
+    - startup: AI 모델 로드, 이미지 프록시 HTTP 클라이언트 생성, 이미지 캐시 워밍업
     - shutdown: 리소스 정리
     """
     # Startup
@@ -35,6 +40,13 @@ async def lifespan(app: FastAPI):
         print("[Startup] ⚠️  AI 모델 로드 실패 (AI 기능이 제한될 수 있습니다)")
         print("[Startup]    서버 시작 후 자동 재로딩을 시도합니다...")
 
+    # 이미지 프록시 커넥션 풀 (HTTP/2)
+    await start_http_client()
+    print("[Startup] ✅ 이미지 프록시 HTTP 클라이언트 준비")
+
+    # 이미지 캐시 워밍업 (백그라운드, 준비 완료를 지연시키지 않음)
+    await start_background_tasks()
+
     print("\n[Startup] 서버 준비 완료!")
     print(f"[Startup] 서버 주소: http://{settings.HOST}:{settings.PORT}")
     print(f"[Startup] API 문서: http://{settings.HOST}:{settings.PORT}/docs")
@@ -44,6 +56,9 @@ async def lifespan(app: FastAPI):
 
     # Shutdown
     print("\n[Shutdown] 서버 종료 중...")
+    await stop_background_tasks()
+    await close_http_client()
+    await stop_inference_scheduler()
 
 
 # FastAPI 앱 생성
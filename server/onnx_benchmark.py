@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+PyTorch vs ONNX Runtime 추론 벤치마크 스크립트
+
+같은 체크포인트를 PyTorch(eager)와 ONNX Runtime 백본(AI_BACKEND=onnx)으로 실행해
+스레드 수별 지연 시간(이미지 1장, 백본만/전체)과 처리량(AI_BATCH_MAX_SIZE 배치)을 비교합니다.
+ONNX 파일이 없으면 체크포인트 옆에 export합니다 (이후 서버가 재사용).
+
+사용법:
+    python onnx_benchmark.py [/path/to/images] [--threads 1,2,4] [--images 8] [--repeat 3]
+"""
+import argparse
+import glob
+import io
+import os
+import sys
+import time
+
+# 현재 디렉토리를 PYTHONPATH에 추가
+sys.path.insert(0, os.path.dirname(__file__))
+
+import torch  # noqa: E402
+from PIL import Image  # noqa: E402
+
+from ai import loader  # noqa: E402
+from ai.onnx_backend import (  # noqa: E402
+    disable_onnx_backbone,
+    enable_onnx_backbone,
+    onnx_path_for,
+)
+from ai.service import _prepare_input, _run_batch  # noqa: E402
+from common.config import settings  # noqa: E402
+
+IMAGE_PATTERNS = ("*.jpg", "*.jpeg", "*.png", "*.webp")
+
+
+def _rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        return 0.0
+
+
+def load_images(image_dir, count):
+    """이미지 폴더에서 읽거나, 없으면 4:3 / 3:4 임의 이미지 생성"""
+    if image_dir:
+        paths = sorted(
+            path
+            for pattern in IMAGE_PATTERNS
+            for path in glob.glob(os.path.join(image_dir, pattern))
+        )[:count]
+        images = []
+        for path in paths:
+            with open(path, "rb") as f:
+                images.append(f.read())
+        return images
+
+    generator = torch.Generator().manual_seed(0)
+    images = []
+    for index in range(count):
+        size = (1600, 1200) if index % 2 == 0 else (1200, 1600)
+        pixels = torch.randint(
+            0, 256, (size[1], size[0], 3), dtype=torch.uint8, generator=generator
+        )
+        buffer = io.BytesIO()
+        Image.fromarray(pixels.numpy()).save(buffer, "JPEG", quality=90)
+        images.append(buffer.getvalue())
+    return images
+
+
+def measure(model, inputs, batch_size, repeat):
+    """(백본 1장 p50 ms, 전체 1장 p50 ms, 배치 처리량 images/s)"""
+    backbone = model.model.model.backbone.model
+    _run_batch(*zip(*inputs[:1]))  # 워밍업
+
+    backbone_latencies = []
+    latencies = []
+    for _ in range(repeat):
+        for pixel_values, target_size in inputs:
+            started = time.perf_counter()
+            with torch.no_grad():
+                backbone(pixel_values[None])
+            backbone_latencies.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            _run_batch([pixel_values], [target_size])
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for index in range(0, len(inputs), batch_size):
+            chunk = inputs[index : index + batch_size]
+            _run_batch([values for values, _ in chunk], [size for _, size in chunk])
+    throughput = len(inputs) * repeat / (time.perf_counter() - started)
+
+    return _median(backbone_latencies) * 1000, _median(latencies) * 1000, throughput
+
+
+def _median(values):
+    ordered = sorted(values)
+    return ordered[len(ordered) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("image_dir", nargs="?", help="이미지 폴더 (없으면 임의 이미지)")
+    parser.add_argument("--threads", default="1,2,4", help="비교할 스레드 수 목록")
+    parser.add_argument("--images", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    thread_counts = [int(value) for value in args.threads.split(",")]
+
+    # CPU PyTorch 모델을 로드한 뒤 백본만 ONNX Runtime으로 바꿔 가며 비교
+    os.environ["CUDA_VISIBLE_DEVICES"] = ""
+    settings.AI_BACKEND = "pytorch"
+    if not loader.load_ai_model(max_retries=1):
+        print("❌ 모델 로드 실패")
+        sys.exit(1)
+    model = loader.get_model()
+    processor = loader.get_processor()
+    checkpoint_path = loader.get_resolved_model_path()
+
+    inputs = [
+        _prepare_input(image, processor)
+        for image in load_images(args.image_dir, args.images)
+    ]
+    if not inputs:
+        print("❌ 이미지가 없습니다.")
+        sys.exit(1)
+    batch_size = settings.AI_BATCH_MAX_SIZE
+    print(f"이미지 {len(inputs)}장, 배치 크기 {batch_size}, 반복 {args.repeat}회")
+
+    print("\n" + "=" * 60)
+    print("⏱️  스레드 수별 비교 (지연: 1장 p50, 처리량: 배치 실행)")
+    print("=" * 60)
+    print(
+        f"   {'스레드':<6}{'백엔드':<10}{'백본(ms)':>10}{'전체(ms)':>10}{'처리량(장/s)':>14}"
+    )
+
+    rss_session = None
+    for threads in thread_counts:
+        torch.set_num_threads(threads)
+        results = {}
+
+        disable_onnx_backbone(model)
+        results["pytorch"] = measure(model, inputs, batch_size, args.repeat)
+
+        rss_before = _rss_mb()
+        enable_onnx_backbone(model, checkpoint_path, threads)
+        if rss_session is None:
+            rss_session = _rss_mb() - rss_before
+        results["onnx"] = measure(model, inputs, batch_size, args.repeat)
+        fallbacks = model.model.model.backbone.model.fallbacks
+        if fallbacks:
+            print(f"   ⚠️  PyTorch 폴백 {fallbacks}회 (ONNX Runtime 실행 오류)")
+
+        for name, (backbone_ms, total_ms, throughput) in results.items():
+            print(
+                f"   {threads:<6}{name:<10}{backbone_ms:>10.1f}{total_ms:>10.1f}{throughput:>14.2f}"
+            )
+        print(
+            f"   → ONNX 백본 {results['pytorch'][0] / results['onnx'][0]:.2f}배, "
+            f"전체 지연 {results['pytorch'][1] / results['onnx'][1]:.2f}배, "
+            f"처리량 {results['onnx'][2] / results['pytorch'][2]:.2f}배"
+        )
+
+    print("\n" + "=" * 60)
+    print("💾 메모리")
+    print("=" * 60)
+    print(f"   ONNX 세션 추가 RSS: {rss_session:.0f} MB (PyTorch 백본은 폴백용으로 유지)")
+    onnx_path = onnx_path_for(checkpoint_path)
+    print(
+        f"   {os.path.basename(onnx_path)}: {os.path.getsize(onnx_path) / (1024 * 1024):.0f} MB"
+    )
+
+
+if __name__ == "__main__":
+    main()
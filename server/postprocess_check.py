@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+손상 탐지 후처리(클래스별 threshold + NMS) 동등성 확인 및 벤치마크 스크립트
+
+ai/service.py의 텐서 기반 _filter_by_class_threshold / _apply_nms가
+이전 Python 루프 구현과 정확히 같은 탐지 결과를 내는지 확인하고 속도를 비교합니다.
+모델 없이 DETA 후처리 출력과 같은 형태의 임의 탐지 결과로 실행합니다.
+
+사용법:
+    python postprocess_check.py [--cases 200] [--boxes 300] [--repeat 200]
+"""
+import argparse
+import os
+import sys
+import time
+
+import torch
+from torchvision.ops import nms
+
+# 현재 디렉토리를 PYTHONPATH에 추가
+sys.path.insert(0, os.path.dirname(__file__))
+
+from ai.service import (  # noqa: E402
+    CLASS_THRESHOLDS,
+    NMS_IOU_THRESHOLD,
+    _apply_nms,
+    _filter_by_class_threshold,
+)
+
+
+# ---------------------------------------------------------------------------
+# 이전 구현 (Python 루프, 비교 기준)
+# ---------------------------------------------------------------------------
+
+
+def legacy_filter_by_class_threshold(boxes, scores, labels, class_thresholds):
+    """클래스별로 다른 threshold 적용 (노트북과 동일한 로직)"""
+    filtered_boxes = []
+    filtered_scores = []
+    filtered_labels = []
+
+    for box, score, label in zip(boxes, scores, labels):
+        # label을 안전하게 정수로 변환
+        if torch.is_tensor(label):
+            if label.numel() == 1:
+                label_int = int(label.item())
+            else:
+                continue  # 유효하지 않은 label
+        else:
+            label_int = int(label)
+
+        # 해당 클래스의 threshold 가져오기 (기본값 0.5)
+        threshold = class_thresholds.get(label_int, 0.5)
+
+        # score를 안전하게 비교
+        if torch.is_tensor(score):
+            if score.numel() == 1:
+                score_value = score.item()
+            else:
+                continue  # 유효하지 않은 score
+        else:
+            score_value = float(score)
+
+        if score_value >= threshold:
+            filtered_boxes.append(box)
+            filtered_scores.append(score)
+            filtered_labels.append(label)
+
+    return filtered_boxes, filtered_scores, filtered_labels
+
+
+def legacy_apply_nms(boxes, scores, labels, iou_threshold=0.5):
+    """NMS 적용 (노트북과 동일한 로직)"""
+    if len(boxes) == 0:
+        return [], [], []
+
+    def _prepare_tensor(values, dtype):
+        """list/tuple/tensor 입력을 안전하게 텐서로 변환"""
+        if torch.is_tensor(values):
+            tensor = values.detach()
+            if values.requires_grad:
+                tensor = tensor.clone()
+            return tensor.to(dtype=dtype)
+
+        if not isinstance(values, (list, tuple)):
+            return torch.tensor(values, dtype=dtype)
+
+        if len(values) == 0:
+            return torch.empty((0,), dtype=dtype)
+
+        prepared = []
+        for item in values:
+            if torch.is_tensor(item):
+                t = item.detach()
+                if item.requires_grad:
+                    t = t.clone()
+                prepared.append(t.to(dtype=dtype))
+            else:
+                prepared.append(torch.tensor(item, dtype=dtype))
+
+        try:
+            return torch.stack(prepared)
+        except RuntimeError:
+            # 스택에 실패하면 (예: 스칼라 혼합) cat 대신 1D 텐서를 생성
+            flattened = [
+                item.item() if torch.is_tensor(item) and item.numel() == 1 else item
+                for item in prepared
+            ]
+            return torch.tensor(flattened, dtype=dtype)
+
+    # 텐서로 변환
+    boxes_tensor = _prepare_tensor(boxes, torch.float32)
+    scores_tensor = _prepare_tensor(scores, torch.float32)
+    labels_tensor = _prepare_tensor(labels, torch.int64)
+
+    # 디바이스 통일
+    device = boxes_tensor.device
+    scores_tensor = scores_tensor.to(device)
+    labels_tensor = labels_tensor.to(device)
+
+    keep_indices = []
+    unique_labels = labels_tensor.unique()
+
+    # 클래스별로 NMS 적용
+    for label_tensor in unique_labels:
+        # 텐서를 스칼라로 변환 (안전하게)
+        if label_tensor.numel() == 1:
+            label_value = label_tensor.item()
+        else:
+            continue  # 유효하지 않은 label
+
+        mask = labels_tensor == label_value
+        class_boxes = boxes_tensor[mask]
+        class_scores = scores_tensor[mask]
+        class_indices = torch.where(mask)[0]
+
+        if len(class_boxes) > 0:
+            keep = nms(class_boxes, class_scores, iou_threshold)
+
+            # keep이 텐서인 경우 리스트로 변환
+            if torch.is_tensor(keep):
+                keep_list = keep.cpu().tolist()
+            else:
+                keep_list = list(keep) if isinstance(keep, (list, tuple)) else [keep]
+
+            # class_indices를 안전하게 처리
+            if torch.is_tensor(class_indices):
+                # keep_list의 인덱스를 사용하여 class_indices에서 실제 인덱스 가져오기
+                for keep_idx in keep_list:
+                    if 0 <= keep_idx < len(class_indices):
+                        original_idx = class_indices[keep_idx]
+                        # original_idx가 텐서인 경우 스칼라로 변환
+                        if torch.is_tensor(original_idx):
+                            if original_idx.numel() == 1:
+                                keep_indices.append(int(original_idx.item()))
+                            else:
+                                continue
+                        else:
+                            keep_indices.append(int(original_idx))
+            else:
+                # class_indices가 리스트인 경우
+                keep_indices.extend(
+                    [
+                        int(class_indices[i])
+                        for i in keep_list
+                        if 0 <= i < len(class_indices)
+                    ]
+                )
+
+    keep_indices = sorted(set(keep_indices))  # 중복 제거
+    filtered_boxes = [boxes[i] for i in keep_indices if i < len(boxes)]
+    filtered_scores = [scores[i] for i in keep_indices if i < len(scores)]
+    filtered_labels = [labels[i] for i in keep_indices if i < len(labels)]
+
+    return filtered_boxes, filtered_scores, filtered_labels
+
+
+def legacy_postprocess(boxes, scores, labels):
+    boxes, scores, labels = legacy_filter_by_class_threshold(
+        boxes, scores, labels, CLASS_THRESHOLDS
+    )
+    if len(boxes) > 0:
+        boxes, scores, labels = legacy_apply_nms(
+            boxes, scores, labels, iou_threshold=NMS_IOU_THRESHOLD
+        )
+    return boxes, scores, labels
+
+
+def postprocess(boxes, scores, labels):
+    boxes, scores, labels = _filter_by_class_threshold(
+        boxes, scores, labels, CLASS_THRESHOLDS
+    )
+    if len(boxes) > 0:
+        boxes, scores, labels = _apply_nms(
+            boxes, scores, labels, iou_threshold=NMS_IOU_THRESHOLD
+        )
+    return boxes, scores, labels
+
+
+def _to_tensors(boxes, scores, labels):
+    """이전 구현의 list 결과를 텐서로 맞춤"""
+    if not torch.is_tensor(boxes):
+        boxes = torch.stack(boxes) if boxes else torch.empty((0, 4))
+        scores = torch.stack(scores) if scores else torch.empty((0,))
+        labels = torch.stack(labels) if labels else torch.empty((0,), dtype=torch.int64)
+    return boxes, scores, labels
+
+
+def make_detections(generator, num_boxes, width=1920, height=1080):
+    """
+    DETA post_process_object_detection 출력과 같은 형태의 임의 탐지 결과
+
+    - 점수 내림차순 정렬, 일부는 threshold와 정확히 같은 값
+    - 같은 위치 주변에 겹치는 박스 군집 (NMS 대상)
+    - 표에 없는 클래스(4)도 포함 (기본 threshold 0.5)
+    """
+    centers = torch.rand((max(1, num_boxes // 6), 2), generator=generator)
+    centers = centers * torch.tensor([width, height])
+    picks = torch.randint(0, len(centers), (num_boxes,), generator=generator)
+    sizes = torch.rand((num_boxes, 2), generator=generator) * 300 + 10
+    jitter = torch.randn((num_boxes, 2), generator=generator) * 20
+    center = centers[picks] + jitter
+    boxes = torch.cat([center - sizes / 2, center + sizes / 2], dim=1)
+
+    scores = torch.rand((num_boxes,), generator=generator)
+    exact = torch.rand((num_boxes,), generator=generator) < 0.05
+    threshold_values = torch.tensor([0.30, 0.25, 0.15, 0.25, 0.5])
+    labels = torch.randint(0, 5, (num_boxes,), generator=generator)
+    scores[exact] = threshold_values[labels[exact]]
+
+    order = scores.argsort(descending=True)
+    return boxes[order], scores[order], labels[order]
+
+
+def check_equivalence(cases, num_boxes):
+    print("\n" + "=" * 60)
+    print("🔍 동등성 확인")
+    print("=" * 60)
+
+    generator = torch.Generator().manual_seed(0)
+    mismatches = 0
+    total_kept = 0
+    for case in range(cases):
+        count = num_boxes if case % 10 else case % 7  # 빈 입력/소수 박스도 포함
+        inputs = make_detections(generator, count)
+        expected = _to_tensors(*legacy_postprocess(*inputs))
+        actual = postprocess(*inputs)
+        total_kept += len(actual[0])
+        if not all(torch.equal(e, a) for e, a in zip(expected, actual)):
+            mismatches += 1
+            print(f"❌ case {case}: 기존 {len(expected[0])}개, 신규 {len(actual[0])}개")
+
+    if mismatches:
+        print(f"❌ {cases}개 중 {mismatches}개 불일치")
+        return False
+    print(f"✅ {cases}개 케이스 모두 일치 (남은 탐지 합계 {total_kept}개)")
+    return True
+
+
+def benchmark(num_boxes, repeat):
+    print("\n" + "=" * 60)
+    print(f"⏱️  벤치마크 (박스 {num_boxes}개, {repeat}회)")
+    print("=" * 60)
+
+    generator = torch.Generator().manual_seed(1)
+    inputs = make_detections(generator, num_boxes)
+    timings = {}
+    for name, fn in (("기존 (Python 루프)", legacy_postprocess), ("신규 (텐서)", postprocess)):
+        fn(*inputs)  # 워밍업
+        started = time.perf_counter()
+        for _ in range(repeat):
+            fn(*inputs)
+        timings[name] = (time.perf_counter() - started) / repeat * 1000
+        print(f"   {name}: {timings[name]:.3f} ms")
+
+    legacy_ms, new_ms = timings.values()
+    print(f"✅ {legacy_ms / new_ms:.1f}배 빠름")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cases", type=int, default=200)
+    parser.add_argument("--boxes", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    torch.set_num_threads(1)
+    ok = check_equivalence(args.cases, args.boxes)
+    benchmark(args.boxes, args.repeat)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
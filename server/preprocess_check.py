@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+단일 패스 전처리 동등성 확인 및 벤치마크 스크립트
+
+ai/service.py의 단일 패스 전처리(AI_FAST_PREPROCESS)가 DetaImageProcessor 경로와
+같은 입력 크기/후처리 기준 크기를 내고 pixel_values가 허용 오차 안에 있는지 확인하고,
+해상도 프로필별로 이미지 1장 전처리 시간을 비교합니다.
+이미지 폴더를 주지 않으면 12MP(4032x3024) 휴대폰 사진 크기의 JPEG을 생성해 사용합니다.
+
+사용법:
+    python preprocess_check.py [/path/to/photos] [--images 6] [--repeat 3]
+"""
+import argparse
+import glob
+import io
+import os
+import sys
+import time
+
+import torch
+from PIL import Image, ImageDraw, ImageFilter
+
+# 현재 디렉토리를 PYTHONPATH에 추가
+sys.path.insert(0, os.path.dirname(__file__))
+
+from transformers import DetaImageProcessor  # noqa: E402
+
+from ai.loader import DETA_MODEL_NAME  # noqa: E402
+from ai.service import RESOLUTION_PROFILES, _prepare_input  # noqa: E402
+from common.config import settings  # noqa: E402
+
+IMAGE_PATTERNS = ("*.jpg", "*.jpeg", "*.png", "*.webp")
+
+# 허용 오차 (정규화된 pixel_values 기준, 0~255 픽셀 1단계 ≈ 0.017)
+MEAN_ABS_TOLERANCE = 0.02
+MAX_ABS_TOLERANCE = 0.5
+
+
+def load_processor():
+    try:
+        return DetaImageProcessor.from_pretrained(DETA_MODEL_NAME)
+    except Exception as e:
+        print(f"⚠️  {DETA_MODEL_NAME} 프로세서 설정을 불러올 수 없어 기본값 사용: {e}")
+        return DetaImageProcessor()
+
+
+def synthetic_photo(index):
+    """12MP 휴대폰 사진 크기의 부드러운 JPEG (가로/세로 번갈아, 마지막 장은 4096 초과)"""
+    generator = torch.Generator().manual_seed(index)
+    size = (4032, 3024) if index % 2 == 0 else (3024, 4032)
+    base = torch.randint(0, 256, (24, 32, 3), dtype=torch.uint8, generator=generator)
+    img = Image.fromarray(base.numpy()).resize(size, Image.Resampling.BICUBIC)
+
+    # 균열처럼 가는 선 (리사이즈 차이가 드러나는 고주파 성분)
+    draw = ImageDraw.Draw(img)
+    points = torch.randint(0, min(size), (40, 4), generator=generator).tolist()
+    for x1, y1, x2, y2 in points:
+        draw.line((x1, y1, x2, y2), fill=(30, 25, 20), width=3)
+    img = img.filter(ImageFilter.GaussianBlur(1))
+
+    buffer = io.BytesIO()
+    img.save(buffer, "JPEG", quality=90)
+    return f"synthetic_{index}_{size[0]}x{size[1]}.jpg", buffer.getvalue()
+
+
+def oversized_photo():
+    """4096을 넘는 사진 (MAX_DIMENSION 축소 경로 확인)"""
+    name, data = synthetic_photo(0)
+    img = Image.open(io.BytesIO(data)).resize((4624, 3468), Image.Resampling.BILINEAR)
+    buffer = io.BytesIO()
+    img.save(buffer, "JPEG", quality=85)
+    return "synthetic_4624x3468.jpg", buffer.getvalue()
+
+
+def load_images(image_dir, count):
+    if image_dir:
+        paths = sorted(
+            path
+            for pattern in IMAGE_PATTERNS
+            for path in glob.glob(os.path.join(image_dir, pattern))
+        )[:count]
+        images = []
+        for path in paths:
+            with open(path, "rb") as f:
+                images.append((os.path.basename(path), f.read()))
+        return images
+    return [synthetic_photo(index) for index in range(count)] + [oversized_photo()]
+
+
+def prepare(image_bytes, processor, size, fast):
+    settings.AI_FAST_PREPROCESS = fast
+    started = time.perf_counter()
+    pixel_values, target_size = _prepare_input(image_bytes, processor, size)
+    return pixel_values, target_size, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("image_dir", nargs="?", help="사진 폴더 (없으면 12MP JPEG 생성)")
+    parser.add_argument("--images", type=int, default=6)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    torch.set_num_threads(1)  # 전처리 스레드 1개 기준 비교
+    processor = load_processor()
+    images = load_images(args.image_dir, args.images)
+    if not images:
+        print("❌ 이미지가 없습니다.")
+        sys.exit(1)
+    print(f"이미지 {len(images)}장, 반복 {args.repeat}회")
+
+    print("\n" + "=" * 60)
+    print("🔍 동등성 확인 (DetaImageProcessor 경로 기준)")
+    print("=" * 60)
+    failures = 0
+    timings = {}
+    for profile, size in RESOLUTION_PROFILES.items():
+        worst_mean, worst_max = 0.0, 0.0
+        legacy_total, fast_total = 0.0, 0.0
+        for name, image_bytes in images:
+            legacy_values, legacy_target, _ = prepare(image_bytes, processor, size, False)
+            fast_values, fast_target, _ = prepare(image_bytes, processor, size, True)
+
+            if legacy_values.shape != fast_values.shape or legacy_target != fast_target:
+                failures += 1
+                print(
+                    f"   ❌ {profile} {name}: 입력 {tuple(legacy_values.shape)} vs "
+                    f"{tuple(fast_values.shape)}, 기준 크기 {legacy_target} vs {fast_target}"
+                )
+                continue
+            error = (legacy_values - fast_values).abs()
+            mean_error, max_error = float(error.mean()), float(error.max())
+            worst_mean, worst_max = max(worst_mean, mean_error), max(worst_max, max_error)
+            if mean_error > MEAN_ABS_TOLERANCE or max_error > MAX_ABS_TOLERANCE:
+                failures += 1
+                print(
+                    f"   ❌ {profile} {name}: 평균 오차 {mean_error:.4f}, 최대 오차 {max_error:.4f}"
+                )
+
+            for _ in range(args.repeat):
+                legacy_total += prepare(image_bytes, processor, size, False)[2]
+                fast_total += prepare(image_bytes, processor, size, True)[2]
+
+        count = len(images) * args.repeat
+        timings[profile] = (legacy_total / count, fast_total / count)
+        print(
+            f"   {profile:<10} 입력/기준 크기 일치, 평균 오차 최대 {worst_mean:.4f}, "
+            f"최대 오차 {worst_max:.4f}"
+        )
+
+    print("\n" + "=" * 60)
+    print("⏱️  전처리 시간 (이미지 1장 평균, 디코딩 포함)")
+    print("=" * 60)
+    for profile, (legacy, fast) in timings.items():
+        print(
+            f"   {profile:<10} 프로세서 {legacy * 1000:7.1f} ms → 단일 패스 {fast * 1000:7.1f} ms "
+            f"({legacy / fast:.2f}배)"
+        )
+
+    if failures:
+        print(f"\n❌ 허용 오차를 벗어난 경우 {failures}건")
+        sys.exit(1)
+    print(
+        f"\n✅ 모든 이미지가 허용 오차 안에서 일치 "
+        f"(평균 ≤ {MEAN_ABS_TOLERANCE}, 최대 ≤ {MAX_ABS_TOLERANCE})"
+    )
+
+
+if __name__ == "__main__":
+    main()
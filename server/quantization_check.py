@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+INT8 동적 양자화 모델 비교 스크립트
+
+같은 체크포인트를 fp32와 INT8(AI_QUANTIZE) 모드로 각각 로드해 로컬 이미지 폴더를
+추론하고, 클래스별 탐지 일치율과 지연 시간/메모리(RSS) 차이를 보고합니다.
+정확도 손실을 확인한 뒤 AI_QUANTIZE=true 적용 여부를 결정할 때 사용합니다.
+
+각 모드는 별도 프로세스(CPU)에서 실행되어 메모리 측정이 서로 섞이지 않습니다.
+
+사용법:
+    python quantization_check.py /path/to/images [--limit 50] [--iou 0.5] [--threads 4]
+"""
+import argparse
+import glob
+import os
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+# 현재 디렉토리를 PYTHONPATH에 추가
+sys.path.insert(0, os.path.dirname(__file__))
+
+IMAGE_PATTERNS = ("*.jpg", "*.jpeg", "*.png", "*.webp", "*.bmp")
+
+
+def _rss_mb():
+    """현재 프로세스 RSS (MB, Linux /proc 기준, 없으면 최대 RSS)"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _run_mode(quantize, image_paths, threads):
+    """한 모드(fp32/INT8)로 모델을 로드하고 모든 이미지를 추론 (자식 프로세스)"""
+    import torch
+
+    from ai import loader
+    from ai.service import (
+        CLASS_THRESHOLDS,
+        NMS_IOU_THRESHOLD,
+        _apply_nms,
+        _calculate_grade,
+        _filter_by_class_threshold,
+        _prepare_input,
+        _run_batch,
+    )
+
+    torch.set_num_threads(threads)
+    rss_before = _rss_mb()
+    if not loader.load_ai_model(max_retries=1, quantize=quantize):
+        raise RuntimeError("모델 로드 실패")
+    if quantize and not loader.is_model_quantized():
+        raise RuntimeError("INT8 양자화가 적용되지 않았습니다")
+    rss_loaded = _rss_mb()
+
+    processor = loader.get_processor()
+    id2label_korean = loader.get_id2label_korean() or {}
+    images = {}
+    latencies = []
+    for index, path in enumerate(image_paths):
+        with open(path, "rb") as f:
+            pixel_values, target_size = _prepare_input(f.read(), processor)
+
+        started = time.perf_counter()
+        result = _run_batch([pixel_values], [target_size])[0]
+        elapsed = time.perf_counter() - started
+        if index > 0:  # 첫 이미지는 워밍업으로 제외
+            latencies.append(elapsed)
+
+        boxes, scores, labels = _filter_by_class_threshold(
+            result["boxes"], result["scores"], result["labels"], CLASS_THRESHOLDS
+        )
+        boxes, scores, labels = _apply_nms(
+            boxes, scores, labels, iou_threshold=NMS_IOU_THRESHOLD
+        )
+        detections = [
+            {
+                "label": id2label_korean.get(label, f"LABEL_{label}"),
+                "label_id": label,
+                "score": score,
+                "bbox": box,
+            }
+            for box, score, label in zip(
+                boxes.tolist(), scores.tolist(), labels.tolist()
+            )
+        ]
+        images[path] = {
+            "detections": detections,
+            "grade": _calculate_grade(detections)[0],
+        }
+
+    return {
+        "images": images,
+        "labels": id2label_korean,
+        "latencies": latencies,
+        "model_rss_mb": rss_loaded - rss_before,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def _iou(a, b):
+    width = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    height = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = width * height
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def _match(reference, candidate, iou_threshold):
+    """같은 클래스끼리 점수 높은 순으로 IoU 기준 1:1 매칭 -> [(ref, cand)]"""
+    pairs = []
+    used = set()
+    for ref in sorted(reference, key=lambda d: -d["score"]):
+        best, best_iou = None, iou_threshold
+        for index, cand in enumerate(candidate):
+            if index in used or cand["label_id"] != ref["label_id"]:
+                continue
+            iou = _iou(ref["bbox"], cand["bbox"])
+            if iou >= best_iou:
+                best, best_iou = index, iou
+        if best is not None:
+            used.add(best)
+            pairs.append((ref, candidate[best]))
+    return pairs
+
+
+def _percentile(values, ratio):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * ratio))]
+
+
+def report_agreement(fp32, int8, iou_threshold):
+    print("\n" + "=" * 60)
+    print(f"🔍 클래스별 탐지 일치율 (fp32 기준, IoU ≥ {iou_threshold})")
+    print("=" * 60)
+
+    per_class = {}
+    grade_matches = 0
+    for path, reference in fp32["images"].items():
+        candidate = int8["images"][path]
+        grade_matches += reference["grade"] == candidate["grade"]
+        pairs = _match(reference["detections"], candidate["detections"], iou_threshold)
+        for detection in reference["detections"]:
+            per_class.setdefault(detection["label_id"], _empty_stats())["fp32"] += 1
+        for detection in candidate["detections"]:
+            per_class.setdefault(detection["label_id"], _empty_stats())["int8"] += 1
+        for ref, cand in pairs:
+            stats = per_class[ref["label_id"]]
+            stats["matched"] += 1
+            stats["score_diff"] += abs(ref["score"] - cand["score"])
+
+    print(
+        f"   {'클래스':<12}{'fp32':>6}{'int8':>6}{'일치':>6}"
+        f"{'재현율':>9}{'정밀도':>9}{'|Δscore|':>10}"
+    )
+    for label_id in sorted(per_class):
+        stats = per_class[label_id]
+        name = fp32["labels"].get(label_id, f"LABEL_{label_id}")
+        recall = stats["matched"] / stats["fp32"] if stats["fp32"] else 1.0
+        precision = stats["matched"] / stats["int8"] if stats["int8"] else 1.0
+        score_diff = stats["score_diff"] / stats["matched"] if stats["matched"] else 0.0
+        print(
+            f"   {name:<12}{stats['fp32']:>6}{stats['int8']:>6}{stats['matched']:>6}"
+            f"{recall:>9.1%}{precision:>9.1%}{score_diff:>10.4f}"
+        )
+
+    total = len(fp32["images"])
+    print(f"\n   손상 등급 일치: {grade_matches}/{total} ({grade_matches / total:.1%})")
+
+
+def _empty_stats():
+    return {"fp32": 0, "int8": 0, "matched": 0, "score_diff": 0.0}
+
+
+def report_performance(fp32, int8):
+    print("\n" + "=" * 60)
+    print("⏱️  지연 시간 / 메모리")
+    print("=" * 60)
+
+    rows = []
+    for name, result in (("fp32", fp32), ("int8", int8)):
+        latencies = [value * 1000 for value in result["latencies"]]
+        mean = sum(latencies) / len(latencies) if latencies else 0.0
+        rows.append((name, mean, _percentile(latencies, 0.5), _percentile(latencies, 0.95)))
+        print(
+            f"   {name}: 평균 {mean:.1f} ms, p50 {rows[-1][2]:.1f} ms, p95 {rows[-1][3]:.1f} ms, "
+            f"모델 RSS {result['model_rss_mb']:.0f} MB, 최대 RSS {result['peak_rss_mb']:.0f} MB"
+        )
+
+    if rows[1][1] > 0:
+        print(f"\n   INT8 속도: fp32 대비 {rows[0][1] / rows[1][1]:.2f}배")
+    print(
+        f"   모델 RSS 차이: {int8['model_rss_mb'] - fp32['model_rss_mb']:+.0f} MB, "
+        f"최대 RSS 차이: {int8['peak_rss_mb'] - fp32['peak_rss_mb']:+.0f} MB"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("image_dir", help="비교할 이미지 폴더")
+    parser.add_argument("--limit", type=int, default=50, help="최대 이미지 수")
+    parser.add_argument("--iou", type=float, default=0.5, help="탐지 매칭 IoU 기준")
+    parser.add_argument("--threads", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    image_paths = sorted(
+        path
+        for pattern in IMAGE_PATTERNS
+        for path in glob.glob(os.path.join(args.image_dir, pattern))
+    )[: args.limit]
+    if len(image_paths) < 2:
+        print("❌ 이미지가 2장 이상 필요합니다 (첫 장은 워밍업).")
+        sys.exit(1)
+
+    # 양자화는 CPU 전용이므로 두 모드 모두 CPU에서 비교
+    os.environ["CUDA_VISIBLE_DEVICES"] = ""
+    print(f"이미지 {len(image_paths)}장, 스레드 {args.threads}개")
+
+    results = {}
+    for name, quantize in (("fp32", False), ("int8", True)):
+        print(f"\n[{name}] 추론 중...")
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+            results[name] = pool.submit(
+                _run_mode, quantize, image_paths, args.threads
+            ).result()
+
+    report_agreement(results["fp32"], results["int8"], args.iou)
+    report_performance(results["fp32"], results["int8"])
+
+
+if __name__ == "__main__":
+    main()
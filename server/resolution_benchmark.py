@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+해상도 프로필별 추론 벤치마크 스크립트
+
+로컬 이미지 폴더를 각 해상도 프로필(fast / balanced / accurate)로 추론해
+프로필별 지연 시간(전처리 + 추론)과 accurate 프로필 대비 탐지 일치율을 보고합니다.
+AI_RESOLUTION_PROFILE 기본값이나 요청별 profile을 고를 때 사용합니다.
+
+사용법:
+    python resolution_benchmark.py /path/to/images [--limit 50] [--iou 0.5]
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+# 현재 디렉토리를 PYTHONPATH에 추가
+sys.path.insert(0, os.path.dirname(__file__))
+
+from ai import loader  # noqa: E402
+from ai.service import (  # noqa: E402
+    CLASS_THRESHOLDS,
+    NMS_IOU_THRESHOLD,
+    RESOLUTION_PROFILES,
+    _apply_nms,
+    _calculate_grade,
+    _filter_by_class_threshold,
+    _prepare_input,
+    _run_batch,
+)
+from quantization_check import IMAGE_PATTERNS, _match, _percentile  # noqa: E402
+
+REFERENCE_PROFILE = "accurate"
+
+
+def run_profile(size, images):
+    """한 프로필로 모든 이미지를 추론 -> (이미지별 결과, 지연 시간 목록 (초))"""
+    processor = loader.get_processor()
+    id2label_korean = loader.get_id2label_korean() or {}
+
+    # 워밍업 (해상도가 바뀐 첫 실행 제외)
+    pixel_values, target_size = _prepare_input(images[0][1], processor, size)
+    _run_batch([pixel_values], [target_size])
+
+    results = {}
+    latencies = []
+    for path, image_bytes in images:
+        started = time.perf_counter()
+        pixel_values, target_size = _prepare_input(image_bytes, processor, size)
+        result = _run_batch([pixel_values], [target_size])[0]
+        latencies.append(time.perf_counter() - started)
+
+        boxes, scores, labels = _filter_by_class_threshold(
+            result["boxes"], result["scores"], result["labels"], CLASS_THRESHOLDS
+        )
+        boxes, scores, labels = _apply_nms(
+            boxes, scores, labels, iou_threshold=NMS_IOU_THRESHOLD
+        )
+        detections = [
+            {
+                "label": id2label_korean.get(label, f"LABEL_{label}"),
+                "label_id": label,
+                "score": score,
+                "bbox": box,
+            }
+            for box, score, label in zip(
+                boxes.tolist(), scores.tolist(), labels.tolist()
+            )
+        ]
+        results[path] = {
+            "detections": detections,
+            "grade": _calculate_grade(detections)[0],
+        }
+    return results, latencies
+
+
+def report_agreement(name, reference, candidate, labels, iou_threshold):
+    """accurate 기준 클래스별 재현율/정밀도와 등급 일치율"""
+    per_class = {}
+    grade_matches = 0
+    for path, ref in reference.items():
+        cand = candidate[path]
+        grade_matches += ref["grade"] == cand["grade"]
+        for detection in ref["detections"]:
+            per_class.setdefault(detection["label_id"], [0, 0, 0])[0] += 1
+        for detection in cand["detections"]:
+            per_class.setdefault(detection["label_id"], [0, 0, 0])[1] += 1
+        for ref_detection, _ in _match(ref["detections"], cand["detections"], iou_threshold):
+            per_class[ref_detection["label_id"]][2] += 1
+
+    print(f"\n   [{name}]")
+    print(f"   {'클래스':<12}{REFERENCE_PROFILE:>9}{name:>9}{'일치':>6}{'재현율':>9}{'정밀도':>9}")
+    for label_id in sorted(per_class):
+        expected, found, matched = per_class[label_id]
+        recall = matched / expected if expected else 1.0
+        precision = matched / found if found else 1.0
+        print(
+            f"   {labels.get(label_id, f'LABEL_{label_id}'):<12}{expected:>9}{found:>9}"
+            f"{matched:>6}{recall:>9.1%}{precision:>9.1%}"
+        )
+    total = len(reference)
+    print(f"   손상 등급 일치: {grade_matches}/{total} ({grade_matches / total:.1%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("image_dir", help="비교할 이미지 폴더")
+    parser.add_argument("--limit", type=int, default=50, help="최대 이미지 수")
+    parser.add_argument("--iou", type=float, default=0.5, help="탐지 매칭 IoU 기준")
+    args = parser.parse_args()
+
+    image_paths = sorted(
+        path
+        for pattern in IMAGE_PATTERNS
+        for path in glob.glob(os.path.join(args.image_dir, pattern))
+    )[: args.limit]
+    if not image_paths:
+        print("❌ 이미지가 없습니다.")
+        sys.exit(1)
+
+    if not loader.load_ai_model(max_retries=1):
+        print("❌ 모델 로드 실패")
+        sys.exit(1)
+    device = next(loader.get_model().parameters()).device
+    print(f"이미지 {len(image_paths)}장, 디바이스 {device}")
+
+    images = []
+    for path in image_paths:
+        with open(path, "rb") as f:
+            images.append((path, f.read()))
+
+    results = {}
+    print("\n" + "=" * 60)
+    print("⏱️  프로필별 지연 시간 (전처리 + 추론, 이미지 1장)")
+    print("=" * 60)
+    for name, size in RESOLUTION_PROFILES.items():
+        results[name], latencies = run_profile(size, images)
+        latencies = [value * 1000 for value in latencies]
+        mean = sum(latencies) / len(latencies)
+        print(
+            f"   {name:<10} (짧은 변 {size['shortest_edge']}px): 평균 {mean:.1f} ms, "
+            f"p50 {_percentile(latencies, 0.5):.1f} ms, p95 {_percentile(latencies, 0.95):.1f} ms"
+        )
+
+    print("\n" + "=" * 60)
+    print(f"🔍 {REFERENCE_PROFILE} 대비 탐지 일치율 (IoU ≥ {args.iou})")
+    print("=" * 60)
+    labels = loader.get_id2label_korean() or {}
+    for name in RESOLUTION_PROFILES:
+        if name != REFERENCE_PROFILE:
+            report_agreement(
+                name, results[REFERENCE_PROFILE], results[name], labels, args.iou
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+워커 간 공유 이미지 캐시(mmap 슬랩) 확인 스크립트
+
+image/shared_cache.py를 임시 파일에 만들어 다음을 확인합니다.
+    - 동시 읽기/쓰기: 쓰기 프로세스가 같은 세트의 슬롯을 계속 덮어쓰는 동안
+      읽기 프로세스가 seqlock(_read_slot)으로 읽은 본문이 찢어지거나
+      다른 키/ETag와 섞이지 않는지 (쓰기 프로세스가 2개 이상이면 세트 락도 함께 확인)
+    - 4-way 세트 교체 순서: 같은 키 → 빈 슬롯 → 만료 슬롯 → 가장 오래된 슬롯
+
+모델이나 네트워크 없이 실행됩니다 (Linux/macOS, fcntl 필요).
+
+사용법:
+    python shared_cache_check.py [--seconds 5] [--writers 2] [--keys 8]
+"""
+import argparse
+import hashlib
+import os
+import sys
+import tempfile
+import time
+from multiprocessing import get_context
+from pathlib import Path
+
+# 현재 디렉토리를 PYTHONPATH에 추가
+sys.path.insert(0, os.path.dirname(__file__))
+
+from image.metrics import metrics  # noqa: E402
+from image.shared_cache import WAYS, SharedImageCache  # noqa: E402
+
+# 동시성 확인용 캐시 예산 (세트 수를 줄여 같은 슬롯을 자주 덮어쓰게 함)
+STRESS_BUDGET = 4 * 1024 * 1024
+# 본문 크기 범위 (256KB 크기 클래스 안에서 매번 길이가 바뀜)
+MIN_PAYLOAD = 80 * 1024
+MAX_PAYLOAD = 250 * 1024
+
+failures = []
+
+
+def check(condition, message):
+    print(f"   {'✅' if condition else '❌'} {message}")
+    if not condition:
+        failures.append(message)
+
+
+def key_of(name):
+    """캐시 키와 같은 md5 hex"""
+    return hashlib.md5(str(name).encode()).hexdigest()
+
+
+def open_cache(path, budget):
+    cache = SharedImageCache(path, budget)
+    cache.enabled = True  # IMAGE_SHARED_CACHE 설정과 무관하게 확인
+    return cache
+
+
+def payload(index, version):
+    """키 번호/버전마다 내용과 길이가 다른 본문 (앞부분에 키 번호 기록)"""
+    seed = hashlib.sha256(f"{index}:{version}".encode()).digest()
+    size = MIN_PAYLOAD + int.from_bytes(seed[:4], "little") % (MAX_PAYLOAD - MIN_PAYLOAD)
+    prefix = f"{index}:{version}:".encode()
+    return (prefix + seed * (size // len(seed) + 1))[:size]
+
+
+# ---------- 동시 읽기/쓰기 ----------
+
+
+def _writer(path, budget, keys, seconds, worker):
+    cache = open_cache(path, budget)
+    deadline = time.time() + seconds
+    writes = 0
+    version = worker
+    while time.time() < deadline:
+        for index in range(keys):
+            data = payload(index, version)
+            cache.set(key_of(index), data, "image/jpeg", hashlib.md5(data).hexdigest())
+            writes += 1
+        version += 1000  # 쓰기 프로세스마다 다른 버전 계열
+    cache.close()
+    return writes
+
+
+def _reader(path, budget, keys, seconds):
+    cache = open_cache(path, budget)
+    deadline = time.time() + seconds
+    stats = {"hits": 0, "misses": 0, "torn": 0, "wrong_key": 0}
+    index = 0
+    while time.time() < deadline:
+        entry = cache.get(key_of(index))
+        if entry is None:
+            stats["misses"] += 1
+        else:
+            data, _, media_type, etag = entry
+            if hashlib.md5(data).hexdigest() != etag or media_type != "image/jpeg":
+                stats["torn"] += 1
+            elif not data.startswith(f"{index}:".encode()):
+                stats["wrong_key"] += 1
+            else:
+                stats["hits"] += 1
+        index = (index + 1) % keys
+    cache.close()
+    return stats
+
+
+def check_concurrency(directory, seconds, writers, keys):
+    print("\n" + "=" * 60)
+    print(f"🔍 동시 읽기/쓰기 (쓰기 {writers}개 + 읽기 1개 프로세스, {seconds}초)")
+    print("=" * 60)
+    path = Path(directory) / "stress.slab"
+    # 부모가 먼저 파일을 만들어 두어 자식끼리 초기화 경쟁을 하지 않게 함
+    open_cache(path, STRESS_BUDGET).close()
+
+    context = get_context("spawn")
+    with context.Pool(writers + 1) as pool:
+        writer_results = [
+            pool.apply_async(_writer, (path, STRESS_BUDGET, keys, seconds, worker))
+            for worker in range(writers)
+        ]
+        reader_result = pool.apply_async(_reader, (path, STRESS_BUDGET, keys, seconds))
+        writes = sum(result.get() for result in writer_results)
+        stats = reader_result.get()
+
+    reads = sum(stats.values())
+    print(f"   쓰기 {writes}회, 읽기 {reads}회 (히트 {stats['hits']}, 미스 {stats['misses']})")
+    check(stats["hits"] > 0, "읽기 프로세스가 쓰기 중인 캐시에서 히트를 얻음")
+    check(stats["torn"] == 0, f"찢어진 본문 (ETag 불일치) {stats['torn']}건")
+    check(stats["wrong_key"] == 0, f"다른 키의 본문 {stats['wrong_key']}건")
+
+    # 모든 쓰기가 끝난 뒤에는 각 키의 마지막 본문이 온전해야 함
+    cache = open_cache(path, STRESS_BUDGET)
+    entries = [cache.get(key_of(index)) for index in range(keys)]
+    entries = [entry for entry in entries if entry is not None]
+    cache.close()
+    intact = sum(hashlib.md5(entry[0]).hexdigest() == entry[3] for entry in entries)
+    check(
+        entries and intact == len(entries),
+        f"종료 후 남은 항목 {len(entries)}개 중 온전 {intact}개",
+    )
+
+
+# ---------- 세트 교체 순서 ----------
+
+
+def _resident(cache, key):
+    """TTL과 무관하게 슬롯에 남아 있는지 (축출 여부 확인용)"""
+    digest = cache._digest(key)
+    return any(
+        cache._read_slot(offset, digest) is not None
+        for size_class in cache._classes
+        for offset in size_class.slot_offsets(cache._set_index(size_class, digest))
+    )
+
+
+def _same_set_keys(cache, count):
+    """가장 작은 크기 클래스의 0번 세트에 들어가는 키들"""
+    size_class = cache._classes[0]
+    keys = []
+    index = 0
+    while len(keys) < count:
+        key = key_of(f"set-{index}")
+        if cache._set_index(size_class, cache._digest(key)) == 0:
+            keys.append(key)
+        index += 1
+    return keys
+
+
+def check_eviction(directory):
+    print("\n" + "=" * 60)
+    print(f"🔍 {WAYS}-way 세트 교체 순서")
+    print("=" * 60)
+    cache = open_cache(Path(directory) / "eviction.slab", STRESS_BUDGET)
+    cache.get(key_of("open"))  # 파일 열기
+    cache.ttl = 2.0
+    metrics.reset()
+    keys = _same_set_keys(cache, WAYS + 2)
+
+    def put(key, label):
+        cache.set(key, label.encode(), "image/jpeg", key)
+
+    for way, key in enumerate(keys[:WAYS]):
+        put(key, f"v{way}")
+        time.sleep(0.01)  # 타임스탬프 순서 보장
+    check(all(cache.get(key) for key in keys[:WAYS]), f"빈 슬롯 {WAYS}개에 모두 저장")
+
+    put(keys[1], "v1-updated")
+    check(
+        cache.get(keys[1])[0] == b"v1-updated"
+        and all(cache.get(key) for key in keys[:WAYS]),
+        "같은 키는 제자리 갱신 (축출 없음)",
+    )
+    check(metrics.evictions["shared"] == {"ttl": 0, "capacity": 0}, "여기까지 축출 없음")
+
+    put(keys[WAYS], "new")
+    check(cache.get(keys[WAYS]) is not None, "세트가 가득 차면 새 키 저장")
+    check(not _resident(cache, keys[0]), "가장 오래된 슬롯(0번)이 축출됨")
+    check(
+        all(_resident(cache, key) for key in keys[1:WAYS]),
+        "나머지 슬롯은 유지",
+    )
+    check(metrics.evictions["shared"]["capacity"] == 1, "용량 축출 1회 기록")
+
+    # 3번 슬롯만 갱신해 두고 0~2번을 만료시키면, 가장 오래된 2번이 아니라
+    # 스캔 순서상 첫 만료 슬롯(0번, 방금 들어간 새 키)이 교체됨
+    time.sleep(cache.ttl * 0.6)
+    put(keys[3], "v3-refreshed")
+    time.sleep(cache.ttl * 0.6)
+    put(keys[WAYS + 1], "after-ttl")
+    check(cache.get(keys[WAYS + 1]) is not None, "만료 슬롯이 있으면 새 키 저장")
+    check(not _resident(cache, keys[WAYS]), "세트 앞쪽의 첫 만료 슬롯이 교체됨")
+    check(
+        _resident(cache, keys[1]) and _resident(cache, keys[2]),
+        "더 오래됐어도 뒤쪽 만료 슬롯은 남음 (만료 슬롯 우선, 스캔 순서)",
+    )
+    check(_resident(cache, keys[3]), "만료되지 않은 슬롯은 유지")
+    check(metrics.evictions["shared"]["ttl"] == 1, "만료 축출 1회 기록")
+    cache.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=5.0, help="동시성 확인 시간")
+    parser.add_argument("--writers", type=int, default=2, help="쓰기 프로세스 수")
+    parser.add_argument("--keys", type=int, default=8, help="쓰기/읽기 키 수")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="shared_cache_check_") as directory:
+        check_eviction(directory)
+        check_concurrency(directory, args.seconds, args.writers, args.keys)
+
+    if failures:
+        print(f"\n❌ 실패 {len(failures)}건")
+        sys.exit(1)
+    print("\n✅ 공유 캐시가 의도대로 동작합니다")
+
+
+if __name__ == "__main__":
+    main()